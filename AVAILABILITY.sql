@@ -0,0 +1,129 @@
+USE ev_rental_db;
+
+-- ========================================================
+--  STATION AVAILABILITY COUNTERS
+--  Keeps StationAvailability in step with Vehicles so that
+--  v_StationVehicleCount is a plain join over Stations.
+-- ========================================================
+
+-- Seed / repair counters from the current fleet (safe to re-run)
+INSERT INTO StationAvailability (StationID, AvailableVehicles)
+SELECT s.StationID, COUNT(v.VehicleID)
+FROM Stations s
+LEFT JOIN Vehicles v ON v.CurrentStationID = s.StationID AND v.Status = 'available'
+GROUP BY s.StationID
+ON DUPLICATE KEY UPDATE AvailableVehicles = VALUES(AvailableVehicles);
+
+DROP TRIGGER IF EXISTS trg_station_availability_station_insert;
+DROP TRIGGER IF EXISTS trg_station_availability_vehicle_insert;
+DROP TRIGGER IF EXISTS trg_station_availability_vehicle_update;
+DROP TRIGGER IF EXISTS trg_station_availability_vehicle_delete;
+
+DELIMITER $$
+
+CREATE TRIGGER trg_station_availability_station_insert
+AFTER INSERT ON Stations
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO StationAvailability (StationID, AvailableVehicles)
+    VALUES (NEW.StationID, 0);
+END $$
+
+-- add_vehicle
+CREATE TRIGGER trg_station_availability_vehicle_insert
+AFTER INSERT ON Vehicles
+FOR EACH ROW
+BEGIN
+    IF NEW.Status = 'available' AND NEW.CurrentStationID IS NOT NULL THEN
+        INSERT INTO StationAvailability (StationID, AvailableVehicles)
+        VALUES (NEW.CurrentStationID, 1)
+        ON DUPLICATE KEY UPDATE AvailableVehicles = AvailableVehicles + 1;
+    END IF;
+END $$
+
+-- Bookings, sp_EndRide, sp_CancelTrip, sp_ReportAndAssignMaintenance,
+-- decommission and maintenance completion all come through here
+CREATE TRIGGER trg_station_availability_vehicle_update
+AFTER UPDATE ON Vehicles
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.Status <=> NEW.Status AND OLD.CurrentStationID <=> NEW.CurrentStationID) THEN
+        IF OLD.Status = 'available' AND OLD.CurrentStationID IS NOT NULL THEN
+            UPDATE StationAvailability
+            SET AvailableVehicles = AvailableVehicles - 1
+            WHERE StationID = OLD.CurrentStationID;
+        END IF;
+        IF NEW.Status = 'available' AND NEW.CurrentStationID IS NOT NULL THEN
+            INSERT INTO StationAvailability (StationID, AvailableVehicles)
+            VALUES (NEW.CurrentStationID, 1)
+            ON DUPLICATE KEY UPDATE AvailableVehicles = AvailableVehicles + 1;
+        END IF;
+    END IF;
+END $$
+
+CREATE TRIGGER trg_station_availability_vehicle_delete
+AFTER DELETE ON Vehicles
+FOR EACH ROW
+BEGIN
+    IF OLD.Status = 'available' AND OLD.CurrentStationID IS NOT NULL THEN
+        UPDATE StationAvailability
+        SET AvailableVehicles = AvailableVehicles - 1
+        WHERE StationID = OLD.CurrentStationID;
+    END IF;
+END $$
+
+DELIMITER ;
+
+-- ========================================================
+--  RECONCILIATION
+--  Returns every station whose counter disagrees with Vehicles
+--  (RecordedVehicles is NULL when the counter row is missing).
+--  With p_Fix = TRUE the counters are rewritten from Vehicles.
+-- ========================================================
+DROP PROCEDURE IF EXISTS sp_ReconcileStationAvailability;
+
+DELIMITER $$
+
+CREATE PROCEDURE sp_ReconcileStationAvailability(
+    IN p_Fix BOOLEAN
+)
+BEGIN
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+
+    SELECT
+        s.StationID,
+        sa.AvailableVehicles AS RecordedVehicles,
+        COALESCE(a.ActualVehicles, 0) AS ActualVehicles
+    FROM Stations s
+    LEFT JOIN StationAvailability sa ON sa.StationID = s.StationID
+    LEFT JOIN (
+        SELECT CurrentStationID, COUNT(*) AS ActualVehicles
+        FROM Vehicles
+        WHERE Status = 'available' AND CurrentStationID IS NOT NULL
+        GROUP BY CurrentStationID
+    ) a ON a.CurrentStationID = s.StationID
+    WHERE NOT (sa.AvailableVehicles <=> COALESCE(a.ActualVehicles, 0));
+
+    IF p_Fix THEN
+        INSERT INTO StationAvailability (StationID, AvailableVehicles)
+        SELECT s.StationID, COUNT(v.VehicleID)
+        FROM Stations s
+        LEFT JOIN Vehicles v ON v.CurrentStationID = s.StationID AND v.Status = 'available'
+        GROUP BY s.StationID
+        ON DUPLICATE KEY UPDATE AvailableVehicles = VALUES(AvailableVehicles);
+    END IF;
+
+    COMMIT;
+END $$
+
+DELIMITER ;
+
+-- ========================================================
+-- END OF STATION AVAILABILITY
+-- ========================================================
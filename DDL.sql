@@ -108,3 +108,11 @@ CREATE TABLE Reviews (
   UNIQUE KEY uq_user_trip (UserID, TripID),
   INDEX idx_vehicle (VehicleID)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Running count of available vehicles per station, kept current by the
+-- triggers in AVAILABILITY.sql so station listings don't aggregate Vehicles.
+CREATE TABLE StationAvailability (
+  StationID INT PRIMARY KEY,
+  AvailableVehicles INT NOT NULL DEFAULT 0,
+  FOREIGN KEY (StationID) REFERENCES Stations(StationID)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
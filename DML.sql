@@ -6,15 +6,13 @@ SELECT
     s.Name,
     s.Location,
     s.Capacity,
-    COUNT(v.VehicleID) AS AvailableVehicles
+    COALESCE(sa.AvailableVehicles, 0) AS AvailableVehicles
 FROM
     Stations s
 LEFT JOIN
-    Vehicles v ON s.StationID = v.CurrentStationID AND v.Status = 'available'
+    StationAvailability sa ON s.StationID = sa.StationID
 WHERE
-    s.IsActive = TRUE
-GROUP BY
-    s.StationID, s.Name, s.Location, s.Capacity;
+    s.IsActive = TRUE;
 
 CREATE OR REPLACE VIEW v_VehicleDetails AS
 SELECT
@@ -93,79 +91,17 @@ BEGIN
     END IF;
 
     COMMIT;
+
+    -- For the caller's audit event
+    SELECT v_LogID AS LogID;
 END$$
 
 DELIMITER ;
 
+-- Bookings are made by booking.py, which prices rides with pricing.py and pays
+-- through wallet holds. The old procedure did neither, so it is dropped.
 DROP PROCEDURE IF EXISTS sp_CreateBooking;
 
-DELIMITER //
-
-CREATE PROCEDURE sp_CreateBooking(
-    IN p_UserID INT,
-    IN p_VehicleID INT,
-    IN p_StartStationID INT,
-    IN p_DurationHours DECIMAL(5,2)
-)
-BEGIN
-    DECLARE v_rate, v_cost, v_balance DECIMAL(10,2);
-    DECLARE v_discount DECIMAL(5,2) DEFAULT 0.00;
-    DECLARE v_start_time, v_end_time DATETIME;
-
-    START TRANSACTION;
-
-    SELECT RatePerHour INTO v_rate
-    FROM Vehicles
-    WHERE VehicleID = p_VehicleID AND Status = 'available'
-    FOR UPDATE;
-
-    IF v_rate IS NULL THEN
-        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Vehicle not available';
-    END IF;
-
-    SELECT 
-        CASE 
-            WHEN mp.PlanName = 'Basic Plan' THEN 0.05
-            WHEN mp.PlanName = 'Premium Plan' THEN 0.10
-            WHEN mp.PlanName = 'Annual Plan' THEN 0.15
-            ELSE 0.00
-        END INTO v_discount
-    FROM Users u
-    LEFT JOIN MembershipPlans mp ON u.PlanID = mp.PlanID
-    WHERE u.UserID = p_UserID;
-
-    SET v_cost = (v_rate * p_DurationHours) * (1 - v_discount);
-
-    SELECT WalletBalance INTO v_balance
-    FROM Users
-    WHERE UserID = p_UserID
-    FOR UPDATE;
-
-    IF v_balance < v_cost THEN
-        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Insufficient balance';
-    END IF;
-
-    SET v_start_time = NOW();
-    SET v_end_time = DATE_ADD(v_start_time, INTERVAL p_DurationHours HOUR);
-
-    INSERT INTO Trips(UserID, VehicleID, StartStationID, StartTime, EndTime, Cost, Status)
-    VALUES(p_UserID, p_VehicleID, p_StartStationID, v_start_time, v_end_time, v_cost, 'Ongoing');
-
-    UPDATE Vehicles
-    SET Status = 'in-use'
-    WHERE VehicleID = p_VehicleID;
-
-    UPDATE Users
-    SET WalletBalance = WalletBalance - v_cost
-    WHERE UserID = p_UserID;
-
-    INSERT INTO Payments(TripID, UserID, Amount, Status)
-    VALUES(LAST_INSERT_ID(), p_UserID, v_cost, 'Success');
-
-    COMMIT;
-END //
-
-DELIMITER ;
 DROP PROCEDURE IF EXISTS sp_EndRide;
 DELIMITER //
 
@@ -213,22 +149,33 @@ BEGIN
     WHERE TripID = p_TripID
     FOR UPDATE;
 
-    IF v_TripStatus != 'Ongoing' THEN
-        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only ongoing trips can be cancelled';
+    IF v_TripStatus NOT IN ('Ongoing', 'Upcoming') THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only ongoing or upcoming trips can be cancelled';
     END IF;
 
-    UPDATE Trips
-    SET Status = 'Cancelled', EndTime = NOW()
-    WHERE TripID = p_TripID;
+    IF v_TripStatus = 'Ongoing' THEN
+        UPDATE Trips
+        SET Status = 'Cancelled', EndTime = NOW()
+        WHERE TripID = p_TripID;
+
+        UPDATE Vehicles v
+        JOIN Trips t ON v.VehicleID = t.VehicleID
+        SET v.Status = 'available', v.CurrentStationID = t.StartStationID
+        WHERE t.TripID = p_TripID;
+    ELSE
+        -- A reservation never took the vehicle, so only the trip changes.
+        UPDATE Trips
+        SET Status = 'Cancelled'
+        WHERE TripID = p_TripID;
+    END IF;
 
-    UPDATE Vehicles v
-    JOIN Trips t ON v.VehicleID = t.VehicleID
-    SET v.Status = 'available', v.CurrentStationID = t.StartStationID
-    WHERE t.TripID = p_TripID;
+    -- The refund is a ledger credit (migration 7), not an update of Users.WalletBalance
+    INSERT INTO WalletLedger (UserID, Amount, EntryType, TripID)
+    VALUES (v_UserID, v_Cost, 'refund', p_TripID);
 
-    UPDATE Users
-    SET WalletBalance = WalletBalance + v_Cost
-    WHERE UserID = v_UserID;
+    INSERT INTO WalletAccounts (UserID, Available)
+    VALUES (v_UserID, v_Cost)
+    ON DUPLICATE KEY UPDATE Available = Available + VALUES(Available);
 
     UPDATE Payments
     SET Status = 'Refunded'
@@ -16,6 +16,18 @@ CREATE TABLE IF NOT EXISTS Logs (
 -- ========================================================
 --  TRIGGERS FOR AUTOMATIC LOGGING
 -- ========================================================
+-- Each trigger is skipped when the session sets @app_audit (AUDIT_MODE=app),
+-- in which case the API writes these rows itself through audit.py.
+
+DROP TRIGGER IF EXISTS trg_after_trip_insert;
+DROP TRIGGER IF EXISTS trg_after_trip_update;
+DROP TRIGGER IF EXISTS trg_after_trip_delete;
+DROP TRIGGER IF EXISTS trg_after_payment_insert;
+DROP TRIGGER IF EXISTS trg_after_payment_update;
+DROP TRIGGER IF EXISTS trg_after_vehicle_update;
+DROP TRIGGER IF EXISTS trg_after_maintenance_insert;
+DROP TRIGGER IF EXISTS trg_after_maintenance_update;
+DROP TRIGGER IF EXISTS trg_after_user_update;
 
 -- ---- TRIPS LOGGING ----
 DELIMITER $$
@@ -24,41 +36,47 @@ CREATE TRIGGER trg_after_trip_insert
 AFTER INSERT ON Trips
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'Trips',
-        'INSERT',
-        NEW.TripID,
-        CONCAT('New trip created: UserID=', NEW.UserID,
-               ', VehicleID=', NEW.VehicleID,
-               ', Status=', NEW.Status)
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'Trips',
+            'INSERT',
+            NEW.TripID,
+            CONCAT('New trip created: UserID=', NEW.UserID,
+                   ', VehicleID=', NEW.VehicleID,
+                   ', Status=', NEW.Status)
+        );
+    END IF;
 END $$
 
 CREATE TRIGGER trg_after_trip_update
 AFTER UPDATE ON Trips
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'Trips',
-        'UPDATE',
-        NEW.TripID,
-        CONCAT('Trip updated from Status=', OLD.Status, ' to ', NEW.Status)
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'Trips',
+            'UPDATE',
+            NEW.TripID,
+            CONCAT('Trip updated from Status=', OLD.Status, ' to ', NEW.Status)
+        );
+    END IF;
 END $$
 
 CREATE TRIGGER trg_after_trip_delete
 AFTER DELETE ON Trips
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'Trips',
-        'DELETE',
-        OLD.TripID,
-        'Trip record deleted'
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'Trips',
+            'DELETE',
+            OLD.TripID,
+            'Trip record deleted'
+        );
+    END IF;
 END $$
 
 -- ---- PAYMENTS LOGGING ----
@@ -66,27 +84,31 @@ CREATE TRIGGER trg_after_payment_insert
 AFTER INSERT ON Payments
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'Payments',
-        'INSERT',
-        NEW.PaymentID,
-        CONCAT('Payment created: Amount=', NEW.Amount,
-               ', Status=', NEW.Status, ', UserID=', NEW.UserID)
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'Payments',
+            'INSERT',
+            NEW.PaymentID,
+            CONCAT('Payment created: Amount=', NEW.Amount,
+                   ', Status=', NEW.Status, ', UserID=', NEW.UserID)
+        );
+    END IF;
 END $$
 
 CREATE TRIGGER trg_after_payment_update
 AFTER UPDATE ON Payments
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'Payments',
-        'UPDATE',
-        NEW.PaymentID,
-        CONCAT('Payment status changed from ', OLD.Status, ' to ', NEW.Status)
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'Payments',
+            'UPDATE',
+            NEW.PaymentID,
+            CONCAT('Payment status changed from ', OLD.Status, ' to ', NEW.Status)
+        );
+    END IF;
 END $$
 
 -- ---- VEHICLE LOGGING ----
@@ -94,7 +116,7 @@ CREATE TRIGGER trg_after_vehicle_update
 AFTER UPDATE ON Vehicles
 FOR EACH ROW
 BEGIN
-    IF OLD.Status <> NEW.Status THEN
+    IF @app_audit IS NULL AND OLD.Status <> NEW.Status THEN
         INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
         VALUES (
             'Vehicles',
@@ -110,21 +132,23 @@ CREATE TRIGGER trg_after_maintenance_insert
 AFTER INSERT ON MaintenanceLogs
 FOR EACH ROW
 BEGIN
-    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
-    VALUES (
-        'MaintenanceLogs',
-        'INSERT',
-        NEW.LogID,
-        CONCAT('Maintenance issue reported for VehicleID=', NEW.VehicleID,
-               ', Issue: ', NEW.IssueReported)
-    );
+    IF @app_audit IS NULL THEN
+        INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+        VALUES (
+            'MaintenanceLogs',
+            'INSERT',
+            NEW.LogID,
+            CONCAT('Maintenance issue reported for VehicleID=', NEW.VehicleID,
+                   ', Issue: ', NEW.IssueReported)
+        );
+    END IF;
 END $$
 
 CREATE TRIGGER trg_after_maintenance_update
 AFTER UPDATE ON MaintenanceLogs
 FOR EACH ROW
 BEGIN
-    IF OLD.Status <> NEW.Status THEN
+    IF @app_audit IS NULL AND OLD.Status <> NEW.Status THEN
         INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
         VALUES (
             'MaintenanceLogs',
@@ -136,11 +160,13 @@ BEGIN
 END $$
 
 -- ---- USER LOGGING ----
+-- Wallet movements are WalletLedger rows since migration 7, which leaves
+-- WalletBalance unchanged; migration 10 logs them with trg_after_wallet_ledger_insert.
 CREATE TRIGGER trg_after_user_update
 AFTER UPDATE ON Users
 FOR EACH ROW
 BEGIN
-    IF OLD.WalletBalance <> NEW.WalletBalance THEN
+    IF @app_audit IS NULL AND OLD.WalletBalance <> NEW.WalletBalance THEN
         INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
         VALUES (
             'Users',
@@ -0,0 +1,459 @@
+"""
+Fleet analytics rollups.
+
+The admin analytics endpoints read three summary tables, never Trips or
+Payments directly:
+
+- StationHourlyUsage: per start station and hour, the trips started and the
+  vehicle-seconds spent riding. A trip's time is split across the hours it
+  spans.
+- RevenueDaily: per day, vehicle type and plan, the ride payments taken and
+  the refunds given.
+- TripDurationDaily: per day and vehicle type, the completed trips and their
+  total duration.
+
+The refresh_analytics job keeps them current. Each source is read from a
+watermark, which is the highest ID already folded in, kept in
+AnalyticsWatermarks. A run therefore costs what was added since the last one:
+
+- Payments are read by PaymentID and refunds by WalletLedger EntryID. Rows
+  newer than ANALYTICS_LAG seconds wait for the next run, so a row whose
+  transaction commits after one with a higher ID is never skipped (the same
+  rule as the wallet snapshots). Refunds come from the ledger because
+  cancelling a trip updates its Payments row instead of adding one.
+- A trip is only counted once it is Completed. New TripIDs (and any IDs
+  skipped below them) go to AnalyticsPendingTrips. Each run re-checks the
+  pending trips it saw longest ago. Completed trips are folded in, and
+  cancelled ones are dropped. An ID that still has no trip after
+  ANALYTICS_GAP_TTL seconds was a rolled-back insert, and is dropped too.
+
+Each batch's rollup upserts and its watermark or pending change commit
+together, so every row is counted exactly once. Rows are pulled as columns
+and grouped with numpy when it is installed and the batch is large enough,
+and with plain loops otherwise; both give the same sums. Revenue is
+attributed to the user's plan when the row is folded in.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:  # optional; rollups fall back to Python loops
+    numpy = None
+
+log = logging.getLogger(__name__)
+
+BATCH = int(os.environ.get("ANALYTICS_BATCH", 5000))
+LAG = int(os.environ.get("ANALYTICS_LAG", 60))
+GAP_TTL = int(os.environ.get("ANALYTICS_GAP_TTL", 600))
+VECTOR_MIN_ROWS = 64
+
+EPOCH = datetime(1970, 1, 1)
+HOUR = 3600
+DAY = 86400
+
+PAYMENTS = "payments"
+REFUNDS = "refunds"
+TRIPS = "trips"
+
+_lock = threading.Lock()
+_stats = {"payments": 0, "refunds": 0, "trips_queued": 0, "trips_folded": 0, "trips_dropped": 0,
+          "vectorized_batches": 0}
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+# -- columnar helpers --------------------------------------------------------
+
+def _seconds(values):
+    return [int((value - EPOCH).total_seconds()) for value in values]
+
+
+def _cents(values):
+    return [int((Decimal(value) * 100).to_integral_value()) for value in values]
+
+
+def _day(seconds):
+    return (EPOCH + timedelta(days=seconds // DAY)).date()
+
+
+def _hour(hour_index):
+    return EPOCH + timedelta(hours=hour_index)
+
+
+def _vectorize(rows):
+    if numpy is not None and rows >= VECTOR_MIN_ROWS:
+        _count("vectorized_batches")
+        return True
+    return False
+
+
+def group_sums(keys, values):
+    """
+    Sums each integer column in `values` per distinct tuple of the `keys`
+    columns (all columns the same length). Returns {key tuple: [sums]}.
+    """
+    rows = len(keys[0])
+    if not rows:
+        return {}
+    if _vectorize(rows):
+        combined = numpy.zeros(rows, dtype=numpy.int64)
+        for column in keys:
+            unique, codes = numpy.unique(numpy.asarray(column), return_inverse=True)
+            combined = combined * len(unique) + codes.reshape(-1)
+        _, first, group = numpy.unique(combined, return_index=True, return_inverse=True)
+        group = group.reshape(-1)
+        totals = []
+        for column in values:
+            total = numpy.zeros(len(first), dtype=numpy.int64)
+            numpy.add.at(total, group, numpy.asarray(column, dtype=numpy.int64))
+            totals.append(total.tolist())
+        return {
+            tuple(column[row] for column in keys): [total[index] for total in totals]
+            for index, row in enumerate(first.tolist())
+        }
+    result = {}
+    for row in range(rows):
+        key = tuple(column[row] for column in keys)
+        sums = result.get(key)
+        if sums is None:
+            sums = result[key] = [0] * len(values)
+        for index, column in enumerate(values):
+            sums[index] += column[row]
+    return result
+
+
+def split_hours(starts, ends):
+    """
+    Splits [start, end) second ranges at hour boundaries. Returns parallel
+    lists (row index, hour index since EPOCH, seconds in that hour).
+    """
+    if _vectorize(len(starts)):
+        start = numpy.asarray(starts, dtype=numpy.int64)
+        end = numpy.maximum(numpy.asarray(ends, dtype=numpy.int64), start)
+        first = start // HOUR
+        counts = numpy.maximum(end - 1, start) // HOUR - first + 1
+        rows = numpy.repeat(numpy.arange(len(start)), counts)
+        hours = first[rows] + numpy.arange(len(rows)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        seconds = numpy.minimum(end[rows], (hours + 1) * HOUR) - numpy.maximum(start[rows], hours * HOUR)
+        return rows.tolist(), hours.tolist(), seconds.tolist()
+    rows, hours, seconds = [], [], []
+    for row, (start, end) in enumerate(zip(starts, ends)):
+        end = max(end, start)
+        for hour in range(start // HOUR, max(end - 1, start) // HOUR + 1):
+            rows.append(row)
+            hours.append(hour)
+            seconds.append(min(end, (hour + 1) * HOUR) - max(start, hour * HOUR))
+    return rows, hours, seconds
+
+
+# -- watermarks --------------------------------------------------------------
+
+def _watermark(cur, source):
+    cur.execute("SELECT LastID FROM AnalyticsWatermarks WHERE Source = %s FOR UPDATE", (source,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def _advance(cur, source, last_id):
+    cur.execute("""
+        INSERT INTO AnalyticsWatermarks (Source, LastID) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE LastID = VALUES(LastID)
+    """, (source, last_id))
+
+
+def _settled(rows):
+    """The run of rows at the front that are older than LAG (column 1 is the age check)."""
+    for index, row in enumerate(rows):
+        if not row[1]:
+            return rows[:index]
+    return rows
+
+
+def _in_list(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+# -- refresh -----------------------------------------------------------------
+
+def _fold_revenue(cur, rows, count_column, amount_column):
+    """Upserts (time, amount, vehicle type, plan) rows into RevenueDaily."""
+    days = [_day(seconds) for seconds in _seconds([row[2] for row in rows])]
+    sums = group_sums(
+        [days, [row[4] for row in rows], [row[5] for row in rows]],
+        [[1] * len(rows), _cents([row[3] for row in rows])],
+    )
+    cur.executemany(f"""
+        INSERT INTO RevenueDaily (Day, VehicleType, PlanID, {count_column}, {amount_column})
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            {count_column} = {count_column} + VALUES({count_column}),
+            {amount_column} = {amount_column} + VALUES({amount_column})
+    """, [(day, vehicle_type, plan_id, count, Decimal(cents).scaleb(-2))
+          for (day, vehicle_type, plan_id), (count, cents) in sums.items()])
+
+
+def refresh_payments(conn):
+    """Folds the next BATCH settled payments into RevenueDaily. Returns (rows folded, whether there may be more)."""
+    cur = conn.cursor()
+    try:
+        low = _watermark(cur, PAYMENTS)
+        cur.execute("""
+            SELECT p.PaymentID, p.Timestamp <= NOW() - INTERVAL %s SECOND, p.Timestamp, p.Amount,
+                   COALESCE(v.Type, ''), COALESCE(u.PlanID, 0)
+            FROM Payments p
+            JOIN Users u ON u.UserID = p.UserID
+            LEFT JOIN Trips t ON t.TripID = p.TripID
+            LEFT JOIN Vehicles v ON v.VehicleID = t.VehicleID
+            WHERE p.PaymentID > %s
+            ORDER BY p.PaymentID
+            LIMIT %s
+        """, (LAG, low, BATCH))
+        fetched = cur.fetchall()
+        rows = _settled(fetched)
+        if not rows:
+            conn.commit()
+            return 0, False
+        _fold_revenue(cur, rows, "Payments", "Revenue")
+        _advance(cur, PAYMENTS, rows[-1][0])
+        conn.commit()
+        _count("payments", len(rows))
+        return len(rows), len(fetched) == BATCH and len(rows) == len(fetched)
+    finally:
+        cur.close()
+
+
+def refresh_refunds(conn):
+    """
+    Folds the refund entries among the next BATCH settled ledger entries into
+    RevenueDaily. Returns (entries read, whether there may be more).
+    """
+    cur = conn.cursor()
+    try:
+        low = _watermark(cur, REFUNDS)
+        cur.execute("""
+            SELECT l.EntryID, l.CreatedAt <= NOW() - INTERVAL %s SECOND, l.CreatedAt, l.Amount,
+                   COALESCE(v.Type, ''), COALESCE(u.PlanID, 0), l.EntryType
+            FROM WalletLedger l
+            JOIN Users u ON u.UserID = l.UserID
+            LEFT JOIN Trips t ON t.TripID = l.TripID
+            LEFT JOIN Vehicles v ON v.VehicleID = t.VehicleID
+            WHERE l.EntryID > %s
+            ORDER BY l.EntryID
+            LIMIT %s
+        """, (LAG, low, BATCH))
+        fetched = cur.fetchall()
+        rows = _settled(fetched)
+        if not rows:
+            conn.commit()
+            return 0, False
+        refunds = [row for row in rows if row[6] == "refund"]
+        if refunds:
+            _fold_revenue(cur, refunds, "Refunds", "Refunded")
+        _advance(cur, REFUNDS, rows[-1][0])
+        conn.commit()
+        _count("refunds", len(refunds))
+        return len(rows), len(fetched) == BATCH and len(rows) == len(fetched)
+    finally:
+        cur.close()
+
+
+def _missing_ids(low, ids):
+    """IDs in (low, ids[-1]] that are not in `ids` (sorted); from ids[0] on the first run."""
+    first = ids[0] if low == 0 else low + 1
+    if _vectorize(len(ids)):
+        return numpy.setdiff1d(numpy.arange(first, ids[-1] + 1), numpy.asarray(ids)).tolist()
+    present = set(ids)
+    return [trip_id for trip_id in range(first, ids[-1] + 1) if trip_id not in present]
+
+
+def queue_trips(conn):
+    """Adds the next BATCH new TripIDs to AnalyticsPendingTrips. Returns (IDs queued, whether there may be more)."""
+    cur = conn.cursor()
+    try:
+        low = _watermark(cur, TRIPS)
+        cur.execute("SELECT TripID FROM Trips WHERE TripID > %s ORDER BY TripID LIMIT %s", (low, BATCH))
+        ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            conn.commit()
+            return 0, False
+        # A skipped ID may be a booking that has not committed yet; re-check it like an open trip.
+        queued = _missing_ids(low, ids) + ids
+        cur.executemany("INSERT IGNORE INTO AnalyticsPendingTrips (TripID) VALUES (%s)",
+                        [(trip_id,) for trip_id in queued])
+        _advance(cur, TRIPS, ids[-1])
+        conn.commit()
+        _count("trips_queued", len(queued))
+        return len(ids), len(ids) == BATCH
+    finally:
+        cur.close()
+
+
+def _fold_trips(cur, trips):
+    """Upserts completed (TripID, station, start, end, vehicle type) rows into the trip rollups."""
+    stations = [trip[1] for trip in trips]
+    types = [trip[4] for trip in trips]
+    starts = _seconds([trip[2] for trip in trips])
+    ends = _seconds([trip[3] for trip in trips])
+
+    rows, hours, seconds = split_hours(starts, ends)
+    usage = group_sums([[stations[row] for row in rows], hours], [seconds])
+    started = group_sums([stations, [start // HOUR for start in starts]], [[1] * len(trips)])
+    cells = {key: [0, busy] for key, (busy,) in usage.items()}
+    for key, (count,) in started.items():
+        cells.setdefault(key, [0, 0])[0] = count
+    cur.executemany("""
+        INSERT INTO StationHourlyUsage (StationID, HourStart, Trips, BusySeconds) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE Trips = Trips + VALUES(Trips), BusySeconds = BusySeconds + VALUES(BusySeconds)
+    """, [(station, _hour(hour), count, busy) for (station, hour), (count, busy) in cells.items()])
+
+    durations = group_sums(
+        [[_day(start) for start in starts], types],
+        [[1] * len(trips), [max(end - start, 0) for start, end in zip(starts, ends)]],
+    )
+    cur.executemany("""
+        INSERT INTO TripDurationDaily (Day, VehicleType, Trips, DurationSeconds) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE Trips = Trips + VALUES(Trips), DurationSeconds = DurationSeconds + VALUES(DurationSeconds)
+    """, [(day, vehicle_type, count, total) for (day, vehicle_type), (count, total) in durations.items()])
+
+
+def fold_trips(conn):
+    """
+    Re-checks the BATCH pending trips seen longest ago and folds the completed
+    ones into the rollups. Returns (trips folded or dropped, whether there may be more).
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT p.TripID, t.Status, t.StartStationID, t.StartTime, t.EndTime, COALESCE(v.Type, ''),
+                   p.AddedAt <= NOW() - INTERVAL %s SECOND
+            FROM AnalyticsPendingTrips p
+            LEFT JOIN Trips t ON t.TripID = p.TripID
+            LEFT JOIN Vehicles v ON v.VehicleID = t.VehicleID
+            ORDER BY p.CheckedAt, p.TripID
+            LIMIT %s
+        """, (GAP_TTL, BATCH))
+        pending = cur.fetchall()
+        completed, dropped, still_open = [], [], []
+        for trip_id, status, station_id, start, end, vehicle_type, expired in pending:
+            if status == "Completed" and end is not None:
+                completed.append((trip_id, station_id, start, end, vehicle_type))
+            elif status == "Cancelled" or (status is None and expired):
+                dropped.append(trip_id)
+            else:
+                still_open.append(trip_id)
+        if completed:
+            _fold_trips(cur, completed)
+        done = [trip[0] for trip in completed] + dropped
+        if done:
+            cur.execute(f"DELETE FROM AnalyticsPendingTrips WHERE TripID IN ({_in_list(done)})", done)
+        if still_open:
+            cur.execute(f"UPDATE AnalyticsPendingTrips SET CheckedAt = NOW() WHERE TripID IN ({_in_list(still_open)})",
+                        still_open)
+        conn.commit()
+        _count("trips_folded", len(completed))
+        _count("trips_dropped", len(dropped))
+        return len(done), len(pending) == BATCH
+    finally:
+        cur.close()
+
+
+def refresh(conn):
+    """Scheduler batch: one batch from every source. Returns (rows handled, whether any source may have more)."""
+    total, more = 0, False
+    for step in (refresh_payments, refresh_refunds, queue_trips, fold_trips):
+        done, full = step(conn)
+        total += done
+        more = more or full
+    return total, more
+
+
+# -- reads -------------------------------------------------------------------
+
+def station_usage(conn, since, until, station_id=None, limit=1000):
+    """
+    Hourly rows from StationHourlyUsage in [since, until). Utilization is the
+    share of the station's current fleet (decommissioned vehicles excluded)
+    that was out on trips started there.
+    """
+    conditions = ["u.HourStart >= %s", "u.HourStart < %s"]
+    params = [since, until]
+    if station_id is not None:
+        conditions.append("u.StationID = %s")
+        params.append(station_id)
+    params.append(limit)
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT u.StationID, s.Name AS StationName, u.HourStart, u.Trips, u.BusySeconds,
+                   ROUND(u.BusySeconds / (3600 * NULLIF(f.Vehicles, 0)), 4) AS Utilization
+            FROM StationHourlyUsage u
+            JOIN Stations s ON s.StationID = u.StationID
+            LEFT JOIN (
+                SELECT CurrentStationID, COUNT(*) AS Vehicles FROM Vehicles
+                WHERE Status <> 'decommissioned'
+                GROUP BY CurrentStationID
+            ) f ON f.CurrentStationID = u.StationID
+            WHERE {" AND ".join(conditions)}
+            ORDER BY u.HourStart, u.StationID
+            LIMIT %s
+        """, tuple(params))
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+
+
+def revenue(conn, since, until):
+    """Payments, refunds and net revenue per vehicle type and plan for the days in [since, until)."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT r.VehicleType, r.PlanID, mp.PlanName,
+                   SUM(r.Payments) AS Payments, SUM(r.Revenue) AS Revenue,
+                   SUM(r.Refunds) AS Refunds, SUM(r.Refunded) AS Refunded,
+                   SUM(r.Revenue) - SUM(r.Refunded) AS NetRevenue
+            FROM RevenueDaily r
+            LEFT JOIN MembershipPlans mp ON mp.PlanID = r.PlanID
+            WHERE r.Day >= DATE(%s) AND r.Day < DATE(%s)
+            GROUP BY r.VehicleType, r.PlanID, mp.PlanName
+            ORDER BY NetRevenue DESC
+        """, (since, until))
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+
+
+def trip_durations(conn, since, until):
+    """Completed trips and their average duration per vehicle type, for trips started in [since, until)."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT VehicleType, SUM(Trips) AS Trips,
+                   ROUND(SUM(DurationSeconds) / SUM(Trips) / 60, 1) AS AvgMinutes
+            FROM TripDurationDaily
+            WHERE Day >= DATE(%s) AND Day < DATE(%s)
+            GROUP BY VehicleType
+            ORDER BY VehicleType
+        """, (since, until))
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+
+
+def analytics_stats():
+    with _lock:
+        data = dict(_stats)
+    data["numpy"] = numpy is not None
+    return data
@@ -1,41 +1,90 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import mysql.connector
 import hashlib  # for password hashing
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from db import init_pool, get_db, pool_stats
+import analytics
+import audit
+import booking
+import bulk
+import events
+import export
+import geo
+import http_cache
+import logstore
+import idempotency
+import json_provider
+import metrics
+import pricing
+import scheduler
+import sessions
+import wallet
+from cache import (
+    catalog_cache, STATIONS, VEHICLES, MEMBERSHIP_PLANS, FLEET_COUNTS, TECHNICIANS, TECHNICIAN_ASSIGNMENTS,
+)
+from pagination import (
+    InvalidCursor, decode_cursor, history_query, logs_query, next_cursor, parse_limit, parse_time,
+)
 
 app = Flask(__name__)
+json_provider.init_json(app)
+init_pool(app)
+sessions.init_sessions(app)
+audit.init_audit(app)
+metrics.init_metrics(app)
+metrics.register_gauges("db_pool", "Connection pool counters", pool_stats)
+metrics.register_gauges("catalog_cache", "Catalog cache counters", catalog_cache.stats)
+metrics.register_gauges("audit_writer", "Application audit writer counters", audit.audit_stats)
+metrics.register_gauges("booking", "Booking outcome counters", booking.booking_stats)
+metrics.register_gauges("events", "Availability event stream counters", events.events_stats)
+metrics.register_gauges("idempotency", "Idempotency-Key outcome counters", idempotency.idempotency_stats)
+metrics.register_gauges("wallet", "Wallet hold and ledger counters", wallet.wallet_stats)
+metrics.register_gauges("sessions", "Session token and user context cache counters", sessions.session_stats)
+metrics.register_gauges("analytics", "Analytics rollup refresh counters", analytics.analytics_stats)
+metrics.register_gauges("logstore", "Logs partition maintenance and archival counters", logstore.logstore_stats)
+scheduler.init_scheduler(app)
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-
-def create_db_connection():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="root",  # e.g., 'root'
-        password="WJ28@krhps",
-        database="ev_rental_db"
-    )
-    return connection
-
 @app.route('/api/health', methods=['GET'])
 def health():
     """Simple health check endpoint to validate the API and optional DB connectivity."""
     db_ok = True
+    cur = None
     try:
-        conn = create_db_connection()
-        cur = conn.cursor()
+        cur = get_db().cursor()
         cur.execute("SELECT 1")
         cur.fetchone()
     except Exception:
         db_ok = False
     finally:
-        try:
-            if 'cur' in locals() and cur:
-                cur.close()
-        finally:
-            if 'conn' in locals() and conn:
-                conn.close()
-    return jsonify({"status": "ok", "db": db_ok}), 200
+        if cur is not None:
+            cur.close()
+    return jsonify({
+        "status": "ok",
+        "db": db_ok,
+        "pool": pool_stats(),
+        "cache": catalog_cache.stats(),
+        "audit": audit.audit_stats(),
+        "booking": booking.booking_stats(),
+        "geo": geo.station_index.stats(),
+        "scheduler": scheduler.scheduler_stats(),
+        "pricing": pricing.price_book.stats(),
+        "idempotency": idempotency.idempotency_stats(),
+        "events": events.events_stats(),
+        "wallet": wallet.wallet_stats(),
+        "sessions": sessions.session_stats(),
+        "logstore": logstore.logstore_stats(),
+        "analytics": analytics.analytics_stats(),
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL and pool metrics in Prometheus text format."""
+    return metrics.metrics_response()
 
 @app.route('/api/vehicles/<int:vehicle_id>/report', methods=['POST'])
 def report_vehicle_issue(vehicle_id):
@@ -46,13 +95,13 @@ def report_vehicle_issue(vehicle_id):
     try:
         data = request.get_json()
         issue = data['IssueReported']
-        user_id = data.get('user_id')  # Get user_id from request
-        user_role = data.get('user_role', 'user')  # Get user role
+        user_id = sessions.user_id(data.get('user_id'))  # Get user_id from the session or request
+        user_role = sessions.user_role(data.get('user_role', 'user'))  # Get user role
         
         if not user_id:
             return jsonify({"error": "User ID required"}), 400
         
-        connection = create_db_connection()
+        connection = get_db()
         cursor = connection.cursor(dictionary=True)
         
         # If user is not admin, check if they have an ongoing ride with this vehicle
@@ -65,13 +114,17 @@ def report_vehicle_issue(vehicle_id):
             
             if not ongoing_trip:
                 cursor.close()
-                connection.close()
                 return jsonify({"error": "You can only report issues for vehicles you have an ongoing ride with"}), 403
         
         cursor.callproc('sp_ReportAndAssignMaintenance', [vehicle_id, issue])
+        # The procedure ends with SELECT v_LogID (re-run DML.sql on older databases)
+        log_ids = [row[0] for result in cursor.stored_results() for row in result.fetchall()]
         connection.commit()
         cursor.close()
-        connection.close()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS, TECHNICIANS, TECHNICIAN_ASSIGNMENTS)
+        events.publish_vehicles(connection, [vehicle_id])
+        audit.emit('MaintenanceLogs', 'INSERT', log_ids[0] if log_ids else None,
+                   f"Maintenance issue reported for VehicleID={vehicle_id}, Issue: {issue}", user_id)
         return jsonify({"message": f"Issue for vehicle {vehicle_id} reported successfully. A technician has been assigned."})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -80,18 +133,17 @@ def report_vehicle_issue(vehicle_id):
 @app.route('/api/register', methods=['POST'])
 def register_user():
     data = request.json
-    conn = None
     cur = None
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
 
         # Hash the password before storing
         hashed_pw = hash_password(data['password'])
 
         cur.execute("""
-            INSERT INTO Users (Name, Email, Password, WalletBalance, JoinDate)
-            VALUES (%s, %s, %s, 0.0, CURDATE())
+            INSERT INTO Users (Name, Email, Password, JoinDate)
+            VALUES (%s, %s, %s, CURDATE())
         """, (data['name'], data['email'], hashed_pw))
 
         conn.commit()
@@ -101,12 +153,8 @@ def register_user():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
-        try:
-            if cur is not None:
-                cur.close()
-        finally:
-            if conn is not None:
-                conn.close()
+        if cur is not None:
+            cur.close()
 
 # Login
 @app.route('/api/login', methods=['POST'])
@@ -116,25 +164,12 @@ def login_user():
     password = data['password']
 
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
 
-        cur.execute("""
-            SELECT 
-                u.UserID, u.Name, u.Email, u.WalletBalance, u.JoinDate, u.Password, u.Role,
-                u.PlanID,
-                mp.PlanName,
-                CASE 
-                    WHEN mp.PlanName = 'Basic Plan' THEN 0.05
-                    WHEN mp.PlanName = 'Premium Plan' THEN 0.10
-                    WHEN mp.PlanName = 'Annual Plan' THEN 0.15
-                    ELSE 0.00
-                END AS PlanDiscount
-            FROM Users u
-            LEFT JOIN MembershipPlans mp ON u.PlanID = mp.PlanID
-            WHERE u.Email = %s
-        """, (email,))
+        cur.execute("SELECT UserID, Password FROM Users WHERE Email = %s", (email,))
         user = cur.fetchone()
+        conn.commit()
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -143,54 +178,238 @@ def login_user():
         if hashed_pw != user['Password']:
             return jsonify({"error": "Invalid password"}), 401
 
-        user.pop('Password')
-        return jsonify({"message": "Login successful", "user": user}), 200
+        # The profile, plan and balance come from the session context cache.
+        return jsonify({
+            "message": "Login successful",
+            "user": sessions.context(user['UserID']),
+            "token": sessions.issue(user['UserID'], user['Password']),
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 #BOOKING
 @app.route('/api/book', methods=['POST'])
+@idempotency.idempotent
 def book_ride():
+    """
+    Books a ride starting now. Set "auto_pick": true to take another available
+    vehicle of the same type at the station if the requested one was just taken.
+    """
     data = request.json
     try:
-        conn = create_db_connection()
-        cur = conn.cursor()
-        cur.callproc("sp_CreateBooking", (
-            data['user_id'], data['vehicle_id'], data['start_station_id'], data['duration_hours']
-        ))
-        conn.commit()
-        return jsonify({"message": "Ride booked successfully"})
+        user_id = sessions.user_id() or data['user_id']
+        result = booking.create_booking(
+            get_db(), user_id, data['vehicle_id'], data['start_station_id'], data['duration_hours'],
+            auto_pick=bool(data.get('auto_pick', False)),
+        )
+    except KeyError as e:
+        return jsonify({"error": f"Missing field {e}"}), 400
+    except booking.BookingError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    finally:
-        if 'cur' in locals() and cur:
+
+    catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
+    sessions.invalidate(user_id)
+    events.publish_vehicles(get_db(), [result['vehicle_id']])
+    audit.emit('Trips', 'INSERT', result['trip_id'],
+               f"New trip created: UserID={user_id}, VehicleID={result['vehicle_id']}, Status=Ongoing",
+               user_id)
+    audit.emit('Vehicles', 'UPDATE', result['vehicle_id'],
+               "Vehicle status changed from available to in-use", user_id)
+    audit.emit('Users', 'UPDATE', user_id, f"Wallet charged {result['cost']} for TripID={result['trip_id']}", user_id)
+    audit.emit('Payments', 'INSERT', result['payment_id'],
+               f"Payment created: Amount={result['cost']}, Status=Success, UserID={user_id}", user_id)
+    return jsonify({
+        "message": "Ride booked successfully",
+        "trip_id": result['trip_id'],
+        "vehicle_id": result['vehicle_id'],
+        "cost": result['cost'],
+    })
+
+def _local_time(value):
+    """Aware datetimes from the client become naive local time, matching DATETIME columns."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@app.route('/api/reservations', methods=['POST'])
+def reserve_vehicle():
+    """
+    Reserves a vehicle for a future window, e.g.
+    {"user_id": 1, "vehicle_id": 4, "start_time": "2024-06-01T09:00", "end_time": "2024-06-01T11:00"}
+    Creates an Upcoming trip at the vehicle's current station and charges the wallet now.
+    Returns 409 if the vehicle is already booked for part of the window.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        user_id = sessions.user_id() or data['user_id']
+        vehicle_id = data['vehicle_id']
+        start = _local_time(parse_time(data.get('start_time'), 'start_time'))
+        end = _local_time(parse_time(data.get('end_time'), 'end_time'))
+    except KeyError as e:
+        return jsonify({"error": f"Missing field {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = booking.create_reservation(get_db(), user_id, vehicle_id, start, end)
+    except booking.BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    sessions.invalidate(user_id)
+
+    audit.emit('Trips', 'INSERT', result['trip_id'],
+               f"New trip created: UserID={user_id}, VehicleID={vehicle_id}, Status=Upcoming", user_id)
+    audit.emit('Users', 'UPDATE', user_id, f"Wallet charged {result['cost']} for TripID={result['trip_id']}", user_id)
+    audit.emit('Payments', 'INSERT', result['payment_id'],
+               f"Payment created: Amount={result['cost']}, Status=Success, UserID={user_id}", user_id)
+    result.pop('payment_id')
+    return jsonify(dict(result, message="Vehicle reserved successfully")), 201
+
+
+@app.route('/api/stations/<int:station_id>/availability', methods=['GET'])
+def get_station_availability(station_id):
+    """
+    Vehicles at a station that can be reserved for a window.
+    e.g., /api/stations/1/availability?start=2024-06-01T09:00&end=2024-06-01T11:00&type=Scooter
+    """
+    try:
+        start = _local_time(parse_time(request.args.get('start'), 'start'))
+        end = _local_time(parse_time(request.args.get('end'), 'end'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if start is None or end is None:
+        return jsonify({"error": "start and end are required"}), 400
+    if end <= start:
+        return jsonify({"error": "end must be after start"}), 400
+    try:
+        return jsonify(booking.available_for_window(get_db(), station_id, start, end, request.args.get('type')))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events stream of availability changes:
+      - vehicle: {"VehicleID", "Status", "StationID", "Type"} after a booking, end, cancel,
+        maintenance report/completion, decommission or new vehicle
+      - station: {"StationID", "AvailableVehicles"} for the stations those touched
+      - stations: every station's count, sent periodically
+      - resync: the stream fell behind; re-fetch the lists
+    Optional ?stations=1,2,3 limits vehicle/station events to those stations.
+    Reconnecting clients send Last-Event-ID (EventSource does this itself); an id
+    from another worker process gets a resync.
+    """
+    station_ids = None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        if request.args.get('stations'):
+            station_ids = {int(part) for part in request.args['stations'].split(',') if part.strip()}
+    except ValueError:
+        return jsonify({"error": "stations must be integers"}), 400
+
+    try:
+        subscriber = events.hub.subscribe(station_ids, last_event_id)
+    except events.TooManySubscribers as e:
+        return jsonify({"error": str(e)}), 503
+    # No get_db() here: an open stream must not hold a pooled connection.
+    return Response(events.stream(subscriber), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx: pass events through as they are written
+    })
+
+
+def _quote_seconds(value):
+    try:
+        hours = Decimal(str(value)).quantize(booking.CENT)
+    except Exception:
+        raise ValueError("Invalid duration_hours")
+    if hours <= 0:
+        raise ValueError("duration_hours must be positive")
+    return int(hours * 3600)
+
+
+@app.route('/api/quotes', methods=['POST'])
+def get_quotes():
+    """
+    Prices many rides in one call, at the same prices /api/book and
+    /api/reservations would charge. Either every available vehicle at a station:
+        {"station_id": 3, "duration_hours": 2, "user_id": 1}
+    or a list of vehicles:
+        {"user_id": 1, "items": [{"vehicle_id": 4, "duration_hours": 2}, ...]}
+    user_id applies the user's plan discount; start_time (default now) picks the time-of-day band.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        start = _local_time(parse_time(data.get('start_time'), 'start_time'))
+        if 'items' in data:
+            items = data['items']
+            if not isinstance(items, list) or not items:
+                raise ValueError("items must be a non-empty list")
+            if len(items) > pricing.MAX_QUOTE_ITEMS:
+                raise ValueError(f"At most {pricing.MAX_QUOTE_ITEMS} items per request")
+            pairs = [(int(item['vehicle_id']), _quote_seconds(item.get('duration_hours'))) for item in items]
+        else:
+            station_id = int(data['station_id'])
+            seconds = _quote_seconds(data.get('duration_hours'))
+    except KeyError as e:
+        return jsonify({"error": f"Missing field {e}"}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            session_user = sessions.current_user()
+            if session_user is not None:
+                plan_id = session_user['PlanID']
+            else:
+                plan_id = booking.user_plan(cur, data['user_id']) if data.get('user_id') is not None else None
+            if start is None:
+                cur.execute("SELECT NOW()")
+                start = cur.fetchone()[0]
+            conn.commit()
+        finally:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
+        if 'items' in data:
+            quotes = pricing.quote_vehicles(conn, pairs, start, plan_id)
+        else:
+            quotes = pricing.quote_station(conn, station_id, seconds, start, plan_id)
+        return jsonify({"start_time": start, "quotes": quotes}), 200
+    except booking.BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
 #END RIDE
 @app.route('/api/endride', methods=['POST'])
 def end_ride():
     data = request.json
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.callproc("sp_EndRide", (data['trip_id'], data['end_station_id']))
         conn.commit()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
+        events.publish_trip(conn, data['trip_id'])
+        audit.emit('Trips', 'UPDATE', data['trip_id'],
+                   f"Trip updated from Status=Ongoing to Completed at StationID={data['end_station_id']}")
         return jsonify({"message": "Ride ended successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 #USER HISTORY
 @app.route('/api/user/<int:user_id>/rides', methods=['GET'])
@@ -199,63 +418,122 @@ def get_user_history(user_id):
     Gets a user's ride history, with an optional query param to filter by status.
     e.g., /api/user/1/rides?status=Ongoing
     e.g., /api/user/1/rides?status=Completed
+
+    Optional query params:
+      - since / until: ISO-8601 bounds on StartTime (until is exclusive)
+      - limit: page size (max 500); enables paging
+      - cursor: value of the X-Next-Cursor header from the previous page
+    Without limit or cursor the full history is returned, as before.
     """
     # Get the status from query parameters
     status = request.args.get('status')
+    paged = bool(request.args.get('limit') or request.args.get('cursor'))
+
+    try:
+        since = parse_time(request.args.get('since'), 'since')
+        until = parse_time(request.args.get('until'), 'until')
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (InvalidCursor, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    limit = parse_limit(request.args.get('limit'), 100, 500)
+
+    conn = get_db()
+    cur = conn.cursor()
     
-    conn = create_db_connection()
-    cur = conn.cursor(dictionary=True)
-    
-    query = "SELECT * FROM v_UserTripHistory WHERE UserID = %s"
-    params = [user_id]
-    
-    # If a status is provided, add it to the query
-    if status:
-        query += " AND Status = %s"
-        params.append(status)
-        
-    query += " ORDER BY StartTime DESC" # Show most recent first
-    
-    cur.execute(query, tuple(params))
-    trips = cur.fetchall()
-    
+    # Most recent first; paged requests fetch one extra row to know whether another page exists
+    query, params = history_query(user_id, status, since, until, cursor, limit if paged else None)
+    cur.execute(query, params)
+    trips = json_provider.fetch_rows(cur)
     cur.close()
-    conn.close()
-    return jsonify(trips)
 
+    cursor_token = None
+    if paged:
+        trips, cursor_token = next_cursor(trips, limit, 'StartTime', 'TripID')
 
-@app.route('/api/user/<int:user_id>/profile', methods=['GET'])
-def get_user_profile(user_id):
-    """Get user profile with plan and discount."""
+    response = json_provider.rows_response(trips)
+    if cursor_token:
+        response.headers['X-Next-Cursor'] = cursor_token
+    return response
+
+
+def fleet_counts():
+    """Active stations, non-decommissioned vehicles and available vehicles, cached like the catalog."""
+    def load():
+        cur = get_db().cursor(dictionary=True)
+        try:
+            cur.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM Stations WHERE IsActive = TRUE) AS TotalStations,
+                    COUNT(*) AS TotalVehicles,
+                    COALESCE(SUM(Status = 'available'), 0) AS AvailableVehicles
+                FROM Vehicles
+                WHERE Status != 'decommissioned'
+            """)
+            return cur.fetchone()
+        finally:
+            cur.close()
+
+    return catalog_cache.get_or_load(FLEET_COUNTS, load)
+
+
+@app.route('/api/user/<int:user_id>/dashboard', methods=['GET'])
+def get_user_dashboard(user_id):
+    """
+    Everything the dashboard shows in one round trip: fleet counts, the
+    user's ride count and wallet balance, and their ongoing ride (or null).
+    Carries an ETag of the body, so an unchanged dashboard costs a 304.
+    """
     try:
-        conn = create_db_connection()
+        counts = fleet_counts()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
         cur.execute("""
-            SELECT 
-                u.UserID, u.Name, u.Email, u.WalletBalance, u.JoinDate, u.Role,
-                u.PlanID,
-                mp.PlanName,
-                CASE 
-                    WHEN mp.PlanName = 'Basic Plan' THEN 0.05
-                    WHEN mp.PlanName = 'Premium Plan' THEN 0.10
-                    WHEN mp.PlanName = 'Annual Plan' THEN 0.15
-                    ELSE 0.00
-                END AS PlanDiscount
+            SELECT (SELECT COUNT(*) FROM Trips t WHERE t.UserID = u.UserID) AS TotalRides
             FROM Users u
-            LEFT JOIN MembershipPlans mp ON u.PlanID = mp.PlanID
             WHERE u.UserID = %s
         """, (user_id,))
         user = cur.fetchone()
         if not user:
             return jsonify({"error": "User not found"}), 404
-        return jsonify(user), 200
+        user['WalletBalance'] = wallet.available(conn, user_id)
+        cur.execute("""
+            SELECT TripID, VehicleType, StartStation, StartTime, EndTime, Cost, Status
+            FROM v_UserTripHistory
+            WHERE UserID = %s AND Status = 'Ongoing'
+            ORDER BY StartTime DESC, TripID DESC
+            LIMIT 1
+        """, (user_id,))
+        ongoing = cur.fetchone()
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
+
+    response = jsonify({
+        "totalStations": counts["TotalStations"],
+        "totalVehicles": counts["TotalVehicles"],
+        "availableVehicles": int(counts["AvailableVehicles"]),
+        "totalRides": user["TotalRides"],
+        "walletBalance": user["WalletBalance"],
+        "ongoingRide": ongoing,
+    })
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    # Per-user and must be revalidated every time; the 304 is what saves the transfer.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/user/<int:user_id>/profile', methods=['GET'])
+def get_user_profile(user_id):
+    """Get user profile with plan and discount, from the session context cache."""
+    try:
+        user = sessions.context(user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(user), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @app.route('/api/user/<int:user_id>/profile', methods=['PUT'])
@@ -268,7 +546,7 @@ def update_user_profile(user_id):
     password = data.get('password')
 
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         
         if name:
@@ -279,6 +557,7 @@ def update_user_profile(user_id):
             cur.execute("UPDATE Users SET Password = %s WHERE UserID = %s", (hashed_pw, user_id))
             
         conn.commit()
+        sessions.invalidate(user_id)
         
         if cur.rowcount == 0:
             return jsonify({"error": "User not found"}), 404
@@ -289,10 +568,9 @@ def update_user_profile(user_id):
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 @app.route('/api/user/<int:user_id>/wallet/add', methods=['POST'])
+@idempotency.idempotent
 def add_to_wallet(user_id):
     """Add funds to user wallet."""
     data = request.json
@@ -307,22 +585,23 @@ def add_to_wallet(user_id):
         return jsonify({"error": "Missing 'amount' field"}), 400
 
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
-        cur.execute("UPDATE Users SET WalletBalance = WalletBalance + %s WHERE UserID = %s", (amount, user_id))
-        
-        if cur.rowcount == 0:
+        try:
+            wallet.credit(cur, user_id, amount, wallet.TOPUP)
+        except mysql.connector.IntegrityError:
+            conn.rollback()  # the ledger's foreign key: no such user
             return jsonify({"error": "User not found"}), 404
 
         conn.commit()
+        sessions.invalidate(user_id)
+        audit.emit('Users', 'UPDATE', user_id, f"Wallet topped up by {amount}", user_id)
         return jsonify({"message": f"Successfully added {amount} to wallet"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 @app.route('/api/stations/<int:station_id>/vehicles', methods=['GET'])
 def get_vehicles_at_station(station_id):
@@ -331,7 +610,7 @@ def get_vehicles_at_station(station_id):
     This replaces the need to call /api/vehicles and filter on the frontend.
     """
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
         # Use the v_VehicleDetails view for rich information
         query = """
@@ -359,31 +638,39 @@ def get_vehicles_at_station(station_id):
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 @app.route('/api/trip/<int:trip_id>/cancel', methods=['POST'])
 def cancel_trip(trip_id):
     """
-    Cancels an *ongoing* trip.
+    Cancels an ongoing trip or an upcoming reservation and refunds it.
     This relies on the new `sp_CancelTrip` stored procedure.
     """
     # You might want to add user authentication here to ensure
     # the user cancelling the trip is the one who booked it.
     
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
+        cur.execute("SELECT UserID FROM Trips WHERE TripID = %s", (trip_id,))
+        row = cur.fetchone()
+        cur.execute("SELECT PaymentID FROM Payments WHERE TripID = %s", (trip_id,))
+        payment_ids = [payment_id for (payment_id,) in cur.fetchall()]
         cur.callproc("sp_CancelTrip", (trip_id,))
         conn.commit()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
+        sessions.invalidate(row[0] if row else None)
+        events.publish_trip(conn, trip_id)
+        audit.emit('Trips', 'UPDATE', trip_id, "Trip updated to Status=Cancelled")
+        if row:
+            audit.emit('Users', 'UPDATE', row[0], f"Wallet refunded for TripID={trip_id}")
+        for payment_id in payment_ids:
+            audit.emit('Payments', 'UPDATE', payment_id, f"Payment for TripID={trip_id} changed to Refunded")
         return jsonify({"message": "Trip cancelled successfully. Funds have been refunded."})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals() and cur:
             cur.close()
-        if 'conn' in locals() and conn:
-            conn.close()
 
 @app.route('/api/trip/<int:trip_id>/review', methods=['POST'])
 def add_review(trip_id):
@@ -402,7 +689,7 @@ def add_review(trip_id):
         return jsonify({"error": "Invalid or missing 'rating'"}), 400
 
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
         
         # First, find the UserID and VehicleID from the trip
@@ -430,21 +717,23 @@ def add_review(trip_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
-        cur.close()
-        conn.close()
+        if 'cur' in locals() and cur:
+            cur.close()
 
 
 @app.route('/api/membership/plans', methods=['GET'])
 def get_membership_plans():
     """List membership plans."""
+    def load():
+        cur = get_db().cursor(dictionary=True)
+        try:
+            cur.execute("SELECT PlanID, PlanName, Cost, DurationMonths, Benefits, DiscountRate FROM MembershipPlans ORDER BY Cost")
+            return http_cache.Representation(cur.fetchall())
+        finally:
+            cur.close()
+
     try:
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT PlanID, PlanName, Cost, DurationMonths, Benefits FROM MembershipPlans ORDER BY Cost")
-        plans = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify(plans)
+        return http_cache.respond(catalog_cache.get_or_load(MEMBERSHIP_PLANS, load))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -453,30 +742,48 @@ def get_membership_plans():
 def purchase_membership():
     """Purchase a membership plan for a user."""
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = sessions.user_id(data.get('user_id'))
     plan_id = data.get('plan_id')
     if not user_id or not plan_id:
         return jsonify({"error": "user_id and plan_id are required"}), 400
     try:
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT Cost FROM MembershipPlans WHERE PlanID = %s", (plan_id,))
+        cur.execute("SELECT Cost, DurationMonths FROM MembershipPlans WHERE PlanID = %s", (plan_id,))
         plan = cur.fetchone()
         if not plan:
-            cur.close(); conn.close()
+            cur.close()
             return jsonify({"error": "Plan not found"}), 404
-        cur.execute("SELECT WalletBalance FROM Users WHERE UserID = %s FOR UPDATE", (user_id,))
-        user = cur.fetchone()
-        if not user:
-            cur.close(); conn.close()
+        cur.execute("SELECT UserID FROM Users WHERE UserID = %s", (user_id,))
+        if not cur.fetchone():
+            cur.close()
             return jsonify({"error": "User not found"}), 404
-        if float(user['WalletBalance']) < float(plan['Cost']):
-            cur.close(); conn.close()
+        conn.commit()  # the hold commits on its own
+        try:
+            hold = wallet.reserve(conn, user_id, plan['Cost'])
+        except wallet.InsufficientFunds:
+            cur.close()
             return jsonify({"error": "Insufficient wallet balance"}), 400
-        cur.execute("START TRANSACTION")
-        cur.execute("UPDATE Users SET WalletBalance = WalletBalance - %s, PlanID = %s WHERE UserID = %s", (plan['Cost'], plan_id, user_id))
-        conn.commit()
-        cur.close(); conn.close()
+        try:
+            # Renewing the current plan extends it; anything else starts now. PlanExpiresAt
+            # is assigned before PlanID so the IF still sees the old plan.
+            cur.execute("""
+                UPDATE Users
+                SET PlanExpiresAt = DATE_ADD(
+                        IF(PlanID = %s AND PlanExpiresAt > NOW(), PlanExpiresAt, NOW()), INTERVAL %s MONTH),
+                    PlanID = %s
+                WHERE UserID = %s
+            """, (plan_id, plan['DurationMonths'], plan_id, user_id))
+            wallet.capture(cur, hold, plan['Cost'], wallet.MEMBERSHIP)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            wallet.release(conn, hold)
+            raise
+        sessions.invalidate(user_id)
+        audit.emit('Users', 'UPDATE', user_id,
+                   f"Wallet charged {plan['Cost']} for membership PlanID={plan_id}", user_id)
+        cur.close()
         return jsonify({"message": "Membership purchased successfully"}), 200
     except Exception as e:
         if 'conn' in locals():
@@ -487,17 +794,18 @@ def purchase_membership():
 @app.route('/api/stations', methods=['GET'])
 def get_stations():
     """List active stations with vehicle counts."""
+    def load():
+        cur = get_db().cursor(dictionary=True)
+        try:
+            cur.execute("SELECT * FROM v_StationVehicleCount")
+            return http_cache.Representation(cur.fetchall())
+        finally:
+            cur.close()
+
     try:
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM v_StationVehicleCount")
-        stations = cur.fetchall()
-        return jsonify(stations)
+        return http_cache.respond(catalog_cache.get_or_load(STATIONS, load))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    finally:
-        cur.close()
-        conn.close()
 
 
 
@@ -507,17 +815,18 @@ def get_vehicles():
     """
     Gets all vehicles (excluding decommissioned ones) with their details.
     """
+    def load():
+        cur = get_db().cursor(dictionary=True)
+        try:
+            cur.execute("SELECT * FROM v_VehicleDetails")
+            return http_cache.Representation(cur.fetchall())
+        finally:
+            cur.close()
+
     try:
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM v_VehicleDetails")
-        vehicles = cur.fetchall()
-        return jsonify(vehicles)
+        return http_cache.respond(catalog_cache.get_or_load(VEHICLES, load))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    finally:
-        cur.close()
-        conn.close()
 
 
 @app.route('/api/vehicles/<int:vehicle_id>/decommission', methods=['PUT'])
@@ -528,21 +837,22 @@ def decommission_vehicle(vehicle_id):
     """
     try:
         data = request.get_json() or {}
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.execute("UPDATE Vehicles SET Status = 'decommissioned' WHERE VehicleID = %s", (vehicle_id,))
         if cur.rowcount == 0:
             cur.close()
-            conn.close()
             return jsonify({"error": "Vehicle not found"}), 404
         conn.commit()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
         cur.close()
-        conn.close()
+        events.publish_vehicles(conn, [vehicle_id])
+        audit.emit('Vehicles', 'UPDATE', vehicle_id, "Vehicle status changed to decommissioned")
         return jsonify({"message": f"Vehicle {vehicle_id} decommissioned successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -555,7 +865,7 @@ def add_station():
     """
     try:
         data = request.get_json()
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
@@ -563,20 +873,32 @@ def add_station():
         name = data.get('name')
         location = data.get('location')
         capacity = data.get('capacity')
+        latitude = data.get('latitude')
+        longitude = data.get('longitude')
         
         if not all([name, location, capacity]):
             return jsonify({"error": "Name, location, and capacity are required"}), 400
+        # Coordinates are optional, but only as a pair
+        if (latitude is None) != (longitude is None):
+            return jsonify({"error": "Provide both latitude and longitude, or neither"}), 400
+        if latitude is not None:
+            try:
+                latitude, longitude = geo.parse_coordinates(latitude, longitude)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.execute("""
-            INSERT INTO Stations (Name, Location, Capacity, IsActive)
-            VALUES (%s, %s, %s, TRUE)
-        """, (name, location, capacity))
+            INSERT INTO Stations (Name, Location, Capacity, Latitude, Longitude, IsActive)
+            VALUES (%s, %s, %s, %s, %s, TRUE)
+        """, (name, location, capacity, latitude, longitude))
         conn.commit()
+        catalog_cache.invalidate(STATIONS, FLEET_COUNTS)
         station_id = cur.lastrowid
         cur.close()
-        conn.close()
+        if latitude is not None:
+            geo.station_index.add(station_id, name, latitude, longitude)
         return jsonify({"message": "Station added successfully", "station_id": station_id}), 201
     except mysql.connector.IntegrityError:
         return jsonify({"error": "Station name already exists"}), 400
@@ -585,6 +907,50 @@ def add_station():
 
     # Note: Hard delete endpoint removed to prevent destructive operations.
 
+@app.route('/api/stations/nearby', methods=['GET'])
+def get_nearby_stations():
+    """
+    The k closest active stations to a point, nearest first.
+    e.g., /api/stations/nearby?lat=12.97&lon=77.59&k=5
+    Optional: radius_km to drop stations further away. Each station includes
+    DistanceKm and its live AvailableVehicles count.
+    """
+    try:
+        lat, lon = geo.parse_coordinates(request.args.get('lat'), request.args.get('lon'))
+        radius = float(request.args['radius_km']) if request.args.get('radius_km') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    k = parse_limit(request.args.get('k'), 5, geo.MAX_NEARBY)
+    try:
+        return jsonify(geo.nearby_stations(get_db(), lat, lon, k, radius))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/vehicles/nearest', methods=['GET'])
+def get_nearest_vehicle():
+    """
+    The closest available vehicle of a type to a point, with its station.
+    e.g., /api/vehicles/nearest?lat=12.97&lon=77.59&type=Scooter
+    Optional: radius_km. Returns 404 when nothing is available in range.
+    """
+    vehicle_type = request.args.get('type')
+    if not vehicle_type:
+        return jsonify({"error": "type is required"}), 400
+    try:
+        lat, lon = geo.parse_coordinates(request.args.get('lat'), request.args.get('lon'))
+        radius = float(request.args['radius_km']) if request.args.get('radius_km') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        vehicle = geo.nearest_available_vehicle(get_db(), lat, lon, vehicle_type, radius)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if vehicle is None:
+        return jsonify({"error": f"No available {vehicle_type} nearby"}), 404
+    return jsonify(vehicle)
+
+
 @app.route('/api/stations/<int:station_id>/deactivate', methods=['PUT'])
 def deactivate_station(station_id):
     """
@@ -593,29 +959,138 @@ def deactivate_station(station_id):
     """
     try:
         data = request.get_json() or {}
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.execute("UPDATE Stations SET IsActive = FALSE WHERE StationID = %s", (station_id,))
         if cur.rowcount == 0:
-            cur.close()
-            conn.close()
             return jsonify({"error": "Station not found"}), 404
         conn.commit()
-        cur.close()
-        conn.close()
+        catalog_cache.invalidate(STATIONS, FLEET_COUNTS)
+        geo.station_index.remove(station_id)
         return jsonify({"message": f"Station {station_id} deactivated successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     finally:
         if 'cur' in locals():
             cur.close()
-        if 'conn' in locals():
-            conn.close()
+
+@app.route('/api/stations/availability/reconcile', methods=['POST'])
+def reconcile_station_availability():
+    """
+    Compares the per-station availability counters with the Vehicles table. Admin only.
+    Returns the stations that drifted; pass {"fix": true} to rewrite their counters.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_role = sessions.user_role(data.get('user_role', 'user'))
+
+        if user_role != 'admin':
+            return jsonify({"error": "Admin access required"}), 403
+
+        fix = bool(data.get('fix', False))
+
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        cur.callproc('sp_ReconcileStationAvailability', (fix,))
+        drift = []
+        for result in cur.stored_results():
+            drift.extend(dict(zip(result.column_names, row)) for row in result.fetchall())
+        conn.commit()
+        cur.close()
+
+        if fix and drift:
+            catalog_cache.invalidate(STATIONS, FLEET_COUNTS)
+        return jsonify({"drift": drift, "fixed": fix and bool(drift)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/wallet/discrepancies', methods=['GET'])
+def get_wallet_discrepancies():
+    """
+    Lists what the reconcile_wallets job could not match: trips whose Payments
+    disagree with their ledger entries, and accounts whose spendable amount
+    drifted from the ledger. Admin only.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_role = sessions.user_role(data.get('user_role') or request.args.get('user_role', 'user'))
+
+        if user_role != 'admin':
+            return jsonify({"error": "Admin access required"}), 403
+
+        limit = parse_limit(request.args.get('limit'), 100, 500)
+        return jsonify(wallet.discrepancies(get_db(), limit)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Admin-only analytics, served from the rollups kept by the refresh_analytics job
+def _analytics_request(default_days):
+    """Returns (since, until, error response). The window defaults to the last `default_days` days."""
+    data = request.get_json(silent=True) or {}
+    user_role = sessions.user_role(data.get('user_role') or request.args.get('user_role', 'user'))
+    if user_role != 'admin':
+        return None, None, (jsonify({"error": "Admin access required"}), 403)
+    try:
+        since = _local_time(parse_time(request.args.get('since'), 'since'))
+        until = _local_time(parse_time(request.args.get('until'), 'until'))
+    except ValueError as e:
+        return None, None, (jsonify({"error": str(e)}), 400)
+    until = until or datetime.now()
+    return since or until - timedelta(days=default_days), until, None
+
+@app.route('/api/analytics/utilization', methods=['GET'])
+def get_station_utilization():
+    """
+    Per-station, per-hour trips started and vehicle time on the road, newest
+    data up to ANALYTICS_INTERVAL + ANALYTICS_LAG old. Admin only.
+    Optional query params:
+      - since / until: ISO-8601 bounds on the hour (default: the last 24 hours)
+      - station_id: one station
+      - limit: max rows (default 1000, max 10000)
+    """
+    try:
+        since, until, error = _analytics_request(1)
+        if error:
+            return error
+        station_id = request.args.get('station_id', type=int)
+        limit = parse_limit(request.args.get('limit'), 1000, 10000)
+        return jsonify(analytics.station_usage(get_db(), since, until, station_id, limit)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/analytics/revenue', methods=['GET'])
+def get_revenue_breakdown():
+    """
+    Ride payments, refunds and net revenue by vehicle type and membership plan.
+    Admin only. since / until are whole days (default: the last 30 days).
+    """
+    try:
+        since, until, error = _analytics_request(30)
+        if error:
+            return error
+        return jsonify(analytics.revenue(get_db(), since, until)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/analytics/durations', methods=['GET'])
+def get_trip_durations():
+    """
+    Completed trips and their average duration by vehicle type. Admin only.
+    since / until are whole days of the trips' start (default: the last 30 days).
+    """
+    try:
+        since, until, error = _analytics_request(30)
+        if error:
+            return error
+        return jsonify(analytics.trip_durations(get_db(), since, until)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
 # Admin-only routes for vehicles
 @app.route('/api/vehicles', methods=['POST'])
@@ -625,7 +1100,7 @@ def add_vehicle():
     """
     try:
         data = request.get_json()
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
@@ -640,22 +1115,103 @@ def add_vehicle():
         if not all([vehicle_type, model, manufacturer, rate_per_hour, registration_number]):
             return jsonify({"error": "Type, model, manufacturer, rate_per_hour, and registration_number are required"}), 400
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO Vehicles (RegistrationNumber, Type, Model, Manufacturer, RatePerHour, Status, CurrentStationID)
             VALUES (%s, %s, %s, %s, %s, 'available', %s)
         """, (registration_number, vehicle_type, model, manufacturer, rate_per_hour, station_id))
         conn.commit()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
         vehicle_id = cur.lastrowid
         cur.close()
-        conn.close()
+        events.publish_vehicles(conn, [vehicle_id])
         return jsonify({"message": "Vehicle added successfully", "vehicle_id": vehicle_id}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
     # Note: Hard delete endpoint removed; use decommission instead.
 
+def _bulk_onboard(entity, id_key, invalidate=(), on_insert=None):
+    """
+    Shared body of the bulk onboarding routes. Admin only.
+    If any row fails validation nothing is inserted and every error is returned.
+    Otherwise rows are inserted in chunks; rows rejected by the database are
+    reported individually and the rest are kept. on_insert(conn, ids) runs
+    once rows have gone in.
+    """
+    data = request.get_json(silent=True)
+    user_role = sessions.user_role(
+        (data.get('user_role') if isinstance(data, dict) else None)
+        or request.form.get('user_role')
+        or request.args.get('user_role', 'user')
+    )
+    if user_role != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+
+    try:
+        rows = bulk.parse_rows(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if not rows:
+        return jsonify({"error": "No rows supplied"}), 400
+    if len(rows) > bulk.MAX_ROWS:
+        return jsonify({"error": f"At most {bulk.MAX_ROWS} rows per request"}), 400
+
+    params, errors = bulk.validate(entity, rows)
+    if errors:
+        return jsonify({"error": "Validation failed; nothing was inserted", "errors": errors}), 400
+
+    conn = get_db()
+    try:
+        ids, errors = bulk.insert_rows(conn, entity, params)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    inserted = [{"row": i, id_key: row_id} for i, row_id in enumerate(ids) if row_id is not None]
+    if inserted:
+        if invalidate:
+            catalog_cache.invalidate(*invalidate)
+        if on_insert is not None:
+            on_insert(conn, [row[id_key] for row in inserted])
+    status = 201 if not errors else 207
+    return jsonify({"inserted": len(inserted), "ids": inserted, "errors": errors}), status
+
+
+@app.route('/api/vehicles/bulk', methods=['POST'])
+def add_vehicles_bulk():
+    """
+    Adds many vehicles from a JSON array or CSV upload. Admin only.
+    Fields: registration_number, type, model, manufacturer, rate_per_hour, station_id (optional)
+    """
+    return _bulk_onboard('vehicles', 'vehicle_id', invalidate=(STATIONS, VEHICLES, FLEET_COUNTS),
+                         on_insert=_publish_bulk_vehicles)
+
+
+def _publish_bulk_vehicles(conn, vehicle_ids):
+    # Availability events, as add_vehicle sends, a chunk of vehicles at a time
+    for start in range(0, len(vehicle_ids), bulk.CHUNK_SIZE):
+        events.publish_vehicles(conn, vehicle_ids[start:start + bulk.CHUNK_SIZE])
+
+
+@app.route('/api/stations/bulk', methods=['POST'])
+def add_stations_bulk():
+    """
+    Adds many stations from a JSON array or CSV upload. Admin only.
+    Fields: name, location, capacity, latitude (optional), longitude (optional)
+    """
+    return _bulk_onboard('stations', 'station_id', invalidate=(STATIONS, FLEET_COUNTS),
+                         on_insert=lambda conn, ids: geo.station_index.invalidate())
+
+
+@app.route('/api/technicians/bulk', methods=['POST'])
+def add_technicians_bulk():
+    """
+    Adds many technicians from a JSON array or CSV upload. Admin only.
+    Fields: name, specialization
+    """
+    return _bulk_onboard('technicians', 'technician_id', invalidate=(TECHNICIANS,))
+
 # Technician Management APIs (Admin only)
 @app.route('/api/technicians', methods=['GET'])
 def get_technicians():
@@ -667,18 +1223,20 @@ def get_technicians():
         # For GET requests, clients typically pass role via query params.
         # If a JSON body is sent with Content-Type set, parsing it silently avoids 400s on empty bodies.
         data = request.get_json(silent=True) or {}
-        user_role = data.get('user_role') or request.args.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role') or request.args.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM Technicians ORDER BY Name")
-        technicians = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify(technicians)
+        def load():
+            cur = get_db().cursor(dictionary=True)
+            try:
+                cur.execute("SELECT * FROM Technicians ORDER BY Name")
+                return http_cache.Representation(cur.fetchall())
+            finally:
+                cur.close()
+
+        return http_cache.respond(catalog_cache.get_or_load(TECHNICIANS, load))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -689,7 +1247,7 @@ def add_technician():
     """
     try:
         data = request.get_json()
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
@@ -700,7 +1258,7 @@ def add_technician():
         if not all([name, specialization]):
             return jsonify({"error": "Name and specialization are required"}), 400
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO Technicians (Name, Specialization, IsAvailable, ActiveAssignments)
@@ -709,7 +1267,7 @@ def add_technician():
         conn.commit()
         technician_id = cur.lastrowid
         cur.close()
-        conn.close()
+        catalog_cache.invalidate(TECHNICIANS)
         return jsonify({"message": "Technician added successfully", "technician_id": technician_id}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -721,7 +1279,7 @@ def update_technician(technician_id):
     """
     try:
         data = request.get_json()
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
@@ -730,7 +1288,7 @@ def update_technician(technician_id):
         specialization = data.get('specialization')
         is_available = data.get('is_available')
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor()
         
         updates = []
@@ -755,12 +1313,11 @@ def update_technician(technician_id):
         
         if cur.rowcount == 0:
             cur.close()
-            conn.close()
             return jsonify({"error": "Technician not found"}), 404
         
         conn.commit()
         cur.close()
-        conn.close()
+        catalog_cache.invalidate(TECHNICIANS, TECHNICIAN_ASSIGNMENTS)
         return jsonify({"message": "Technician updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -772,12 +1329,12 @@ def delete_technician(technician_id):
     """
     try:
         data = request.get_json() or {}
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
         
         # Check if technician has active assignments
@@ -786,18 +1343,16 @@ def delete_technician(technician_id):
         
         if not tech:
             cur.close()
-            conn.close()
             return jsonify({"error": "Technician not found"}), 404
         
         if tech['ActiveAssignments'] > 0:
             cur.close()
-            conn.close()
             return jsonify({"error": "Cannot delete technician with active assignments"}), 400
         
         cur.execute("DELETE FROM Technicians WHERE TechnicianID = %s", (technician_id,))
         conn.commit()
         cur.close()
-        conn.close()
+        catalog_cache.invalidate(TECHNICIANS)
         return jsonify({"message": "Technician deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -810,18 +1365,20 @@ def get_technician_assignments():
     try:
         # Same handling as /api/technicians: prefer query param, parse JSON silently if present
         data = request.get_json(silent=True) or {}
-        user_role = data.get('user_role') or request.args.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role') or request.args.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM v_TechnicianAssignments ORDER BY ReportedDate DESC")
-        assignments = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify(assignments)
+        def load():
+            cur = get_db().cursor(dictionary=True)
+            try:
+                cur.execute("SELECT * FROM v_TechnicianAssignments ORDER BY ReportedDate DESC")
+                return http_cache.Representation(cur.fetchall())
+            finally:
+                cur.close()
+
+        return http_cache.respond(catalog_cache.get_or_load(TECHNICIAN_ASSIGNMENTS, load))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -832,17 +1389,17 @@ def complete_maintenance_log(log_id):
     """
     try:
         data = request.get_json() or {}
-        user_role = data.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role', 'user'))
         
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
         
-        conn = create_db_connection()
+        conn = get_db()
         cur = conn.cursor(dictionary=True)
         
         # Get the assignment and technician
         cur.execute("""
-            SELECT ta.TechnicianID, ml.Status
+            SELECT ta.TechnicianID, ml.Status, ml.VehicleID
             FROM TechnicianAssignments ta
             JOIN MaintenanceLogs ml ON ta.LogID = ml.LogID
             WHERE ta.LogID = %s
@@ -851,12 +1408,10 @@ def complete_maintenance_log(log_id):
         
         if not assignment:
             cur.close()
-            conn.close()
             return jsonify({"error": "Assignment not found"}), 404
         
         if assignment['Status'] == 'Completed':
             cur.close()
-            conn.close()
             return jsonify({"error": "Maintenance log already completed"}), 400
         
         # Start transaction
@@ -881,8 +1436,13 @@ def complete_maintenance_log(log_id):
         """, (log_id,))
         
         conn.commit()
+        catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS, TECHNICIANS, TECHNICIAN_ASSIGNMENTS)
         cur.close()
-        conn.close()
+        events.publish_vehicles(conn, [assignment['VehicleID']])
+        audit.emit('MaintenanceLogs', 'UPDATE', log_id,
+                   f"Maintenance log status changed from {assignment['Status']} to Completed")
+        audit.emit('Vehicles', 'UPDATE', assignment['VehicleID'],
+                   "Vehicle status changed from under-maintenance to available")
         return jsonify({"message": "Maintenance log completed successfully"}), 200
     except Exception as e:
         if 'conn' in locals():
@@ -894,57 +1454,83 @@ def complete_maintenance_log(log_id):
 @app.route('/api/logs/', methods=['GET'])
 def get_logs():
     """
-    Returns recent audit logs. Admin only.
+    Returns recent audit logs, newest first. Admin only.
     Optional query params:
       - table: filter by TableName
       - limit: max rows (default 100, max 500)
+      - since / until: ISO-8601 bounds on ChangeTimestamp (until is exclusive)
+      - cursor: value of the X-Next-Cursor header from the previous page
     """
     try:
         # Prefer query param; parse JSON silently if present for flexibility
         data = request.get_json(silent=True) or {}
-        user_role = data.get('user_role') or request.args.get('user_role', 'user')
+        user_role = sessions.user_role(data.get('user_role') or request.args.get('user_role', 'user'))
 
         if user_role != 'admin':
             return jsonify({"error": "Admin access required"}), 403
 
         table = request.args.get('table') or data.get('table')
+        limit = parse_limit(request.args.get('limit') or data.get('limit'), 100, 500)
         try:
-            limit = int(request.args.get('limit') or data.get('limit') or 100)
-        except (TypeError, ValueError):
-            limit = 100
-        limit = max(1, min(limit, 500))
+            since = parse_time(request.args.get('since'), 'since')
+            until = parse_time(request.args.get('until'), 'until')
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except (InvalidCursor, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
 
-        conn = create_db_connection()
-        cur = conn.cursor(dictionary=True)
-
-        if table:
-            cur.execute(
-                """
-                SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp
-                FROM Logs
-                WHERE TableName = %s
-                ORDER BY ChangeTimestamp DESC, LogID DESC
-                LIMIT %s
-                """,
-                (table, limit),
-            )
-        else:
-            cur.execute(
-                """
-                SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp
-                FROM Logs
-                ORDER BY ChangeTimestamp DESC, LogID DESC
-                LIMIT %s
-                """,
-                (limit,),
-            )
-
-        logs = cur.fetchall()
+        conn = get_db()
+        cur = conn.cursor()
+        # Recent partitions first; widen to the whole range only when they cannot fill the page.
+        for lower in logstore.scan_windows(since, until, cursor):
+            cur.execute(*logs_query(table, lower, until, cursor, limit))
+            logs = json_provider.fetch_rows(cur)
+            if len(logs) > limit:
+                break
         cur.close()
-        conn.close()
-        return jsonify(logs), 200
+
+        logs, cursor_token = next_cursor(logs, limit, 'ChangeTimestamp', 'LogID')
+        response = json_provider.rows_response(logs)
+        if cursor_token:
+            response.headers['X-Next-Cursor'] = cursor_token
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+
+@app.route('/api/export/<table>', methods=['GET'])
+def export_table(table):
+    """
+    Streams a full extract of Logs, Trips or Payments. Admin only.
+    Optional query params:
+      - format: ndjson (default) or csv
+      - since / until: ISO-8601 bounds on the table's timestamp column (until is exclusive)
+    Rows are read in batches from an unbuffered cursor, so memory stays flat
+    regardless of how many rows are exported.
+    """
+    user_role = sessions.user_role(request.args.get('user_role', 'user'))
+    if user_role != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+
+    if table not in export.EXPORTS:
+        return jsonify({"error": f"Unknown table. Choose one of: {', '.join(export.EXPORTS)}"}), 400
+
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    try:
+        since = parse_time(request.args.get('since'), 'since')
+        until = parse_time(request.args.get('until'), 'until')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"{table.lower()}.{fmt}"
+    return Response(
+        export.export_chunks(table, fmt, since, until),
+        mimetype=export.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
 if __name__ == '__main__':
+    scheduler.start_scheduler()
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
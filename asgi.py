@@ -0,0 +1,219 @@
+"""
+Optional ASGI serving mode.
+
+    pip install starlette aiomysql uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The read endpoints that spend their time waiting on MySQL (ride history, audit
+logs, the vehicles at a station) are served by async handlers on an aiomysql
+pool, so a slow history or log scan holds a coroutine, not a worker thread.
+Everything else is the unchanged Flask app, mounted underneath and run on a
+thread pool; the async routes only shadow the paths listed in ROUTES.
+
+Request parsing, SQL and the JSON encoder are shared with app.py (pagination,
+json_provider), so both modes return the same status codes, headers and
+bodies. Bearer tokens go through sessions.resolve(), as in the Flask
+before_request hook. The aiomysql pool is sized by ASYNC_DB_POOL_MIN / ASYNC_DB_POOL_MAX and
+is separate from the Flask app's pool.
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # optional; Starlette's own adapter works, it is just slower
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import json_provider
+import logstore
+import metrics
+import scheduler
+import sessions
+from app import app as flask_app
+from db import db_config_from_env
+from pagination import (
+    InvalidCursor, decode_cursor, history_query, logs_query, next_cursor, parse_limit, parse_time,
+)
+
+POOL_MIN = int(os.environ.get("ASYNC_DB_POOL_MIN", 10))
+POOL_MAX = int(os.environ.get("ASYNC_DB_POOL_MAX", 100))
+METRICS = metrics.enabled()
+
+pool = None
+
+
+def _json(data, status=200, headers=None, sort_keys=True):
+    return Response(json_provider.encode(data, sort_keys=sort_keys), status_code=status,
+                    headers=headers, media_type="application/json")
+
+
+def _error(message, status):
+    return _json({"error": message}, status)
+
+
+async def _fetch(query, params, dictionary=False):
+    """Runs one SELECT on a pooled connection; returns (description, rows)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cur:
+            started = time.perf_counter()
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+            if METRICS:
+                statement = metrics.fingerprint(query)
+                metrics.SQL_LATENCY.observe((statement,), time.perf_counter() - started)
+                metrics.SQL_ROWS.inc((statement,), len(rows))
+            return cur.description, rows
+
+
+def _resolve_session(header):
+    # The user context cache and its loader are the Flask app's.
+    with flask_app.app_context():
+        return sessions.resolve(header)
+
+
+def _authenticated(endpoint):
+    """Applies sessions' bearer-token check, as the Flask before_request hook does."""
+    async def handler(request):
+        request.state.session_user = None
+        header = request.headers.get("authorization", "")
+        if header.startswith("Bearer "):
+            request.state.session_user, error = await run_in_threadpool(_resolve_session, header)
+            if error:
+                return _error(error, 401)
+        return await endpoint(request)
+    return handler
+
+
+def _paged(rows, cursor_token):
+    headers = {"X-Next-Cursor": cursor_token} if cursor_token else None
+    # Keys are already sorted by sorted_rows()
+    return _json(rows, headers=headers, sort_keys=False)
+
+
+async def user_history(request):
+    """Async twin of app.get_user_history."""
+    user_id = request.path_params["user_id"]
+    args = request.query_params
+    status = args.get('status')
+    paged = bool(args.get('limit') or args.get('cursor'))
+    try:
+        since = parse_time(args.get('since'), 'since')
+        until = parse_time(args.get('until'), 'until')
+        cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (InvalidCursor, ValueError) as e:
+        return _error(str(e), 400)
+    limit = parse_limit(args.get('limit'), 100, 500)
+
+    description, rows = await _fetch(*history_query(user_id, status, since, until, cursor,
+                                                    limit if paged else None))
+    trips = json_provider.sorted_rows(description, rows)
+    cursor_token = None
+    if paged:
+        trips, cursor_token = next_cursor(trips, limit, 'StartTime', 'TripID')
+    return _paged(trips, cursor_token)
+
+
+async def logs(request):
+    """Async twin of app.get_logs."""
+    try:
+        data = None
+        if request.headers.get("content-type", "").startswith("application/json"):
+            try:
+                data = await request.json()
+            except ValueError:
+                pass  # silent, like Flask's get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        args = request.query_params
+        user = request.state.session_user
+        user_role = user['Role'] if user is not None else (data.get('user_role') or args.get('user_role', 'user'))
+        if user_role != 'admin':
+            return _error("Admin access required", 403)
+
+        table = args.get('table') or data.get('table')
+        limit = parse_limit(args.get('limit') or data.get('limit'), 100, 500)
+        try:
+            since = parse_time(args.get('since'), 'since')
+            until = parse_time(args.get('until'), 'until')
+            cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+        except (InvalidCursor, ValueError) as e:
+            return _error(str(e), 400)
+
+        for lower in logstore.scan_windows(since, until, cursor):
+            description, rows = await _fetch(*logs_query(table, lower, until, cursor, limit))
+            if len(rows) > limit:
+                break
+        page, cursor_token = next_cursor(json_provider.sorted_rows(description, rows), limit,
+                                         'ChangeTimestamp', 'LogID')
+        return _paged(page, cursor_token)
+    except Exception as e:
+        return _error(str(e), 400)
+
+
+async def station_vehicles(request):
+    """Async twin of app.get_vehicles_at_station."""
+    try:
+        _, vehicles = await _fetch("""
+            SELECT
+                v.VehicleID, v.Type, v.Model, v.Manufacturer, v.RatePerHour, v.Status
+            FROM Vehicles v
+            WHERE v.CurrentStationID = %s AND v.Status = 'available'
+        """, (request.path_params["station_id"],), dictionary=True)
+        return _json(list(vehicles))
+    except Exception as e:
+        return _error(str(e), 400)
+
+
+def _route(path, rule, endpoint):
+    """A GET route whose latency is recorded under `rule`, the Flask rule of the same endpoint."""
+    endpoint = _authenticated(endpoint)
+    if not METRICS:
+        return Route(path, endpoint, methods=["GET"])
+
+    async def timed(request):
+        started = time.perf_counter()
+        response = await endpoint(request)
+        metrics.REQUEST_LATENCY.observe((request.method, rule, str(response.status_code)),
+                                        time.perf_counter() - started)
+        if response.status_code >= 400:
+            metrics.ERRORS.inc(("http", str(response.status_code)))
+        return response
+
+    return Route(path, timed, methods=["GET"])
+
+
+ROUTES = [
+    _route("/api/user/{user_id:int}/rides", "/api/user/<int:user_id>/rides", user_history),
+    _route("/api/logs", "/api/logs", logs),
+    _route("/api/logs/", "/api/logs/", logs),
+    _route("/api/stations/{station_id:int}/vehicles", "/api/stations/<int:station_id>/vehicles",
+           station_vehicles),
+]
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global pool
+    config = db_config_from_env()
+    pool = await aiomysql.create_pool(
+        host=config["host"], port=config["port"], user=config["user"], password=config["password"],
+        db=config["database"], minsize=POOL_MIN, maxsize=POOL_MAX, autocommit=True,
+    )
+    scheduler.start_scheduler()
+    try:
+        yield
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+app = Starlette(
+    routes=[*ROUTES, Mount("/", app=WSGIMiddleware(flask_app))],
+    lifespan=lifespan,
+)
@@ -0,0 +1,267 @@
+"""
+Application-side audit logging.
+
+With AUDIT_MODE=app the LOGS.sql triggers are switched off for the API's
+connections (via the @app_audit session variable) and mutating routes call
+emit() instead. Events are queued in-process and a background thread writes
+them to Logs with multi-row INSERTs once AUDIT_FLUSH_SIZE events are waiting
+or AUDIT_FLUSH_INTERVAL seconds have passed.
+
+If AUDIT_SPOOL_DIR is set, every event is appended to a spool file of this
+process's own in that directory before it is queued, and the file is rotated
+out once its events are committed. A batch whose write fails keeps its
+rotated file and is retried, ahead of newer ones, on the next flush. Each process holds an flock on its spool's
+.lock file while it runs. A starting worker replays (at-least-once) the
+spools whose lock nobody holds any more, i.e. those of crashed or stopped
+processes, one replayer at a time under the directory's replay.lock.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; spooling needs flock
+    fcntl = None
+
+import db
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PREFIX = "audit-"
+SPOOL_SUFFIX = ".spool"
+LOCK_SUFFIX = ".lock"
+REPLAY_LOCK = "replay.lock"
+
+INSERT_SQL = """
+    INSERT INTO Logs (TableName, OperationType, RecordID, ChangedBy, ChangeDescription)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+class AuditWriter:
+    def __init__(self, flush_size=200, flush_interval=1.0, spool_dir=None, max_queue=10000):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.spool_path = None
+        if spool_dir:
+            self._name = f"{SPOOL_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self.spool_path = os.path.join(spool_dir, self._name + SPOOL_SUFFIX)
+        self._owner_lock = None
+        # The spool file already backs queued events, so it is left unbounded
+        # there; otherwise a full queue pushes back on the emitting request.
+        self._queue = queue.Queue(maxsize=0 if spool_dir else max_queue)
+        self._spool_lock = threading.Lock()
+        self._spool = None
+        # (rotated spool file, events) of batches not written yet, oldest first
+        self._batches = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.stats = {"emitted": 0, "written": 0, "flushes": 0, "failures": 0, "replayed": 0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def stats_snapshot(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    # -- producer side ---------------------------------------------------
+
+    def emit(self, table, operation, record_id=None, description=None, changed_by=None):
+        event = (table, operation, record_id, changed_by, description)
+        if self.spool_path:
+            with self._spool_lock:
+                self._spool.write(json.dumps(event) + "\n")
+                self._spool.flush()
+                self._queue.put(event)
+        else:
+            self._queue.put(event)
+        self._count("emitted")
+
+    # -- writer side -----------------------------------------------------
+
+    def start(self):
+        if self.spool_path:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # Held until the process exits; the lock is what marks this spool as live.
+            self._owner_lock = open(os.path.join(self.spool_dir, self._name + LOCK_SUFFIX), "a")
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+            try:
+                self._replay_orphans()
+            except Exception:
+                logger.exception("Could not replay audit spools; leaving them for the next start")
+            self._spool = open(self.spool_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wait_for_batch()
+            self.flush()
+        self.flush()
+
+    def _wait_for_batch(self):
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set() and self._queue.qsize() < self.flush_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._stop.wait(min(remaining, 0.05))
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def flush(self):
+        """Writes everything queued so far. Returns the number of rows inserted."""
+        if self.spool_path:
+            return self._flush_spooled()
+        events = self._drain()
+        if not events:
+            return 0
+        try:
+            self._write(events)
+        except Exception:
+            self._count("failures")
+            logger.exception("Audit flush of %d events failed", len(events))
+            # Nothing durable to fall back on; requeue for the next attempt.
+            for event in events:
+                try:
+                    self._queue.put_nowait(event)
+                except queue.Full:
+                    logger.error("Audit queue full; dropped event %r", event)
+            return 0
+        return len(events)
+
+    def _flush_spooled(self):
+        # Take the queue and the spool together so the rotated file holds
+        # exactly the events in this batch.
+        with self._spool_lock:
+            events = self._drain()
+            if events:
+                self._spool.close()
+                stamp = int(time.time() * 1000)
+                while os.path.exists(f"{self.spool_path}.{stamp}.flushing"):
+                    stamp += 1  # a batch rotated this millisecond is still waiting to be written
+                flushing_path = f"{self.spool_path}.{stamp}.flushing"
+                os.replace(self.spool_path, flushing_path)
+                self._spool = open(self.spool_path, "a", encoding="utf-8")
+                self._batches.append((flushing_path, events))
+
+        written = 0
+        while self._batches:
+            flushing_path, events = self._batches[0]
+            try:
+                self._write(events)
+            except Exception:
+                self._count("failures")
+                logger.exception("Audit flush of %d events failed; will retry", len(events))
+                break
+            os.remove(flushing_path)
+            self._batches.pop(0)
+            written += len(events)
+        return written
+
+    def _write(self, events):
+        with db.pool.connection() as conn:
+            cur = conn.cursor()
+            # mysql-connector rewrites executemany INSERTs into one multi-row statement
+            cur.executemany(INSERT_SQL, events)
+            conn.commit()
+            cur.close()
+        self._count("written", len(events))
+        self._count("flushes")
+
+    def _replay_orphans(self):
+        """Inserts the events left in spools whose process is gone."""
+        with open(os.path.join(self.spool_dir, REPLAY_LOCK), "a") as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            for name in sorted(os.listdir(self.spool_dir)):
+                if not (name.startswith(SPOOL_PREFIX) and name.endswith(LOCK_SUFFIX)):
+                    continue
+                owner = name[:-len(LOCK_SUFFIX)]
+                if owner == self._name:
+                    continue
+                lock_path = os.path.join(self.spool_dir, name)
+                with open(lock_path, "a") as lock:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # its process is still running
+                    self._replay_files(owner)
+                    os.remove(lock_path)
+
+    def _replay_files(self, owner):
+        spool = owner + SPOOL_SUFFIX
+        # Rotated batches (spool.<ms>.flushing) are older than the live spool.
+        paths = sorted(
+            os.path.join(self.spool_dir, name) for name in os.listdir(self.spool_dir)
+            if name.startswith(spool + ".") and name.endswith(".flushing")
+        )
+        if os.path.exists(os.path.join(self.spool_dir, spool)):
+            paths.append(os.path.join(self.spool_dir, spool))
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                events = [tuple(json.loads(line)) for line in f if line.strip()]
+            if events:
+                self._write(events)
+                self._count("replayed", len(events))
+            os.remove(path)
+
+
+writer = None
+
+
+def _disable_triggers(raw):
+    cur = raw.cursor()
+    cur.execute("SET @app_audit = 1")
+    cur.close()
+
+
+def init_audit(app):
+    """Starts the background writer when AUDIT_MODE=app; trigger logging stays in charge otherwise."""
+    global writer
+    if os.environ.get("AUDIT_MODE", "trigger").lower() != "app":
+        return None
+    db.pool.on_connect.append(_disable_triggers)
+    spool_dir = os.environ.get("AUDIT_SPOOL_DIR") or None
+    if spool_dir and fcntl is None:
+        logger.warning("AUDIT_SPOOL_DIR needs flock, which this platform lacks; spooling is off")
+        spool_dir = None
+    writer = AuditWriter(
+        flush_size=int(os.environ.get("AUDIT_FLUSH_SIZE", 200)),
+        flush_interval=float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0)),
+        spool_dir=spool_dir,
+    )
+    writer.start()
+    return writer
+
+
+def emit(table, operation, record_id=None, description=None, changed_by=None):
+    """Queues one Logs row. A no-op while the database triggers are doing the logging."""
+    if writer is not None:
+        writer.emit(table, operation, record_id, description, changed_by)
+
+
+def audit_stats():
+    return writer.stats_snapshot() if writer is not None else {"mode": "trigger"}
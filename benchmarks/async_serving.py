@@ -0,0 +1,102 @@
+"""
+Sync (Flask/WSGI) vs async (asgi.py) serving at high concurrency.
+
+    # terminal 1: the sync app, e.g. gunicorn -w 4 --threads 8 -b :5000 app:app
+    # terminal 2: the async app, e.g. uvicorn asgi:app --workers 4 --port 5001
+    python benchmarks/async_serving.py --sync-url http://localhost:5000 \
+        --async-url http://localhost:5001 --concurrency 64,256,1024 --duration 20
+
+At each concurrency level, that many coroutines issue back-to-back GETs
+against one server for --duration seconds. The requests are a mix of slow
+reads (full ride history, audit log pages) and fast catalog reads
+(/api/stations, vehicles at a station). IDs come from the benchmarks/seed.py
+manifest. The report gives p50/p95/p99 latency, throughput and error rate per
+endpoint, per mode and per level. The number to watch is the fast endpoints'
+p99 while the slow ones are in flight. Needs httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from load_test import HERE, Recorder
+
+# endpoint template -> (relative weight, path builder)
+DEFAULT_MIX = {
+    "/api/user/<id>/rides": (25, lambda rng, m: f"/api/user/{_id(rng, m, 'users')}/rides"),
+    "/api/logs": (15, lambda rng, m: "/api/logs?user_role=admin&limit=500"),
+    "/api/stations": (30, lambda rng, m: "/api/stations"),
+    "/api/stations/<id>/vehicles": (30, lambda rng, m: f"/api/stations/{_id(rng, m, 'stations')}/vehicles"),
+}
+
+
+def _id(rng, manifest, kind):
+    low, high = manifest[kind]
+    return rng.randint(low, high)
+
+
+async def run_level(base_url, manifest, concurrency, duration, timeout, seed):
+    recorder = Recorder()
+    endpoints = list(DEFAULT_MIX)
+    weights = [DEFAULT_MIX[name][0] for name in endpoints]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url.rstrip("/"), limits=limits, timeout=timeout) as client:
+        stop_at = time.monotonic() + duration
+
+        async def worker(index):
+            rng = random.Random(seed + index)
+            while time.monotonic() < stop_at:
+                endpoint = rng.choices(endpoints, weights)[0]
+                path = DEFAULT_MIX[endpoint][1](rng, manifest)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    await response.aread()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                recorder.record(f"GET {endpoint}", time.perf_counter() - started, ok)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return recorder.report(time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async serving under high concurrency")
+    parser.add_argument("--sync-url", default="http://localhost:5000")
+    parser.add_argument("--async-url", default="http://localhost:5001")
+    parser.add_argument("--manifest", default=os.path.join(HERE, "seed_manifest.json"))
+    parser.add_argument("--concurrency", default="64,256,1024", help="comma-separated levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level and mode")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    report = {"config": vars(args), "levels": {}}
+    for level in levels:
+        results = {}
+        for mode, url in (("sync", args.sync_url), ("async", args.async_url)):
+            results[mode] = asyncio.run(run_level(url, manifest, level, args.duration, args.timeout, args.seed))
+        sync_rps, async_rps = results["sync"]["throughput_rps"], results["async"]["throughput_rps"]
+        results["throughput_ratio"] = round(async_rps / sync_rps, 2) if sync_rps else None
+        report["levels"][str(level)] = results
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares onboarding vehicles one POST at a time with the bulk endpoint.
+
+    DB_NAME=ev_rental_bench python benchmarks/bulk_onboarding.py --rows 2000
+
+Runs in-process through Flask's test client against the database configured by
+the DB_* variables, so point it at a scratch database: it inserts real rows.
+Prints a JSON summary with rows/second for both paths.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+
+
+def vehicle_rows(count, prefix):
+    return [
+        {
+            "registration_number": f"{prefix}-{i:06d}",
+            "type": "Scooter" if i % 2 else "Bike",
+            "model": "iQube",
+            "manufacturer": "TVS",
+            "rate_per_hour": 150,
+            "station_id": 1,
+        }
+        for i in range(count)
+    ]
+
+
+def run_single(client, rows):
+    started = time.perf_counter()
+    failures = 0
+    for row in rows:
+        response = client.post('/api/vehicles', json=dict(row, user_role='admin'))
+        if response.status_code != 201:
+            failures += 1
+    return time.perf_counter() - started, failures
+
+
+def run_bulk(client, rows):
+    started = time.perf_counter()
+    response = client.post('/api/vehicles/bulk', json={"rows": rows, "user_role": "admin"})
+    elapsed = time.perf_counter() - started
+    body = response.get_json() or {}
+    return elapsed, len(rows) - body.get("inserted", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--output", help="also write the JSON summary to this file")
+    args = parser.parse_args()
+
+    # Registration numbers are capped at 20 characters.
+    tag = uuid.uuid4().hex[:6].upper()
+    client = app.test_client()
+
+    single_time, single_failures = run_single(client, vehicle_rows(args.rows, f"BS{tag}"))
+    bulk_time, bulk_failures = run_bulk(client, vehicle_rows(args.rows, f"BB{tag}"))
+
+    summary = {
+        "rows": args.rows,
+        "single": {
+            "seconds": round(single_time, 3),
+            "rows_per_second": round(args.rows / single_time, 1),
+            "failures": single_failures,
+        },
+        "bulk": {
+            "seconds": round(bulk_time, 3),
+            "rows_per_second": round(args.rows / bulk_time, 1),
+            "failures": bulk_failures,
+        },
+        "speedup": round(single_time / bulk_time, 1) if bulk_time else None,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Microbenchmark for JSON response encoding at 10k-row scale.
+
+    python benchmarks/json_encoding.py --rows 10000 --repeat 20
+
+Builds synthetic rows shaped like /api/vehicles (v_VehicleDetails), /api/logs
+and ride history (v_UserTripHistory), full of Decimal and datetime values, and
+times turning cursor output into a response body three ways:
+
+  stdlib       dict rows -> Flask's default provider (the old path)
+  orjson       dict rows -> OrjsonProvider
+  orjson_rows  tuple rows -> fetch_rows() + rows_response()
+
+The dict paths include building the per-row dicts, as a dictionary cursor
+would. No database is needed. Prints a JSON summary (best of --repeat, in ms).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_provider  # noqa: E402
+
+SHAPES = {
+    "/api/vehicles": (
+        ("VehicleID", "RegistrationNumber", "Type", "Model", "Manufacturer", "RatePerHour", "Status",
+         "CurrentStationName"),
+        lambda i, rng, now: (i, f"KA-01-{i:06d}", rng.choice(["Scooter", "Bike", "Car"]), "iQube", "TVS",
+                             Decimal(rng.randint(50, 500)) + Decimal("0.50"),
+                             rng.choice(["available", "in-use", "under-maintenance"]), f"Station {i % 200}"),
+    ),
+    "/api/logs": (
+        ("LogID", "TableName", "OperationType", "RecordID", "ChangedBy", "ChangeDescription", "ChangeTimestamp"),
+        lambda i, rng, now: (i, rng.choice(["Trips", "Payments", "Vehicles"]), "UPDATE", rng.randint(1, 10 ** 6),
+                             rng.randint(1, 5000), f"Trip status changed from Ongoing to Completed ({i})",
+                             now - timedelta(seconds=i * 7)),
+    ),
+    "/api/user/<id>/rides": (
+        ("TripID", "UserID", "UserName", "VehicleType", "StartStation", "EndStation", "StartTime", "EndTime",
+         "Cost", "Status"),
+        lambda i, rng, now: (i, 42, "Bench User 42", "Scooter", f"Station {i % 200}", f"Station {(i + 3) % 200}",
+                             now - timedelta(hours=i), now - timedelta(hours=i) + timedelta(minutes=90),
+                             Decimal(rng.randint(100, 2000)) + Decimal("0.25"), "Completed"),
+    ),
+}
+
+
+class ResultCursor:
+    """Holds pre-built tuples the way a plain cursor does after execute()."""
+
+    def __init__(self, columns, rows):
+        self.description = [(name,) for name in columns]
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON summary to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+
+    stdlib_app = Flask("bench_stdlib")
+    stdlib_app.json = DefaultJSONProvider(stdlib_app)
+    fast_app = Flask("bench_orjson")
+    json_provider.init_json(fast_app)
+
+    summary = {"rows": args.rows, "orjson": json_provider.orjson is not None, "endpoints": {}}
+    for endpoint, (columns, make_row) in SHAPES.items():
+        tuples = [make_row(i, rng, now) for i in range(args.rows)]
+
+        def as_dicts():
+            return [dict(zip(columns, row)) for row in tuples]
+
+        def dict_path(app):
+            with app.app_context():
+                return jsonify(as_dicts()).get_data()
+
+        def rows_path(app):
+            with app.app_context():
+                rows = json_provider.fetch_rows(ResultCursor(columns, tuples))
+                return json_provider.rows_response(rows).get_data()
+
+        baseline = dict_path(stdlib_app)
+        results = {"stdlib_ms": best_of(args.repeat, lambda: dict_path(stdlib_app))}
+        if json_provider.orjson is not None:
+            # Same document either way; only the encoder differs.
+            assert json.loads(dict_path(fast_app)) == json.loads(baseline)
+            assert json.loads(rows_path(fast_app)) == json.loads(baseline)
+            results["orjson_ms"] = best_of(args.repeat, lambda: dict_path(fast_app))
+            results["orjson_rows_ms"] = best_of(args.repeat, lambda: rows_path(fast_app))
+            results["speedup"] = round(results["stdlib_ms"] / results["orjson_rows_ms"], 2)
+        else:
+            results["stdlib_rows_ms"] = best_of(args.repeat, lambda: rows_path(stdlib_app))
+        results["body_bytes"] = len(baseline)
+        summary["endpoints"][endpoint] = results
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
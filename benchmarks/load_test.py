@@ -0,0 +1,246 @@
+"""
+Concurrent load generator for the Flask API.
+
+    python benchmarks/load_test.py --base-url http://localhost:5000 \
+        --clients 32 --duration 60 --output run.json
+    python benchmarks/load_test.py ... --compare baseline.json
+
+Each client loops over a weighted mix of user journeys (browse stations and
+vehicles, book then end or cancel a ride, read ride history, read audit logs)
+using the IDs recorded by benchmarks/seed.py. Latencies are recorded per
+endpoint template, e.g. "GET /api/stations/<id>/vehicles", and the report lists
+p50/p95/p99 latency, throughput and error rate for each as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# journey name -> relative weight
+DEFAULT_MIX = {
+    "browse": 50,
+    "book_and_end": 15,
+    "book_and_cancel": 5,
+    "history": 20,
+    "logs": 10,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = 0
+        total_errors = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            count = len(values)
+            total += count
+            total_errors += self.errors[endpoint]
+            endpoints[endpoint] = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "error_rate": round(self.errors[endpoint] / count, 4),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "error_rate": round(total_errors / total, 4) if total else 0,
+            "endpoints": endpoints,
+        }
+
+
+class Client:
+    def __init__(self, base_url, manifest, recorder, rng, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.manifest = manifest
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+
+    def call(self, method, path, endpoint, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        started = time.perf_counter()
+        status = None
+        payload = None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status = resp.status
+                payload = json.loads(resp.read() or b"null")
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except (urllib.error.URLError, OSError, ValueError):
+            status = None
+        ok = status is not None and status < 500 and status not in (400, 409)
+        self.recorder.record(f"{method} {endpoint}", time.perf_counter() - started, ok)
+        return status, payload
+
+    def random_id(self, kind):
+        low, high = self.manifest[kind]
+        return self.rng.randint(low, high)
+
+    # -- journeys ----------------------------------------------------------
+
+    def browse(self):
+        self.call("GET", "/api/stations", "/api/stations")
+        station_id = self.random_id("stations")
+        self.call("GET", f"/api/stations/{station_id}/vehicles", "/api/stations/<id>/vehicles")
+        self.call("GET", "/api/vehicles", "/api/vehicles")
+
+    def _book(self):
+        user_id = self.random_id("users")
+        station_id = self.random_id("stations")
+        _, vehicles = self.call("GET", f"/api/stations/{station_id}/vehicles", "/api/stations/<id>/vehicles")
+        if not vehicles or not isinstance(vehicles, list):
+            return None, None
+        vehicle = self.rng.choice(vehicles)
+        status, _ = self.call("POST", "/api/book", "/api/book", {
+            "user_id": user_id,
+            "vehicle_id": vehicle["VehicleID"],
+            "start_station_id": station_id,
+            "duration_hours": self.rng.choice([1, 2, 3]),
+        })
+        if status != 200:
+            return None, None
+        _, rides = self.call("GET", f"/api/user/{user_id}/rides?status=Ongoing&limit=1",
+                             "/api/user/<id>/rides?status=Ongoing")
+        if not rides or not isinstance(rides, list):
+            return None, None
+        return rides[0]["TripID"], station_id
+
+    def book_and_end(self):
+        trip_id, _ = self._book()
+        if trip_id:
+            self.call("POST", "/api/endride", "/api/endride",
+                      {"trip_id": trip_id, "end_station_id": self.random_id("stations")})
+
+    def book_and_cancel(self):
+        trip_id, _ = self._book()
+        if trip_id:
+            self.call("POST", f"/api/trip/{trip_id}/cancel", "/api/trip/<id>/cancel")
+
+    def history(self):
+        user_id = self.random_id("users")
+        self.call("GET", f"/api/user/{user_id}/rides?limit=50", "/api/user/<id>/rides")
+
+    def logs(self):
+        table = self.rng.choice([None, "Trips", "Payments"])
+        query = "?user_role=admin&limit=100" + (f"&table={table}" if table else "")
+        self.call("GET", "/api/logs" + query, "/api/logs")
+
+
+def run(base_url, manifest, clients, duration, mix, timeout, seed):
+    recorder = Recorder()
+    journeys = list(mix)
+    weights = [mix[name] for name in journeys]
+    stop_at = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(base_url, manifest, recorder, rng, timeout)
+        while time.monotonic() < stop_at:
+            getattr(client, rng.choices(journeys, weights)[0])()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.monotonic() - started)
+
+
+def compare(current, baseline):
+    """Per-endpoint p50/p95/p99 and throughput deltas against a previous run (positive = slower)."""
+    diff = {}
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        diff[endpoint] = {
+            key: round(stats[key] - before[key], 2)
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "error_rate")
+        }
+    return diff
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown journey {name!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the EV rental API")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--manifest", default=os.path.join(HERE, "seed_manifest.json"))
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="e.g. browse=50,book_and_end=15,book_and_cancel=5,history=20,logs=10")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    report = run(args.base_url, manifest, args.clients, args.duration, args.mix, args.timeout, args.seed)
+    report["config"] = {
+        "base_url": args.base_url,
+        "clients": args.clients,
+        "duration_s": args.duration,
+        "mix": args.mix,
+        "dataset": manifest.get("counts"),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["compare"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Seeds a scaled benchmark dataset into a scratch database.
+
+    DB_NAME=ev_rental_bench python benchmarks/seed.py \
+        --stations 200 --vehicles 5000 --users 2000 --trips 200000
+
+The schema must already exist (DDL.sql, DML.sql, LOGS.sql, AVAILABILITY.sql,
+then `python migrations.py upgrade`). Station areas, vehicle models, plans and
+technicians are taken from "Injection Data.sql" and repeated/varied up to the
+requested sizes. Writes benchmarks/seed_manifest.json with the ID ranges the
+load generator should use.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector  # noqa: E402
+
+from db import db_config_from_env  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA = os.path.join(ROOT, "Injection Data.sql")
+MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_manifest.json")
+BENCH_PASSWORD = "bench123"
+BATCH = 1000
+
+TUPLE_RE = re.compile(r"\(([^()]*)\)")
+
+
+def sample_tuples(table):
+    """Returns the value tuples of the INSERT INTO <table> statement in Injection Data.sql."""
+    with open(SAMPLE_DATA, encoding="utf-8") as f:
+        sql = f.read()
+    match = re.search(rf"INSERT INTO {table} \([^)]*\) VALUES(.*?);", sql, re.S)
+    rows = []
+    for body in TUPLE_RE.findall(match.group(1)):
+        values = [v.strip() for v in re.findall(r"\s*('[^']*'|[^,]+)", body)]
+        rows.append([v[1:-1] if v.startswith("'") else v for v in values])
+    return rows
+
+
+def insert_many(conn, sql, rows):
+    cur = conn.cursor()
+    for start in range(0, len(rows), BATCH):
+        cur.executemany(sql, rows[start:start + BATCH])
+        conn.commit()
+    cur.close()
+
+
+def all_ids(conn, table, column):
+    """The IDs actually in `table`; AUTO_INCREMENT values may have gaps."""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {column} FROM {table} ORDER BY {column}")
+    ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return ids
+
+
+def truncate(conn):
+    cur = conn.cursor()
+    cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in ("AnalyticsWatermarks", "AnalyticsPendingTrips", "StationHourlyUsage", "RevenueDaily",
+                  "TripDurationDaily", "Reviews", "TechnicianAssignments", "MaintenanceLogs", "WalletDiscrepancies",
+                  "WalletHolds", "WalletAccounts", "WalletSnapshots", "WalletLedger", "Payments", "Trips",
+                  "Vehicles", "StationAvailability", "Stations", "Technicians", "Users",
+                  "MembershipPlans", "Logs"):
+        cur.execute(f"TRUNCATE TABLE {table}")
+    cur.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cur.close()
+
+
+def seed(conn, stations, vehicles, users, trips, rng):
+    plans = sample_tuples("MembershipPlans")
+    insert_many(conn, """
+        INSERT INTO MembershipPlans (PlanName, Cost, DurationMonths, Benefits) VALUES (%s, %s, %s, %s)
+    """, [tuple(p) for p in plans])
+    plan_ids = all_ids(conn, "MembershipPlans", "PlanID")
+
+    areas = sample_tuples("Stations")
+    station_rows = []
+    for i in range(stations):
+        name, location, capacity, _ = areas[i % len(areas)]
+        suffix = f" {i // len(areas) + 1}" if i >= len(areas) else ""
+        # Scattered over a city-sized box so /api/stations/nearby has realistic density.
+        lat = round(12.85 + rng.random() * 0.25, 6)
+        lon = round(77.45 + rng.random() * 0.30, 6)
+        station_rows.append((name + suffix, location, int(capacity), lat, lon, True))
+    insert_many(conn, """
+        INSERT INTO Stations (Name, Location, Capacity, Latitude, Longitude, IsActive)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, station_rows)
+    station_ids = all_ids(conn, "Stations", "StationID")
+
+    models = sample_tuples("Vehicles")
+    vehicle_rows = []
+    for i in range(vehicles):
+        _, vtype, model, maker, rate, _, _ = models[i % len(models)]
+        station_id = rng.choice(station_ids)
+        vehicle_rows.append((f"BN-{i:08d}", vtype, model, maker, rate, "available", station_id))
+    insert_many(conn, """
+        INSERT INTO Vehicles (RegistrationNumber, Type, Model, Manufacturer, RatePerHour, Status, CurrentStationID)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, vehicle_rows)
+    vehicle_ids = all_ids(conn, "Vehicles", "VehicleID")
+
+    technicians = sample_tuples("Technicians")
+    insert_many(conn, """
+        INSERT INTO Technicians (Name, Specialization, IsAvailable, ActiveAssignments) VALUES (%s, %s, TRUE, 0)
+    """, [(t[0], t[1]) for t in technicians])
+
+    password = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    today = datetime.now().date()
+    user_rows = []
+    for i in range(users):
+        plan = rng.choice([None, None, rng.choice(plan_ids)])
+        user_rows.append((f"Bench User {i}", f"bench{i}@example.com", password,
+                          "admin" if i == 0 else "user",
+                          today - timedelta(days=rng.randint(0, 730)), plan))
+    insert_many(conn, """
+        INSERT INTO Users (Name, Email, Password, Role, JoinDate, PlanID)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, user_rows)
+    user_ids = all_ids(conn, "Users", "UserID")
+
+    # Funds go through the wallet ledger (migration 7): an opening entry and spendable amount each.
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO WalletLedger (UserID, Amount, EntryType)
+        SELECT UserID, 1000000.00, 'opening' FROM Users WHERE UserID BETWEEN %s AND %s
+    """, (user_ids[0], user_ids[-1]))
+    cur.execute("""
+        INSERT INTO WalletAccounts (UserID, Available)
+        SELECT UserID, 1000000.00 FROM Users WHERE UserID BETWEEN %s AND %s
+    """, (user_ids[0], user_ids[-1]))
+    conn.commit()
+    cur.close()
+
+    # Historical, completed trips spread over the last year. Each batch's
+    # payments are copied from its trips, so no TripID is assumed.
+    now = datetime.now()
+    cur = conn.cursor()
+    for start in range(0, trips, BATCH):
+        batch = []
+        for _ in range(min(BATCH, trips - start)):
+            begin = now - timedelta(minutes=rng.randint(60, 365 * 24 * 60))
+            hours = rng.choice([0.5, 1, 1, 2, 3, 4])
+            batch.append((rng.choice(user_ids), rng.choice(vehicle_ids),
+                          rng.choice(station_ids), rng.choice(station_ids),
+                          begin, begin + timedelta(hours=hours), round(hours * 180, 2), "Completed"))
+        cur.executemany("""
+            INSERT INTO Trips (UserID, VehicleID, StartStationID, EndStationID, StartTime, EndTime, Cost, Status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, batch)
+        cur.execute("""
+            INSERT INTO Payments (TripID, UserID, Amount, Timestamp, Status)
+            SELECT t.TripID, t.UserID, t.Cost, t.StartTime, 'Success'
+            FROM Trips t
+            LEFT JOIN Payments p ON p.TripID = t.TripID
+            WHERE t.TripID >= %s AND p.PaymentID IS NULL
+        """, (cur.lastrowid,))
+        conn.commit()
+    cur.close()
+
+    # The load generators pick IDs from these ranges.
+    return {
+        "stations": [station_ids[0], station_ids[-1]],
+        "vehicles": [vehicle_ids[0], vehicle_ids[-1]],
+        "users": [user_ids[0], user_ids[-1]],
+        "admin_user": user_ids[0],
+        "password": BENCH_PASSWORD,
+        "counts": {"stations": stations, "vehicles": vehicles, "users": users, "trips": trips},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a scaled benchmark dataset")
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--trips", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed for reproducible data")
+    parser.add_argument("--truncate", action="store_true",
+                        help="empty all data tables first (scratch databases only)")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**db_config_from_env())
+    try:
+        if args.truncate:
+            truncate(conn)
+        manifest = seed(conn, args.stations, args.vehicles, args.users, args.trips, random.Random(args.seed))
+        # Trips were inserted directly, so rebuild the availability counters.
+        cur = conn.cursor()
+        cur.callproc("sp_ReconcileStationAvailability", (True,))
+        for result in cur.stored_results():
+            result.fetchall()
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Contention-aware ride booking.
+
+Instead of SELECT ... FOR UPDATE on the vehicle and then on the wallet row, a
+booking reserves the price in the wallet first (wallet.reserve, committed on
+its own) and then claims the vehicle with a conditional UPDATE (the
+affected-row count says whether we won the race). Locks are always taken in
+the same order (Vehicles, then new Trips/Payments rows, then the booking's own
+hold and ledger entry) and are held only for the few statements between claim
+and commit; the hold is released if the booking does not go through.
+Deadlocks and lock-wait timeouts are retried with jittered exponential
+backoff.
+
+Reservations are Upcoming trips for a future window. Window conflicts are
+checked with a range query on the (VehicleID, Status, StartTime, EndTime)
+index, which only visits the vehicle's Upcoming/Ongoing trips however long
+its history. Every writer holds the vehicle row lock while it checks, so two
+overlapping reservations cannot both pass.
+"""
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import mysql.connector
+
+import pricing
+import wallet
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE = (ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK)
+
+MAX_RETRIES = int(os.environ.get("BOOKING_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.environ.get("BOOKING_BACKOFF_BASE", 0.02))
+ALTERNATE_CANDIDATES = 10
+RESERVATION_MAX_HOURS = int(os.environ.get("RESERVATION_MAX_HOURS", 24))
+RESERVATION_MAX_DAYS_AHEAD = int(os.environ.get("RESERVATION_MAX_DAYS_AHEAD", 30))
+
+CENT = Decimal("0.01")
+
+
+class BookingError(Exception):
+    status = 400
+
+
+class VehicleUnavailable(BookingError):
+    status = 409
+
+
+class InsufficientBalance(BookingError):
+    status = 400
+
+
+class BookingContention(BookingError):
+    status = 503
+
+
+_lock = threading.Lock()
+_stats = {
+    "attempts": 0,
+    "booked": 0,
+    "conflicts": 0,
+    "alternates_used": 0,
+    "retries": 0,
+    "deadlocks": 0,
+    "lock_timeouts": 0,
+    "insufficient_balance": 0,
+    "exhausted": 0,
+    "reserved": 0,
+    "window_conflicts": 0,
+}
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def booking_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def user_plan(cur, user_id):
+    """The user's PlanID (None without a plan); raises BookingError for an unknown user."""
+    cur.execute("SELECT PlanID FROM Users WHERE UserID = %s", (user_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise BookingError("User not found")
+    return row[0]
+
+
+def _db_now(cur):
+    cur.execute("SELECT NOW()")
+    return cur.fetchone()[0]
+
+
+def _conflicting_trip(cur, vehicle_id, start, end):
+    """An Upcoming or Ongoing trip of the vehicle overlapping [start, end), or None."""
+    cur.execute("""
+        SELECT TripID FROM Trips
+        WHERE VehicleID = %s AND Status IN ('Upcoming', 'Ongoing')
+          AND StartTime < %s AND EndTime > %s
+        LIMIT 1
+    """, (vehicle_id, end, start))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _claim(cur, vehicle_id, start, end):
+    """
+    Flips one vehicle from available to in-use. True if this transaction won it
+    and no reservation of that vehicle falls inside [start, end).
+    """
+    cur.execute(
+        "UPDATE Vehicles SET Status = 'in-use' WHERE VehicleID = %s AND Status = 'available'",
+        (vehicle_id,),
+    )
+    if cur.rowcount != 1:
+        return False
+    if _conflicting_trip(cur, vehicle_id, start, end) is not None:
+        # We hold the row lock, so putting it back is safe.
+        cur.execute("UPDATE Vehicles SET Status = 'available' WHERE VehicleID = %s", (vehicle_id,))
+        _count("window_conflicts")
+        return False
+    return True
+
+
+def _claim_alternative(cur, station_id, vehicle_type, exclude_id, start, end, max_rate):
+    """
+    Claims another available vehicle of the same type at the station, or
+    returns None. Only vehicles at most `max_rate` qualify, so the alternate
+    never costs more than the amount held for the requested one.
+    """
+    cur.execute("""
+        SELECT VehicleID FROM Vehicles
+        WHERE CurrentStationID = %s AND Status = 'available' AND Type = %s AND VehicleID <> %s
+          AND RatePerHour <= %s
+        LIMIT %s
+    """, (station_id, vehicle_type, exclude_id, max_rate, ALTERNATE_CANDIDATES))
+    candidates = [row[0] for row in cur.fetchall()]
+    # Spread concurrent bookers over the candidates instead of all racing for the first one.
+    random.shuffle(candidates)
+    for candidate in candidates:
+        if _claim(cur, candidate, start, end):
+            return candidate
+        _count("conflicts")
+    return None
+
+
+def _hold_funds(conn, user_id, amount):
+    try:
+        return wallet.reserve(conn, user_id, amount)
+    except wallet.InsufficientFunds:
+        _count("insufficient_balance")
+        raise InsufficientBalance("Insufficient balance")
+
+
+def _charge(cur, hold, cost, trip_id):
+    """Captures the hold for the trip's cost; the rest of the hold goes back to the wallet."""
+    if cost > hold.amount:
+        # Only if the vehicle's rate went up between the quote and the claim.
+        raise VehicleUnavailable("The vehicle's price changed, please try again")
+    try:
+        wallet.capture(cur, hold, cost, wallet.RIDE, trip_id)
+    except wallet.HoldExpired as e:
+        raise BookingContention(str(e))
+
+
+def _abandon(conn, hold):
+    """Rolls back a failed attempt and gives its wallet hold back."""
+    try:
+        conn.rollback()
+    except mysql.connector.Error:
+        pass
+    wallet.release(conn, hold)
+
+
+def _book_once(conn, user_id, vehicle_id, station_id, duration, auto_pick):
+    cur = conn.cursor()
+    hold = None
+    try:
+        plan_id = user_plan(cur, user_id)
+        book = pricing.get_price_book(conn)
+        start = _db_now(cur)
+        seconds = int(duration * 3600)
+        end = start + timedelta(seconds=seconds)
+
+        cur.execute("SELECT Type, RatePerHour FROM Vehicles WHERE VehicleID = %s", (vehicle_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise VehicleUnavailable("Vehicle not found")
+        vehicle_type, quoted_rate = row
+        conn.commit()  # end the read snapshot before taking locks
+
+        # 0. Wallet: set the price aside (commits on its own)
+        hold = _hold_funds(conn, user_id, book.price(quoted_rate, vehicle_type, seconds, start, plan_id))
+
+        # 1. Vehicles
+        booked_vehicle = vehicle_id
+        if not _claim(cur, vehicle_id, start, end):
+            _count("conflicts")
+            booked_vehicle = None
+            if auto_pick:
+                booked_vehicle = _claim_alternative(cur, station_id, vehicle_type, vehicle_id, start, end,
+                                                    quoted_rate)
+                if booked_vehicle is not None:
+                    _count("alternates_used")
+            if booked_vehicle is None:
+                raise VehicleUnavailable("Vehicle not available")
+
+        cur.execute("SELECT RatePerHour FROM Vehicles WHERE VehicleID = %s", (booked_vehicle,))
+        rate = cur.fetchone()[0]
+        cost = book.price(rate, vehicle_type, seconds, start, plan_id)
+
+        # 2. New rows, then the hold becomes the ledger debit
+        cur.execute("""
+            INSERT INTO Trips (UserID, VehicleID, StartStationID, StartTime, EndTime, Cost, Status)
+            VALUES (%s, %s, %s, %s, %s, %s, 'Ongoing')
+        """, (user_id, booked_vehicle, station_id, start, end, cost))
+        trip_id = cur.lastrowid
+        cur.execute(
+            "INSERT INTO Payments (TripID, UserID, Amount, Status) VALUES (%s, %s, %s, 'Success')",
+            (trip_id, user_id, cost),
+        )
+        payment_id = cur.lastrowid
+        _charge(cur, hold, cost, trip_id)
+        conn.commit()
+        return {"trip_id": trip_id, "vehicle_id": booked_vehicle, "cost": cost, "payment_id": payment_id}
+    except Exception:
+        _abandon(conn, hold)
+        raise
+    finally:
+        cur.close()
+
+
+def _with_retries(conn, attempt_fn, *args):
+    """Runs one booking transaction, retrying deadlocks and lock-wait timeouts."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return attempt_fn(conn, *args)
+        except mysql.connector.Error as e:
+            conn.rollback()
+            if e.errno not in RETRYABLE:
+                raise
+            _count("deadlocks" if e.errno == ER_LOCK_DEADLOCK else "lock_timeouts")
+            if attempt == MAX_RETRIES:
+                break
+            _count("retries")
+            # Full jitter: sleep a random slice of an exponentially growing window.
+            time.sleep(random.uniform(0, BACKOFF_BASE * (2 ** attempt)))
+    _count("exhausted")
+    raise BookingContention("Booking is busy, please try again")
+
+
+def create_booking(conn, user_id, vehicle_id, station_id, duration_hours, auto_pick=False):
+    """
+    Books a ride starting now. With auto_pick, a vehicle of the same type at
+    the same station is booked instead when the requested one is taken.
+    Returns {"trip_id", "vehicle_id", "cost", "payment_id"}; raises a BookingError subclass.
+    """
+    try:
+        duration = Decimal(str(duration_hours)).quantize(CENT)
+    except Exception:
+        raise BookingError("Invalid duration_hours")
+    if duration <= 0:
+        raise BookingError("duration_hours must be positive")
+
+    _count("attempts")
+    result = _with_retries(conn, _book_once, user_id, vehicle_id, station_id, duration, auto_pick)
+    _count("booked")
+    return result
+
+
+def _reserve_once(conn, user_id, vehicle_id, start, end):
+    cur = conn.cursor()
+    hold = None
+    try:
+        plan_id = user_plan(cur, user_id)
+        book = pricing.get_price_book(conn)
+        now = _db_now(cur)
+        seconds = int((end - start).total_seconds())
+        if start <= now:
+            raise BookingError("start_time must be in the future")
+        if start > now + timedelta(days=RESERVATION_MAX_DAYS_AHEAD):
+            raise BookingError(f"Reservations can be made at most {RESERVATION_MAX_DAYS_AHEAD} days ahead")
+
+        cur.execute("SELECT RatePerHour, Type FROM Vehicles WHERE VehicleID = %s", (vehicle_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise VehicleUnavailable("Vehicle not found")
+        conn.commit()  # end the read snapshot before taking locks
+
+        # 0. Wallet: set the price aside (commits on its own)
+        hold = _hold_funds(conn, user_id, book.price(row[0], row[1], seconds, start, plan_id))
+
+        # 1. Vehicles: the row lock serialises every booking and reservation of this vehicle
+        cur.execute(
+            "SELECT Status, CurrentStationID, RatePerHour, Type FROM Vehicles WHERE VehicleID = %s FOR UPDATE",
+            (vehicle_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise VehicleUnavailable("Vehicle not found")
+        status, station_id, rate, vehicle_type = row
+        if status not in ('available', 'in-use') or station_id is None:
+            raise VehicleUnavailable("Vehicle cannot be reserved")
+        if _conflicting_trip(cur, vehicle_id, start, end) is not None:
+            _count("window_conflicts")
+            raise VehicleUnavailable("Vehicle is already booked for part of that window")
+
+        cost = book.price(rate, vehicle_type, seconds, start, plan_id)
+
+        # 2. New rows, then the hold becomes the ledger debit
+        cur.execute("""
+            INSERT INTO Trips (UserID, VehicleID, StartStationID, StartTime, EndTime, Cost, Status)
+            VALUES (%s, %s, %s, %s, %s, %s, 'Upcoming')
+        """, (user_id, vehicle_id, station_id, start, end, cost))
+        trip_id = cur.lastrowid
+        cur.execute(
+            "INSERT INTO Payments (TripID, UserID, Amount, Status) VALUES (%s, %s, %s, 'Success')",
+            (trip_id, user_id, cost),
+        )
+        payment_id = cur.lastrowid
+        _charge(cur, hold, cost, trip_id)
+        conn.commit()
+        return {"trip_id": trip_id, "vehicle_id": vehicle_id, "station_id": station_id,
+                "start_time": start, "end_time": end, "cost": cost, "payment_id": payment_id}
+    except Exception:
+        _abandon(conn, hold)
+        raise
+    finally:
+        cur.close()
+
+
+def create_reservation(conn, user_id, vehicle_id, start, end):
+    """
+    Reserves a vehicle for [start, end) as an Upcoming trip, charged now at the
+    vehicle's rate for the window. Times are naive datetimes in the database's
+    time zone. Returns the trip and its payment_id; raises a BookingError subclass.
+    """
+    if start is None or end is None:
+        raise BookingError("start_time and end_time are required")
+    if end <= start:
+        raise BookingError("end_time must be after start_time")
+    if end - start > timedelta(hours=RESERVATION_MAX_HOURS):
+        raise BookingError(f"Reservations can be at most {RESERVATION_MAX_HOURS} hours long")
+
+    _count("attempts")
+    result = _with_retries(conn, _reserve_once, user_id, vehicle_id, start, end)
+    _count("reserved")
+    return result
+
+
+def available_for_window(conn, station_id, start, end, vehicle_type=None):
+    """Vehicles at the station that are available now and free for all of [start, end)."""
+    query = """
+        SELECT v.VehicleID, v.RegistrationNumber, v.Type, v.Model, v.Manufacturer, v.RatePerHour
+        FROM Vehicles v
+        WHERE v.CurrentStationID = %s AND v.Status = 'available'
+          AND NOT EXISTS (
+              SELECT 1 FROM Trips t
+              WHERE t.VehicleID = v.VehicleID AND t.Status IN ('Upcoming', 'Ongoing')
+                AND t.StartTime < %s AND t.EndTime > %s
+          )
+    """
+    params = [station_id, end, start]
+    if vehicle_type:
+        query += " AND v.Type = %s"
+        params.append(vehicle_type)
+    query += " ORDER BY v.VehicleID"
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(query, tuple(params))
+        return cur.fetchall()
+    finally:
+        cur.close()
@@ -0,0 +1,226 @@
+"""
+Bulk onboarding of vehicles, stations and technicians.
+
+Rows arrive as a JSON array (or {"rows": [...]}) or as an uploaded CSV file
+whose header uses the same field names as the single-row endpoints. Every row
+is validated before anything is written; rows are then inserted in chunks,
+one multi-row INSERT and one commit per chunk.
+"""
+import csv
+import io
+from collections import defaultdict, deque
+from decimal import Decimal, InvalidOperation
+
+CHUNK_SIZE = 500
+MAX_ROWS = 50000
+
+
+def _text(max_len):
+    def check(value):
+        value = (value or "").strip() if isinstance(value, str) else value
+        if value in (None, ""):
+            raise ValueError("is required")
+        value = str(value)
+        if len(value) > max_len:
+            raise ValueError(f"must be at most {max_len} characters")
+        return value
+    return check
+
+
+def _positive_int(value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("must be a whole number")
+    if number <= 0:
+        raise ValueError("must be positive")
+    return number
+
+
+def _optional_int(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("must be a whole number")
+
+
+def _coordinate(low, high):
+    def check(value):
+        if value in (None, ""):
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("must be a number")
+        if not low <= number <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return number
+    return check
+
+
+def _rate(value):
+    try:
+        rate = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise ValueError("must be a number")
+    if rate <= 0:
+        raise ValueError("must be positive")
+    return rate.quantize(Decimal("0.01"))
+
+
+# field name -> validator, in INSERT column order. "lookup" is (table, id
+# column, key columns); the key columns are the first fields, in order, and
+# are how the new rows' ids are found after a multi-row INSERT.
+ENTITIES = {
+    "vehicles": {
+        "fields": [
+            ("registration_number", _text(20)),
+            ("type", _text(50)),
+            ("model", _text(50)),
+            ("manufacturer", _text(50)),
+            ("rate_per_hour", _rate),
+            ("station_id", _optional_int),
+        ],
+        "unique": "registration_number",
+        "lookup": ("Vehicles", "VehicleID", ("RegistrationNumber",)),
+        "sql": """
+            INSERT INTO Vehicles (RegistrationNumber, Type, Model, Manufacturer, RatePerHour, Status, CurrentStationID)
+            VALUES (%s, %s, %s, %s, %s, 'available', %s)
+        """,
+    },
+    "stations": {
+        "fields": [
+            ("name", _text(100)),
+            ("location", _text(255)),
+            ("capacity", _positive_int),
+            ("latitude", _coordinate(-90, 90)),
+            ("longitude", _coordinate(-180, 180)),
+        ],
+        "unique": "name",
+        "lookup": ("Stations", "StationID", ("Name",)),
+        "sql": """
+            INSERT INTO Stations (Name, Location, Capacity, Latitude, Longitude, IsActive)
+            VALUES (%s, %s, %s, %s, %s, TRUE)
+        """,
+    },
+    "technicians": {
+        "fields": [
+            ("name", _text(100)),
+            ("specialization", _text(100)),
+        ],
+        "unique": None,
+        "lookup": ("Technicians", "TechnicianID", ("Name", "Specialization")),
+        "sql": """
+            INSERT INTO Technicians (Name, Specialization, IsAvailable, ActiveAssignments)
+            VALUES (%s, %s, TRUE, 0)
+        """,
+    },
+}
+
+
+def parse_rows(req):
+    """Returns the list of row dicts from a JSON body or an uploaded CSV ('file')."""
+    upload = req.files.get("file")
+    if upload is not None:
+        text = io.TextIOWrapper(upload.stream, encoding="utf-8-sig")
+        return list(csv.DictReader(text))
+    data = req.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("rows")
+    if not isinstance(data, list):
+        raise ValueError("Send a JSON array of rows, {\"rows\": [...]}, or a CSV file upload named 'file'")
+    return data
+
+
+def validate(entity, rows):
+    """Returns (parameter tuples, errors). Row numbers in errors are 0-based."""
+    spec = ENTITIES[entity]
+    params = []
+    errors = []
+    seen = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "error": "Row must be an object"})
+            continue
+        values = []
+        row_errors = []
+        for field, check in spec["fields"]:
+            try:
+                values.append(check(row.get(field)))
+            except ValueError as e:
+                row_errors.append(f"{field} {e}")
+        unique = spec["unique"]
+        if unique and not row_errors:
+            key = str(row.get(unique)).strip().lower()
+            if key in seen:
+                row_errors.append(f"{unique} duplicates row {seen[key]}")
+            else:
+                seen[key] = index
+        if row_errors:
+            errors.append({"row": index, "error": "; ".join(row_errors)})
+        else:
+            params.append(tuple(values))
+    return params, errors
+
+
+def _chunk_ids(cur, entity, chunk, first_id):
+    """
+    Ids of a chunk just inserted by one multi-row INSERT, found by key. They
+    are not assumed consecutive (innodb_autoinc_lock_mode=2, replication, a
+    concurrent insert), only increasing in row order and at least first_id,
+    which places rows that share a key.
+    """
+    table, id_column, key_columns = ENTITIES[entity]["lookup"]
+    width = len(key_columns)
+    keys = [values[:width] for values in chunk]
+    row = "(" + ", ".join(["%s"] * width) + ")"
+    cur.execute(
+        f"SELECT {id_column}, {', '.join(key_columns)} FROM {table} "
+        f"WHERE {id_column} >= %s AND ({', '.join(key_columns)}) IN ({', '.join([row] * len(keys))}) "
+        f"ORDER BY {id_column}",
+        [first_id] + [value for key in keys for value in key],
+    )
+    found = defaultdict(deque)
+    for row_id, *key in cur.fetchall():
+        found[tuple(key)].append(row_id)
+    ids = []
+    for key in keys:
+        matches = found.get(tuple(key))
+        if not matches:
+            raise LookupError(f"Could not find the inserted {table} row for {key}")
+        ids.append(matches.popleft())
+    return ids
+
+
+def insert_rows(conn, entity, params, chunk_size=CHUNK_SIZE):
+    """
+    Inserts validated rows chunk by chunk. Returns (ids, errors) with one id
+    (or None) per row. A chunk that fails as a whole is retried row by row so
+    the offending rows can be reported while the rest still go in.
+    """
+    sql = ENTITIES[entity]["sql"]
+    ids = [None] * len(params)
+    errors = []
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(params), chunk_size):
+            chunk = params[start:start + chunk_size]
+            try:
+                cur.executemany(sql, chunk)
+                chunk_ids = _chunk_ids(cur, entity, chunk, cur.lastrowid)
+                conn.commit()
+                ids[start:start + len(chunk)] = chunk_ids
+            except Exception:
+                conn.rollback()
+                for offset, values in enumerate(chunk):
+                    try:
+                        cur.execute(sql, values)
+                        ids[start + offset] = cur.lastrowid
+                    except Exception as e:
+                        errors.append({"row": start + offset, "error": str(e)})
+                conn.commit()
+    finally:
+        cur.close()
+    return ids, errors
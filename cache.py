@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Load:
+    """One key's in-flight loads: the lock they queue on and the key's generation."""
+    __slots__ = ("lock", "users", "generation")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.generation = 0
+
+
+class TTLCache:
+    """
+    Small thread-safe cache with per-entry TTL and LRU eviction.
+    Each entry expires `ttl` seconds after it was loaded; when the cache is full
+    the least recently used entry is dropped.
+    """
+
+    def __init__(self, maxsize=128, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._loads = {}  # key -> _Load, only while a get_or_load for it is running
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for `key`, calling `loader()` on a miss.
+        Concurrent misses for the same key wait for a single load. A load that
+        overlaps an invalidate() of its key is returned but not cached, since
+        it may have read the data from before the write.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            load = self._loads.get(key)
+            if load is None:
+                load = self._loads[key] = _Load()
+            load.users += 1
+        try:
+            with load.lock:
+                # Another thread may have filled it while we waited.
+                with self._lock:
+                    entry = self._data.get(key)
+                    if entry is not None and entry[0] >= time.monotonic():
+                        return entry[1]
+                    generation = load.generation
+                value = loader()
+                with self._lock:
+                    if load.generation == generation:
+                        self._store(key, value)
+                    else:
+                        self.stale_loads += 1
+                return value
+        finally:
+            # Per-user keys would otherwise leave one entry behind for every key ever loaded.
+            with self._lock:
+                load.users -= 1
+                if not load.users:
+                    del self._loads[key]
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+                load = self._loads.get(key)
+                if load is not None:
+                    load.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            for load in self._loads.values():
+                load.generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+            }
+
+
+# Catalog reads (stations, vehicles, membership plans, technicians, fleet counts). The TTL bounds how long
+# another worker process can serve a stale list after a write it did not see.
+catalog_cache = TTLCache(
+    maxsize=int(os.environ.get("CATALOG_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL", 30)),
+)
+
+STATIONS = "stations"
+VEHICLES = "vehicles"
+MEMBERSHIP_PLANS = "membership_plans"
+FLEET_COUNTS = "fleet_counts"
+TECHNICIANS = "technicians"
+TECHNICIAN_ASSIGNMENTS = "technician_assignments"
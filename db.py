@@ -0,0 +1,306 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+
+import mysql.connector
+from flask import g
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def db_config_from_env():
+    """Connection settings. Point DB_HOST/DB_NAME at a local stand-in database for tests."""
+    return {
+        "host": os.environ.get("DB_HOST", "localhost"),
+        "port": _env_int("DB_PORT", 3306),
+        "user": os.environ.get("DB_USER", "root"),
+        "password": os.environ.get("DB_PASSWORD", "WJ28@krhps"),
+        "database": os.environ.get("DB_NAME", "ev_rental_db"),
+    }
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql connection. close() hands the connection back to
+    the pool instead of tearing down the TCP session.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        wrapper = self._pool.cursor_wrapper
+        return wrapper(cursor) if wrapper is not None else cursor
+
+    def close(self):
+        if self._raw is not None:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool with bounded overflow.
+
+    - size: connections kept open between requests
+    - max_overflow: extra connections opened under burst load, closed on release
+      unless another thread is waiting for one
+    - timeout: seconds to wait for a free connection before raising PoolTimeout
+    - recycle: reconnect connections older than this many seconds (-1 disables)
+    - pre_ping: ping idle connections on checkout and reconnect if dead
+
+    Callables in `on_connect` run against every new raw connection, e.g. to set
+    session variables. `cursor_wrapper`, when set, wraps every cursor handed out.
+    """
+
+    def __init__(self, config, size=10, max_overflow=10, timeout=5.0, recycle=1800, pre_ping=True):
+        self.config = dict(config)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.on_connect = []
+        self.cursor_wrapper = None
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        # Notified whenever a connection goes back to _idle or a slot frees up.
+        self._available = threading.Condition(self._lock)
+        self._open = 0  # connections currently alive (idle + checked out)
+        self._waiters = 0
+        self._stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "connects": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "overflow_closed": 0,
+        }
+
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.config)
+        try:
+            for hook in self.on_connect:
+                hook(raw)
+        except Exception:
+            raw.close()
+            raise
+        self._incr("connects")
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+        conn._raw = None
+        self._free_slot()
+
+    def _free_slot(self):
+        with self._lock:
+            self._open -= 1
+            self._available.notify()
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._open < self.size + self.max_overflow:
+                self._open += 1
+                return True
+            return False
+
+    def _validate(self, conn):
+        """Returns a usable connection, replacing recycled or dead ones."""
+        now = time.monotonic()
+        if self.recycle >= 0 and now - conn.created_at > self.recycle:
+            self._incr("recycled")
+            self._discard(conn)
+            return None
+        if self.pre_ping:
+            try:
+                conn.raw.ping(reconnect=False)
+            except Exception:
+                self._incr("ping_failures")
+                self._discard(conn)
+                return None
+        return conn
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                conn = None
+
+            if conn is not None:
+                conn = self._validate(conn)
+                if conn is None:
+                    continue
+            elif self._reserve_slot():
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._free_slot()
+                    raise
+            else:
+                remaining = deadline - time.monotonic()
+                if not waited:
+                    self._incr("waits")
+                    waited = True
+                if remaining <= 0:
+                    self._incr("timeouts")
+                    raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                with self._available:
+                    # Checked again under the lock, so a release in between is not missed.
+                    if self._idle.empty() and self._open >= self.size + self.max_overflow:
+                        self._waiters += 1
+                        try:
+                            self._available.wait(remaining)
+                        finally:
+                            self._waiters -= 1
+                continue
+
+            conn.last_used = time.monotonic()
+            self._incr("checkouts")
+            return conn
+
+    def release(self, conn):
+        if conn.raw is None:
+            return
+        self._incr("checkins")
+        try:
+            # Leave the session clean for the next borrower: drain any result
+            # a handler left half-read and end its implicit transaction.
+            if conn.raw.unread_result:
+                conn.raw.consume_results()
+            if conn.raw.in_transaction:
+                conn.raw.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            # An overflow connection goes to a waiting thread rather than being closed and reopened.
+            overflow = self._open > self.size and not self._waiters
+        if overflow:
+            self._incr("overflow_closed")
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+        with self._available:
+            self._available.notify()
+
+    def invalidate(self, conn):
+        """Closes a checked-out connection instead of returning it, e.g. after an aborted stream."""
+        if conn.raw is not None:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["open"] = self._open
+        data["idle"] = self._idle.qsize()
+        data["in_use"] = data["open"] - data["idle"]
+        data["size"] = self.size
+        data["max_overflow"] = self.max_overflow
+        return data
+
+    def dispose(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+
+
+pool = None
+
+
+def init_pool(app, config=None, **overrides):
+    """
+    Creates the shared pool and registers the teardown hook that returns the
+    request's connection. Pool settings come from DB_POOL_* environment variables.
+    """
+    global pool
+    settings = {
+        "size": _env_int("DB_POOL_SIZE", 10),
+        "max_overflow": _env_int("DB_POOL_MAX_OVERFLOW", 10),
+        "timeout": _env_float("DB_POOL_TIMEOUT", 5.0),
+        "recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    settings.update(overrides)
+    pool = ConnectionPool(config or db_config_from_env(), **settings)
+    app.teardown_appcontext(_release_request_connection)
+    return pool
+
+
+def get_db():
+    """Returns the connection checked out for the current request, acquiring it on first use."""
+    conn = g.get('db_conn')
+    if conn is None or conn.raw is None:
+        conn = pool.acquire()
+        g.db_conn = conn
+    return conn
+
+
+def _release_request_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
+
+def pool_stats():
+    return pool.stats() if pool is not None else {}
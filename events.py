@@ -0,0 +1,268 @@
+"""
+Live availability deltas over Server-Sent Events.
+
+Routes that change a vehicle's status call publish_vehicles() (or
+publish_trip()) after they commit. That reads the vehicles' new status and the
+available-vehicle count of their stations and hands one event per vehicle and
+per station to the in-process Hub, which fans them out to every subscriber of
+GET /api/events.
+
+Each subscriber has a bounded queue (SSE_QUEUE_SIZE). Publishing never
+blocks: a subscriber that falls that far behind loses its backlog and is sent
+a single `resync` event, telling the client to re-fetch the lists once and
+carry on from there. Events carry increasing ids, prefixed with a random
+per-process epoch, and the last SSE_HISTORY of them are kept. A client that
+reconnects with Last-Event-ID to the same process gets what it missed; one
+whose id is too old, or came from another worker (or a restarted one), gets
+`resync` instead, since the ids of different processes are unrelated.
+
+Events are published by the worker process that made the change. Every
+SSE_SNAPSHOT_INTERVAL seconds each stream also gets a `stations` event with
+all station counts, read once per process, so clients attached to another
+worker converge within that interval.
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import db
+import json_provider
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", 256))
+HISTORY = int(os.environ.get("SSE_HISTORY", 1024))
+HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
+SNAPSHOT_INTERVAL = float(os.environ.get("SSE_SNAPSHOT_INTERVAL", 30))
+MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 1000))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, station_ids=None):
+        self.station_ids = station_ids  # None: every station
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.lagged = False
+
+    def wants(self, event):
+        return self.station_ids is None or event[2].get("StationID") in self.station_ids
+
+
+class Hub:
+    """Fan-out of (id, kind, payload) events to bounded per-subscriber queues."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._recent = deque(maxlen=HISTORY)
+        self._ids = itertools.count(1)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self.stats = {"published": 0, "delivered": 0, "overflows": 0, "replayed": 0, "rejected": 0}
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def event_id(self, number):
+        """The SSE id of this process's event `number`."""
+        return f"{self.epoch}-{number}"
+
+    def _parse_event_id(self, event_id):
+        # None for an id this process did not hand out
+        epoch, _, number = event_id.partition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def subscribe(self, station_ids=None, last_event_id=None):
+        """last_event_id is the client's Last-Event-ID header, as sent."""
+        subscriber = Subscriber(station_ids)
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                self.stats["rejected"] += 1
+                raise TooManySubscribers("Too many open event streams")
+            if last_event_id:
+                last_event_id = self._parse_event_id(last_event_id)
+                if last_event_id is None:
+                    subscriber.lagged = True  # another worker's stream: start over
+                elif self._recent and self._recent[0][0] <= last_event_id + 1:
+                    missed = [event for event in self._recent if event[0] > last_event_id and subscriber.wants(event)]
+                    for event in missed[-QUEUE_SIZE:]:
+                        subscriber.queue.put_nowait(event)
+                    self.stats["replayed"] += len(missed)
+                elif last_event_id < self.last_id():
+                    subscriber.lagged = True
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def last_id(self):
+        return self._recent[-1][0] if self._recent else 0
+
+    def publish(self, kind, payload):
+        with self._lock:
+            event = (next(self._ids), kind, payload)
+            self._recent.append(event)
+            self.stats["published"] += 1
+            for subscriber in self._subscribers:
+                if subscriber.lagged or not subscriber.wants(event):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                    self.stats["delivered"] += 1
+                except queue.Full:
+                    # Backpressure: a slow reader loses its backlog, never the publisher's time.
+                    subscriber.lagged = True
+                    self.stats["overflows"] += 1
+                    _drain(subscriber.queue)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data["subscribers"] = len(self._subscribers)
+            data["last_id"] = self.last_id()
+        return data
+
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+hub = Hub()
+
+
+def _station_counts(cur, station_ids):
+    cur.execute(f"""
+        SELECT StationID, AvailableVehicles FROM StationAvailability
+        WHERE StationID IN ({', '.join(['%s'] * len(station_ids))})
+    """, tuple(station_ids))
+    return cur.fetchall()
+
+
+def _read_vehicles(conn, vehicle_ids):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT VehicleID, Status, CurrentStationID, Type FROM Vehicles
+            WHERE VehicleID IN ({', '.join(['%s'] * len(vehicle_ids))})
+        """, tuple(vehicle_ids))
+        vehicles = cur.fetchall()
+        station_ids = sorted({station_id for _, _, station_id, _ in vehicles if station_id is not None})
+        counts = _station_counts(cur, station_ids) if station_ids else []
+        conn.commit()
+        return vehicles, counts
+    finally:
+        cur.close()
+
+
+def publish_vehicles(conn, vehicle_ids):
+    """
+    Publishes the current status of the vehicles and the counts of their
+    stations. Call after commit; a failure here is logged, never raised, since
+    the change itself has already happened.
+    """
+    vehicle_ids = [vehicle_id for vehicle_id in vehicle_ids if vehicle_id is not None]
+    if not vehicle_ids or not hub.has_subscribers():
+        return
+    try:
+        vehicles, counts = _read_vehicles(conn, vehicle_ids)
+    except Exception:
+        log.warning("could not read availability for %s", vehicle_ids, exc_info=True)
+        return
+    for vehicle_id, status, station_id, vehicle_type in vehicles:
+        hub.publish("vehicle", {"VehicleID": vehicle_id, "Status": status, "StationID": station_id,
+                                "Type": vehicle_type})
+    for station_id, available in counts:
+        hub.publish("station", {"StationID": station_id, "AvailableVehicles": available})
+
+
+def publish_trip(conn, trip_id):
+    """publish_vehicles() for the vehicle of a trip."""
+    if not hub.has_subscribers():
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT VehicleID FROM Trips WHERE TripID = %s", (trip_id,))
+        row = cur.fetchone()
+        conn.commit()
+    except Exception:
+        log.warning("could not find the vehicle of TripID=%s", trip_id, exc_info=True)
+        return
+    finally:
+        cur.close()
+    if row is not None:
+        publish_vehicles(conn, [row[0]])
+
+
+_snapshot_lock = threading.Lock()
+_snapshot = (0.0, None)
+
+
+def _all_station_counts():
+    """Every station's count, read at most once per SNAPSHOT_INTERVAL per process."""
+    global _snapshot
+    with _snapshot_lock:
+        taken_at, counts = _snapshot
+        if counts is None or time.monotonic() - taken_at >= SNAPSHOT_INTERVAL:
+            # A short checkout of its own; a stream never holds a pooled connection.
+            with db.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute("SELECT StationID, AvailableVehicles FROM StationAvailability ORDER BY StationID")
+                    counts = [{"StationID": s, "AvailableVehicles": n} for s, n in cur.fetchall()]
+                finally:
+                    cur.close()
+            _snapshot = (time.monotonic(), counts)
+        return counts
+
+
+def _format(event_id, kind, payload):
+    data = json_provider.encode(payload).decode().rstrip("\n")
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: {data}\n\n"
+
+
+def stream(subscriber):
+    """Yields SSE text for one subscriber until the client goes away."""
+    try:
+        yield "retry: 3000\n: connected\n\n"
+        next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+        while True:
+            if subscriber.lagged:
+                _drain(subscriber.queue)
+                subscriber.lagged = False
+                yield _format(hub.event_id(hub.last_id()), "resync", {})
+            now = time.monotonic()
+            if now >= next_snapshot:
+                counts = _all_station_counts()
+                if subscriber.station_ids is not None:
+                    counts = [c for c in counts if c["StationID"] in subscriber.station_ids]
+                yield _format(None, "stations", counts)
+                next_snapshot = now + SNAPSHOT_INTERVAL
+            try:
+                event = subscriber.queue.get(timeout=min(HEARTBEAT, max(0.0, next_snapshot - now)))
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, kind, payload = event
+            yield _format(hub.event_id(event_id), kind, payload)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def events_stats():
+    return hub.snapshot()
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import db
+
+BATCH_SIZE = 1000
+
+# Exportable tables: columns, the timestamp used for time-window filters, and the key.
+EXPORTS = {
+    "Logs": {
+        "columns": ["LogID", "TableName", "OperationType", "RecordID", "ChangedBy",
+                    "ChangeDescription", "ChangeTimestamp"],
+        "time_column": "ChangeTimestamp",
+        "id_column": "LogID",
+    },
+    "Trips": {
+        "columns": ["TripID", "UserID", "VehicleID", "StartStationID", "EndStationID",
+                    "StartTime", "EndTime", "Cost", "Status"],
+        "time_column": "StartTime",
+        "id_column": "TripID",
+    },
+    "Payments": {
+        "columns": ["PaymentID", "TripID", "UserID", "Amount", "Timestamp", "Status"],
+        "time_column": "Timestamp",
+        "id_column": "PaymentID",
+    },
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def build_query(table, since=None, until=None):
+    spec = EXPORTS[table]
+    conditions = []
+    params = []
+    if since:
+        conditions.append(f"{spec['time_column']} >= %s")
+        params.append(since)
+    if until:
+        conditions.append(f"{spec['time_column']} < %s")
+        params.append(until)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    sql = f"SELECT {', '.join(spec['columns'])} FROM {table} {where} ORDER BY {spec['id_column']}"
+    return sql, tuple(params)
+
+
+def stream_rows(table, since=None, until=None, batch_size=BATCH_SIZE):
+    """
+    Yields (columns, batch) pairs from an unbuffered cursor so rows are pulled
+    from MySQL as the client reads them rather than materialised up front.
+    Uses its own pooled connection because the response outlives the request.
+    """
+    sql, params = build_query(table, since, until)
+    conn = db.pool.acquire()
+    finished = False
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, params)
+        columns = list(cur.column_names)
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            yield columns, batch
+        cur.close()
+        finished = True
+    finally:
+        if finished:
+            conn.close()
+        else:
+            # Client went away mid-stream: draining the rest of the result set
+            # would read the whole table, so drop the connection instead.
+            db.pool.invalidate(conn)
+
+
+def ndjson_lines(columns, rows):
+    """One JSON object per row, newline-terminated."""
+    lines = [
+        json.dumps({col: _plain(val) for col, val in zip(columns, row)})
+        for row in rows
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def ndjson_chunks(table, since=None, until=None):
+    for columns, batch in stream_rows(table, since, until):
+        yield ndjson_lines(columns, batch)
+
+
+def csv_chunks(table, since=None, until=None):
+    header_sent = False
+    for columns, batch in stream_rows(table, since, until):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if not header_sent:
+            writer.writerow(columns)
+            header_sent = True
+        writer.writerows([_plain(val) for val in row] for row in batch)
+        yield buf.getvalue()
+    if not header_sent:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(EXPORTS[table]["columns"])
+        yield buf.getvalue()
+
+
+def export_chunks(table, fmt, since=None, until=None):
+    if fmt == "csv":
+        return csv_chunks(table, since, until)
+    return ndjson_chunks(table, since, until)
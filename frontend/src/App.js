@@ -13,7 +13,7 @@ import Profile from './pages/Profile';
 import Technicians from './pages/Technicians';
 import Membership from './pages/Membership';
 import Logs from './pages/Logs';
-import { getUserProfile } from './utils/api';
+import { clearSession, getUserProfile } from './utils/api';
 import './App.css';
 
 function App() {
@@ -62,6 +62,7 @@ function App() {
         const res = await fetch(`/api/user/${parsed.UserID}/profile`);
         if (!res.ok) {
           localStorage.removeItem('user');
+          clearSession();
           setUser(null);
         }
       } catch (e) {
@@ -81,6 +82,7 @@ function App() {
     sessionRef.current += 1;
     // Clear state and localStorage immediately
     localStorage.removeItem('user');
+    clearSession();
     setUser(null);
     setActiveTrip(null);
     // Force a hard redirect to login to avoid any race conditions with React Router
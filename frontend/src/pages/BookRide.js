@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getStations, getVehiclesAtStation, bookRide } from '../utils/api';
+import { getStations, getVehiclesAtStation, getStationQuotes, bookRide, subscribeAvailability } from '../utils/api';
 
 const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
   const [stations, setStations] = useState([]);
@@ -8,6 +8,7 @@ const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
   const [selectedStation, setSelectedStation] = useState(null);
   const [selectedVehicle, setSelectedVehicle] = useState(null);
   const [durationHours, setDurationHours] = useState(1);
+  const [quotes, setQuotes] = useState({});
   const [loading, setLoading] = useState(true);
   const [loadingVehicles, setLoadingVehicles] = useState(false);
   const [booking, setBooking] = useState(false);
@@ -18,6 +19,50 @@ const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
     fetchStations();
   }, []);
 
+  // Station counts stay live; the selected station's vehicle list follows its vehicle events.
+  useEffect(() => {
+    const stationId = selectedStation?.StationID;
+    const refreshVehicles = () => {
+      if (stationId) getVehiclesAtStation(stationId).then(setVehicles).catch(console.error);
+    };
+    return subscribeAvailability({
+      station: (c) => setStations((prev) => prev.map((s) => (
+        s.StationID === c.StationID ? { ...s, AvailableVehicles: c.AvailableVehicles } : s
+      ))),
+      vehicle: (v) => {
+        if (!stationId) return;
+        if (v.StationID === stationId && v.Status === 'available') {
+          refreshVehicles();  // a vehicle arrived; the event has no model or rate
+        } else {
+          setVehicles((prev) => prev.filter((x) => x.VehicleID !== v.VehicleID));
+          setSelectedVehicle((sel) => (sel && sel.VehicleID === v.VehicleID ? null : sel));
+        }
+      },
+      resync: () => {
+        fetchStations();
+        refreshVehicles();
+      },
+    });
+  }, [selectedStation]);
+
+  // One request prices every vehicle at the station; refreshed when the duration changes.
+  useEffect(() => {
+    if (!selectedStation) return undefined;
+    let cancelled = false;
+    getStationQuotes(selectedStation.StationID, durationHours, user?.UserID)
+      .then((data) => {
+        if (cancelled) return;
+        const byVehicle = {};
+        data.quotes.forEach((q) => { byVehicle[q.VehicleID] = parseFloat(q.Cost); });
+        setQuotes(byVehicle);
+      })
+      .catch((err) => {
+        if (!cancelled) setQuotes({});
+        console.error(err);
+      });
+    return () => { cancelled = true; };
+  }, [selectedStation, durationHours, user?.UserID]);
+
   const fetchStations = async () => {
     try {
       const stationsData = await getStations();
@@ -35,6 +80,7 @@ const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
     const station = stations.find(s => s.StationID === stationId);
     setSelectedStation(station);
     setSelectedVehicle(null);
+    setQuotes({});
     setLoadingVehicles(true);
     
     try {
@@ -50,6 +96,9 @@ const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
 
   const calculateCostNumber = () => {
     if (!selectedVehicle) return 0;
+    // Prefer the server's quote: it includes vehicle-type and time-of-day pricing.
+    const quoted = quotes[selectedVehicle.VehicleID];
+    if (Number.isFinite(quoted)) return quoted;
     const rate = parseFloat(selectedVehicle.RatePerHour);
     const hours = parseFloat(durationHours) || 0;
     const discount = Number.isFinite(parseFloat(user?.PlanDiscount)) ? parseFloat(user.PlanDiscount) : 0;
@@ -178,6 +227,11 @@ const BookRide = ({ user, onBookingComplete, onUserUpdate }) => {
                     <div className="text-right">
                       <p className="text-sm text-gray-500">Rate</p>
                       <p className="text-lg font-bold text-accent-600">₹{vehicle.RatePerHour}/hr</p>
+                      {Number.isFinite(quotes[vehicle.VehicleID]) && (
+                        <p className="text-sm text-gray-600">
+                          ₹{quotes[vehicle.VehicleID].toFixed(2)} for {durationHours}h
+                        </p>
+                      )}
                     </div>
                   </div>
                 </button>
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { Link } from 'react-router-dom';
-import { getStations, getVehicles, getUserRides } from '../utils/api';
+import { getUserDashboard } from '../utils/api';
 
 const Dashboard = ({ user, onUserUpdate }) => {
   const [stats, setStats] = useState({
@@ -8,25 +8,23 @@ const Dashboard = ({ user, onUserUpdate }) => {
     totalVehicles: 0,
     availableVehicles: 0,
     totalRides: 0,
+    walletBalance: null,
   });
   const [loading, setLoading] = useState(true);
 
   const fetchDashboardData = useCallback(async () => {
     try {
-      const [stations, vehicles, rides] = await Promise.all([
-        getStations(),
-        getVehicles(),
-        getUserRides(user.UserID),
-      ]);
+      const dashboard = await getUserDashboard(user.UserID);
 
       setStats({
-        totalStations: stations.length,
-        totalVehicles: vehicles.length,
-        availableVehicles: vehicles.filter(v => v.Status === 'available').length,
-        totalRides: rides.length,
+        totalStations: dashboard.totalStations,
+        totalVehicles: dashboard.totalVehicles,
+        availableVehicles: dashboard.availableVehicles,
+        totalRides: dashboard.totalRides,
+        walletBalance: dashboard.walletBalance,
       });
       
-      // Refresh user data to get latest wallet balance
+      // Refresh user data so the navbar shows the latest wallet balance too
       if (onUserUpdate) {
         onUserUpdate();
       }
@@ -109,7 +107,7 @@ const Dashboard = ({ user, onUserUpdate }) => {
             </div>
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Wallet Balance</p>
-              <p className="text-2xl font-bold text-gray-900">₹{Number.isFinite(parseFloat(user.WalletBalance)) ? parseFloat(user.WalletBalance).toFixed(2) : '0.00'}</p>
+              <p className="text-2xl font-bold text-gray-900">₹{Number.isFinite(parseFloat(stats.walletBalance ?? user.WalletBalance)) ? parseFloat(stats.walletBalance ?? user.WalletBalance).toFixed(2) : '0.00'}</p>
             </div>
           </div>
         </div>
@@ -7,13 +7,16 @@ const Logs = ({ user }) => {
   const [error, setError] = useState('');
   const [tableFilter, setTableFilter] = useState('');
   const [limit, setLimit] = useState(100);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const loadLogs = useCallback(async () => {
     setLoading(true);
     setError('');
     try {
-      const data = await getLogs(user?.Role, { table: tableFilter || null, limit });
-      setLogs(data);
+      const page = await getLogs(user?.Role, { table: tableFilter || null, limit });
+      setLogs(page.logs);
+      setNextCursor(page.nextCursor);
     } catch (e) {
       setError(e?.response?.data?.error || 'Failed to load logs');
     } finally {
@@ -21,6 +24,20 @@ const Logs = ({ user }) => {
     }
   }, [user, tableFilter, limit]);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getLogs(user?.Role, { table: tableFilter || null, limit, cursor: nextCursor });
+      setLogs((prev) => [...prev, ...page.logs]);
+      setNextCursor(page.nextCursor);
+    } catch (e) {
+      setError(e?.response?.data?.error || 'Failed to load logs');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     loadLogs();
   }, [loadLogs]);
@@ -102,6 +119,17 @@ const Logs = ({ user }) => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="p-4 text-center border-t border-gray-200">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="bg-gray-100 hover:bg-gray-200 text-gray-800 px-4 py-2 rounded-md font-medium disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load older logs'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
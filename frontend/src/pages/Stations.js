@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getStations, addStation, deactivateStation } from '../utils/api';
+import { getStations, addStation, deactivateStation, subscribeAvailability } from '../utils/api';
 
 const Stations = ({ user }) => {
   const [stations, setStations] = useState([]);
@@ -13,6 +13,21 @@ const Stations = ({ user }) => {
     fetchStations();
   }, []);
 
+  // Counts arrive as they change instead of by re-fetching the list.
+  useEffect(() => {
+    const setCounts = (counts) => {
+      const byStation = new Map(counts.map((c) => [c.StationID, c.AvailableVehicles]));
+      setStations((prev) => prev.map((s) => (
+        byStation.has(s.StationID) ? { ...s, AvailableVehicles: byStation.get(s.StationID) } : s
+      )));
+    };
+    return subscribeAvailability({
+      station: (c) => setCounts([c]),
+      stations: setCounts,
+      resync: () => fetchStations(),
+    });
+  }, []);
+
   const fetchStations = async () => {
     try {
       const data = await getStations();
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getVehicles, addVehicle, decommissionVehicle, reportVehicleIssue, getStations } from '../utils/api';
+import { getVehicles, addVehicle, decommissionVehicle, reportVehicleIssue, getStations, subscribeAvailability } from '../utils/api';
 
 const Vehicles = ({ user }) => {
   const [vehicles, setVehicles] = useState([]);
@@ -20,6 +20,18 @@ const Vehicles = ({ user }) => {
     }
   }, [user]);
 
+  // Status changes are applied in place; a new vehicle or a missed stretch of events re-fetches.
+  useEffect(() => subscribeAvailability({
+    vehicle: (v) => setVehicles((prev) => {
+      if (!prev.some((x) => x.VehicleID === v.VehicleID)) {
+        fetchVehicles();
+        return prev;
+      }
+      return prev.map((x) => (x.VehicleID === v.VehicleID ? { ...x, Status: v.Status } : x));
+    }),
+    resync: () => fetchVehicles(),
+  }), []);
+
   const fetchVehicles = async () => {
     try {
       const data = await getVehicles();
@@ -8,6 +8,52 @@ const api = axios.create({
   baseURL: API_BASE_URL,
 });
 
+// Session token from /login. The server resolves the user and role from it
+// (and from its cached profile), so the user_id/user_role fields below are
+// only a fallback for servers without sessions.
+const TOKEN_KEY = 'token';
+
+api.interceptors.request.use((config) => {
+  const token = localStorage.getItem(TOKEN_KEY);
+  if (token) {
+    config.headers = { ...config.headers, Authorization: `Bearer ${token}` };
+  }
+  return config;
+});
+
+// A rejected token (expired, password changed) ends the session.
+api.interceptors.response.use(undefined, (err) => {
+  if (err.response && err.response.status === 401 && err.config.headers
+      && err.config.headers.Authorization) {
+    localStorage.removeItem(TOKEN_KEY);
+    localStorage.removeItem('user');
+    window.location.href = '/login';
+  }
+  return Promise.reject(err);
+});
+
+export const clearSession = () => localStorage.removeItem(TOKEN_KEY);
+
+// POST with an Idempotency-Key. When the request never got an answer (dropped
+// connection, timeout), it is resent with the same key, so the server replays its
+// stored response instead of booking or charging a second time.
+const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+const postIdempotent = async (url, body, attempts = 3) => {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 1; ; attempt += 1) {
+    try {
+      return await api.post(url, body, { headers });
+    } catch (err) {
+      if (err.response || attempt >= attempts) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+    }
+  }
+};
+
 // Auth APIs
 export const register = async (name, email, password) => {
   const response = await api.post('/register', { name, email, password });
@@ -15,7 +61,11 @@ export const register = async (name, email, password) => {
 };
 
 export const login = async (email, password) => {
+  clearSession();
   const response = await api.post('/login', { email, password });
+  if (response.data.token) {
+    localStorage.setItem(TOKEN_KEY, response.data.token);
+  }
   return response.data;
 };
 
@@ -48,12 +98,24 @@ export const getVehiclesAtStation = async (stationId) => {
   return response.data;
 };
 
+// Closest active stations to a point, each with DistanceKm and AvailableVehicles.
+export const getNearbyStations = async (lat, lon, k = 5) => {
+  const response = await api.get('/stations/nearby', { params: { lat, lon, k } });
+  return response.data;
+};
+
 // Vehicles APIs
 export const getVehicles = async () => {
   const response = await api.get('/vehicles');
   return response.data;
 };
 
+// Closest available vehicle of a type to a point, with its station and distance.
+export const getNearestVehicle = async (lat, lon, type) => {
+  const response = await api.get('/vehicles/nearest', { params: { lat, lon, type } });
+  return response.data;
+};
+
 export const addVehicle = async (type, model, manufacturer, ratePerHour, registrationNumber, stationId, userRole) => {
   const response = await api.post('/vehicles', {
     type,
@@ -86,7 +148,7 @@ export const reportVehicleIssue = async (vehicleId, issueReported, userId, userR
 
 // Booking APIs
 export const bookRide = async (userId, vehicleId, startStationId, durationHours) => {
-  const response = await api.post('/book', {
+  const response = await postIdempotent('/book', {
     user_id: userId,
     vehicle_id: vehicleId,
     start_station_id: startStationId,
@@ -95,6 +157,48 @@ export const bookRide = async (userId, vehicleId, startStationId, durationHours)
   return response.data;
 };
 
+// Reserve a vehicle for a future window (ISO-8601 start/end); charged at booking time.
+export const reserveVehicle = async (userId, vehicleId, startTime, endTime) => {
+  const response = await api.post('/reservations', {
+    user_id: userId,
+    vehicle_id: vehicleId,
+    start_time: startTime,
+    end_time: endTime,
+  });
+  return response.data;
+};
+
+// Vehicles at a station that are free for the whole window.
+export const getStationAvailability = async (stationId, start, end, type = null) => {
+  const params = type ? { start, end, type } : { start, end };
+  const response = await api.get(`/stations/${stationId}/availability`, { params });
+  return response.data;
+};
+
+// Live availability over Server-Sent Events. handlers: { vehicle, station, stations, resync },
+// each optional. Pass stationIds to only hear about those stations. Returns a function that
+// closes the stream. EventSource reconnects (with Last-Event-ID) on its own.
+export const subscribeAvailability = (handlers, stationIds = null) => {
+  const query = stationIds && stationIds.length ? `?stations=${stationIds.join(',')}` : '';
+  const source = new EventSource(`${API_BASE_URL}/events${query}`);
+  ['vehicle', 'station', 'stations', 'resync'].forEach((kind) => {
+    if (handlers[kind]) {
+      source.addEventListener(kind, (e) => handlers[kind](JSON.parse(e.data)));
+    }
+  });
+  return () => source.close();
+};
+
+// Server-side prices for every available vehicle at a station, with the user's plan discount
+export const getStationQuotes = async (stationId, durationHours, userId) => {
+  const response = await api.post('/quotes', {
+    station_id: stationId,
+    duration_hours: durationHours,
+    user_id: userId,
+  });
+  return response.data;
+};
+
 export const endRide = async (tripId, endStationId) => {
   const response = await api.post('/endride', {
     trip_id: tripId,
@@ -117,6 +221,13 @@ export const getUserRides = async (userId, status = null) => {
   return response.data;
 };
 
+// Counts, wallet balance and ongoing ride for the dashboard in one request.
+// The browser revalidates with If-None-Match, so unchanged dashboards come back as 304.
+export const getUserDashboard = async (userId) => {
+  const response = await api.get(`/user/${userId}/dashboard`);
+  return response.data;
+};
+
 // User Profile APIs
 export const getUserProfile = async (userId) => {
   const response = await api.get(`/user/${userId}/profile`);
@@ -133,7 +244,7 @@ export const updateUserProfile = async (userId, name = null, password = null) =>
 
 // Wallet APIs
 export const addToWallet = async (userId, amount) => {
-  const response = await api.post(`/user/${userId}/wallet/add`, { amount });
+  const response = await postIdempotent(`/user/${userId}/wallet/add`, { amount });
   return response.data;
 };
 
@@ -207,12 +318,14 @@ export const completeMaintenanceLog = async (logId, userRole) => {
 };
 
 // Logs APIs (Admin only)
-export const getLogs = async (userRole, { table = null, limit = 100 } = {}) => {
+// Returns one page of logs plus the cursor for the next (older) page, or null at the end.
+export const getLogs = async (userRole, { table = null, limit = 100, cursor = null } = {}) => {
   const params = { user_role: userRole };
   if (table) params.table = table;
   if (limit) params.limit = limit;
+  if (cursor) params.cursor = cursor;
   const response = await api.get('/logs', { params });
-  return response.data;
+  return { logs: response.data, nextCursor: response.headers['x-next-cursor'] || null };
 };
 
 export default api;
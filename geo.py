@@ -0,0 +1,265 @@
+"""
+Nearest-station and nearest-available-vehicle search.
+
+Active stations with coordinates are kept in an in-memory uniform grid
+(GRID_CELL_DEG degrees per cell, about 1.1 km at the default 0.01). A k-nearest
+query scans rings of cells around the query point and stops as soon as no
+unvisited cell can hold anything closer than the k-th best so far, so it only
+touches the few cells near the point however many stations there are. Points
+are ranked by an equirectangular distance, which matches great-circle order at
+city scale; only the returned points get an exact haversine distance. A query
+far from every station falls back to scanning all points.
+
+The index is loaded from the database on first use, updated in place by
+add_station / deactivate_station, and fully reloaded every GEO_INDEX_REFRESH
+seconds so that workers pick up stations added through other processes.
+Longitudes are not wrapped at the antimeridian; the service is city-scale.
+"""
+import math
+import os
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.195
+
+GRID_CELL_DEG = float(os.environ.get("GEO_GRID_CELL_DEG", 0.01))
+INDEX_REFRESH = float(os.environ.get("GEO_INDEX_REFRESH", 300))
+MAX_NEARBY = 100
+VEHICLE_SEARCH_BATCH = 16
+VEHICLE_SEARCH_STATIONS = 256
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_coordinates(lat, lon):
+    """Validates a latitude/longitude pair; returns floats or raises ValueError."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise ValueError("lat and lon must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat must be within [-90, 90] and lon within [-180, 180]")
+    return lat, lon
+
+
+class GridIndex:
+    """Points bucketed into lat/lon cells, with ring-by-ring k-nearest search."""
+
+    def __init__(self, cell_deg=GRID_CELL_DEG):
+        self.cell = cell_deg
+        self._cells = {}   # (row, col) -> {key: (lat, lon)}
+        self._where = {}   # key -> (row, col)
+        self._extent = None  # [min row, max row, min col, max col]; only grows
+        self._lock = threading.Lock()
+
+    def _cell_of(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def __len__(self):
+        return len(self._where)
+
+    def add(self, key, lat, lon):
+        with self._lock:
+            self._discard(key)
+            cell = self._cell_of(lat, lon)
+            self._cells.setdefault(cell, {})[key] = (lat, lon)
+            self._where[key] = cell
+            row, col = cell
+            if self._extent is None:
+                self._extent = [row, row, col, col]
+            else:
+                extent = self._extent
+                extent[0], extent[1] = min(extent[0], row), max(extent[1], row)
+                extent[2], extent[3] = min(extent[2], col), max(extent[3], col)
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Returns up to k (distance_km, key) pairs, closest first."""
+        scale = math.cos(math.radians(lat))
+
+        def approx_km(plat, plon):
+            return KM_PER_DEG_LAT * math.hypot(plat - lat, (plon - lon) * scale)
+
+        with self._lock:
+            if not self._where or k <= 0:
+                return []
+            row, col = self._cell_of(lat, lon)
+            # Ring radius beyond which there are no cells at all.
+            min_row, max_row, min_col, max_col = self._extent
+            last_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+            found = []
+            radius = 0
+            while radius <= last_ring:
+                if (2 * radius + 1) ** 2 > 4 * len(self._cells):
+                    # Mostly empty rings from here on; cheaper to rank every point exactly.
+                    found = [(haversine_km(lat, lon, plat, plon), key)
+                             for bucket in self._cells.values() for key, (plat, plon) in bucket.items()]
+                    break
+                for cell in self._ring(row, col, radius):
+                    bucket = self._cells.get(cell)
+                    if bucket:
+                        found.extend((approx_km(plat, plon), key) for key, (plat, plon) in bucket.items())
+                # Anything in ring radius+1 or beyond is at least `radius` whole cells away.
+                bound = radius * self.cell * KM_PER_DEG_LAT * min(1.0, scale)
+                if max_km is not None and bound > max_km:
+                    break
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= bound:
+                        break
+                radius += 1
+            found.sort()
+            best = [(haversine_km(lat, lon, *self._cells[self._where[key]][key]), key) for _, key in found[:k]]
+        best.sort()
+        if max_km is not None:
+            best = [item for item in best if item[0] <= max_km]
+        return best
+
+
+class StationIndex:
+    """The grid of active stations, plus each station's name, loaded from the database."""
+
+    def __init__(self):
+        self.grid = GridIndex()
+        self.names = {}
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+
+    def _load(self, conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT StationID, Name, Latitude, Longitude
+                FROM Stations
+                WHERE IsActive = TRUE AND Latitude IS NOT NULL AND Longitude IS NOT NULL
+            """)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        grid = GridIndex()
+        names = {}
+        for station_id, name, lat, lon in rows:
+            grid.add(station_id, float(lat), float(lon))
+            names[station_id] = name
+        self.grid, self.names = grid, names
+        self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, conn):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < INDEX_REFRESH:
+            return
+        with self._load_lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= INDEX_REFRESH:
+                self._load(conn)
+
+    def add(self, station_id, name, lat, lon):
+        if self._loaded_at is None:
+            return  # the first query loads everything, including this station
+        self.names[station_id] = name
+        self.grid.add(station_id, lat, lon)
+
+    def remove(self, station_id):
+        self.grid.remove(station_id)
+        self.names.pop(station_id, None)
+
+    def invalidate(self):
+        """Forces a reload on the next query, e.g. after a bulk insert."""
+        self._loaded_at = None
+
+    def stats(self):
+        return {"stations": len(self.grid), "cell_deg": self.grid.cell}
+
+
+station_index = StationIndex()
+
+
+def nearby_stations(conn, lat, lon, k, max_km=None):
+    """The k closest active stations with their live available-vehicle counts."""
+    station_index.ensure_loaded(conn)
+    hits = station_index.grid.nearest(lat, lon, k, max_km)
+    if not hits:
+        return []
+    ids = [station_id for _, station_id in hits]
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT s.StationID, s.Name, s.Location, s.Capacity, s.Latitude, s.Longitude,
+                   COALESCE(sa.AvailableVehicles, 0) AS AvailableVehicles
+            FROM Stations s
+            LEFT JOIN StationAvailability sa ON sa.StationID = s.StationID
+            WHERE s.StationID IN ({', '.join(['%s'] * len(ids))}) AND s.IsActive = TRUE
+        """, tuple(ids))
+        rows = {row["StationID"]: row for row in cur.fetchall()}
+    finally:
+        cur.close()
+    stations = []
+    for distance, station_id in hits:
+        row = rows.get(station_id)
+        if row is not None:
+            row["DistanceKm"] = round(distance, 3)
+            stations.append(row)
+    return stations
+
+
+def nearest_available_vehicle(conn, lat, lon, vehicle_type, max_km=None):
+    """
+    The closest available vehicle of `vehicle_type`, searching stations outward
+    in batches, or None. Availability is read live, so a vehicle booked a moment
+    ago is never returned.
+    """
+    station_index.ensure_loaded(conn)
+    checked = 0
+    cur = conn.cursor(dictionary=True)
+    try:
+        while checked < VEHICLE_SEARCH_STATIONS:
+            hits = station_index.grid.nearest(lat, lon, checked + VEHICLE_SEARCH_BATCH, max_km)
+            batch = hits[checked:]
+            if not batch:
+                return None
+            checked = len(hits)
+            distances = {station_id: distance for distance, station_id in batch}
+            cur.execute(f"""
+                SELECT v.VehicleID, v.Type, v.Model, v.Manufacturer, v.RatePerHour, v.CurrentStationID AS StationID
+                FROM Vehicles v
+                WHERE v.CurrentStationID IN ({', '.join(['%s'] * len(distances))})
+                  AND v.Status = 'available' AND v.Type = %s
+            """, (*distances, vehicle_type))
+            vehicles = cur.fetchall()
+            if vehicles:
+                best = min(vehicles, key=lambda v: (distances[v["StationID"]], v["VehicleID"]))
+                best["StationName"] = station_index.names.get(best["StationID"])
+                best["DistanceKm"] = round(distances[best["StationID"]], 3)
+                return best
+            if len(batch) < VEHICLE_SEARCH_BATCH:
+                return None
+    finally:
+        cur.close()
+    return None
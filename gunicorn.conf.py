@@ -0,0 +1,23 @@
+"""
+gunicorn settings, read automatically by `gunicorn app:app` from this directory.
+
+Workers are threaded: each GET /api/events stream holds a thread for as long
+as it is open, so a sync worker would be taken by a single dashboard tab.
+Streams are capped at half of each worker's threads (unless
+SSE_MAX_SUBSCRIBERS is set) to leave the rest for ordinary requests.
+
+Starts the background scheduler in each worker once the app is loaded; see
+scheduler.py for how the workers agree on a leader.
+"""
+import os
+
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 64))
+
+# Read by events.py when the workers import the app
+os.environ.setdefault("SSE_MAX_SUBSCRIBERS", str(max(1, threads // 2)))
+
+
+def post_worker_init(worker):
+    import scheduler
+    scheduler.start_scheduler()
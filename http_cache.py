@@ -0,0 +1,78 @@
+"""
+Conditional, compressed responses for read-heavy JSON endpoints.
+
+A route renders its rows once into a Representation (serialized body, strong
+ETag, lazily built compressed variants) and keeps that in the catalog cache.
+The cache entry is the data version: write routes bump it by invalidating the
+key, and the next read renders a new representation. respond() answers a
+matching If-None-Match with 304 and sends br/gzip for bodies of at least
+COMPRESS_MIN_BYTES when the client accepts them.
+
+Because the ETag is a hash of the body, it is the same in every worker process
+and across cache reloads that return unchanged data.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Server preference when the client accepts several with equal weight.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _compress(encoding, body):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class Representation:
+    """One serialized JSON body plus its compressed variants, built on first use."""
+
+    def __init__(self, data):
+        response = current_app.json.response(data)
+        self.body = response.get_data()
+        self.mimetype = response.mimetype
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        with self._lock:
+            body = self._encoded.get(encoding)
+            if body is None:
+                body = self._encoded[encoding] = _compress(encoding, self.body)
+            return body
+
+
+def respond(representation):
+    encoding = None
+    if len(representation.body) >= COMPRESS_MIN_BYTES:
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        body = representation.body
+        etag = representation.etag
+    else:
+        body = representation.encoded(encoding)
+        # Each encoding is a different byte sequence, so it gets its own strong validator.
+        etag = f"{representation.etag}-{encoding}"
+
+    response = current_app.response_class(body, mimetype=representation.mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate; the 304 is what saves the transfer.
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
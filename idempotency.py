@@ -0,0 +1,218 @@
+"""
+Idempotency-Key support for retried POSTs.
+
+A client that may retry (e.g. a phone on a flaky network) sends a unique
+Idempotency-Key header. The first request with a key claims it by inserting a
+pending row into IdempotencyKeys, runs the route and stores its response; any
+later request with the same key and route gets that stored response back,
+marked Idempotent-Replayed: true, without touching the route again.
+
+- Responses are remembered in an in-process LRU (IDEMPOTENCY_CACHE_SIZE) in
+  front of the table, which is what other workers see.
+- The key is scoped to the method, the path and the caller (the session's
+  user, else a hash of any Authorization header), and bound to a hash of the
+  caller and the body: reusing it for a different request is a 422.
+- A repeat that arrives while the first is still running gets a 409.
+- 5xx responses and exceptions release the key so the client can retry.
+- Keys live for IDEMPOTENCY_TTL seconds (default 24h); the purge job deletes
+  expired rows and the LRU drops them on its own.
+
+If a worker dies between committing the route's transaction and storing the
+response, the key stays pending (409) until it expires, which errs on the side
+of not charging twice.
+"""
+import hashlib
+import logging
+import os
+import threading
+from functools import wraps
+
+import mysql.connector
+from flask import current_app, jsonify, request
+
+import db
+import sessions
+from cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+ER_DUP_ENTRY = 1062
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 3600))
+PURGE_BATCH = 1000
+
+PENDING = "pending"
+DONE = "done"
+
+responses = TTLCache(maxsize=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", 10000)), ttl=TTL)
+
+_lock = threading.Lock()
+_stats = {"claimed": 0, "replayed": 0, "in_progress": 0, "mismatched": 0, "released": 0}
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+class _Stored:
+    __slots__ = ("request_hash", "status", "body", "mimetype")
+
+    def __init__(self, request_hash, status, body, mimetype):
+        self.request_hash = request_hash
+        self.status = status
+        self.body = body
+        self.mimetype = mimetype
+
+
+def _replay(stored):
+    _count("replayed")
+    response = current_app.response_class(stored.body, status=stored.status, mimetype=stored.mimetype)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _mismatch():
+    _count("mismatched")
+    return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+
+
+def _claim(conn, scope, key, request_hash):
+    """
+    Inserts the pending row. Returns None when this request owns the key, or
+    the existing row as (request_hash, status, response_status, body, mimetype).
+    """
+    cur = conn.cursor()
+    try:
+        for _ in range(2):
+            try:
+                cur.execute("""
+                    INSERT INTO IdempotencyKeys (Scope, IdemKey, RequestHash, Status, ExpiresAt)
+                    VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                """, (scope, key, request_hash, PENDING, TTL))
+                conn.commit()
+                return None
+            except mysql.connector.Error as e:
+                conn.rollback()
+                if e.errno != ER_DUP_ENTRY:
+                    raise
+            # An expired row the purge job has not reached yet does not count.
+            cur.execute(
+                "DELETE FROM IdempotencyKeys WHERE Scope = %s AND IdemKey = %s AND ExpiresAt <= NOW()",
+                (scope, key),
+            )
+            conn.commit()
+            if cur.rowcount == 0:
+                break
+        cur.execute("""
+            SELECT RequestHash, Status, ResponseStatus, ResponseBody, ResponseType
+            FROM IdempotencyKeys
+            WHERE Scope = %s AND IdemKey = %s
+        """, (scope, key))
+        row = cur.fetchone()
+        conn.commit()
+        return row
+    finally:
+        cur.close()
+
+
+def _finish(conn, scope, key, response):
+    """Stores a final response, or releases the key after a server error."""
+    conn.rollback()  # whatever the route left open is not ours to commit
+    cur = conn.cursor()
+    try:
+        if response is None or response.status_code >= 500:
+            cur.execute(
+                "DELETE FROM IdempotencyKeys WHERE Scope = %s AND IdemKey = %s AND Status = %s",
+                (scope, key, PENDING),
+            )
+            _count("released")
+        else:
+            cur.execute("""
+                UPDATE IdempotencyKeys
+                SET Status = %s, ResponseStatus = %s, ResponseBody = %s, ResponseType = %s
+                WHERE Scope = %s AND IdemKey = %s
+            """, (DONE, response.status_code, response.get_data(), response.mimetype, scope, key))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _caller():
+    """Who is asking: the session's user, else a hash of the Authorization header, else '-'."""
+    user_id = sessions.user_id()
+    if user_id is not None:
+        return f"user:{user_id}"
+    credential = request.headers.get("Authorization")
+    if credential:
+        return "auth:" + hashlib.sha256(credential.encode()).hexdigest()[:32]
+    return "-"
+
+
+def idempotent(view):
+    """Honours an Idempotency-Key header on a POST route; without the header the route runs as usual."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        caller = _caller()
+        scope = f"{request.method} {request.path} {caller}"
+        request_hash = hashlib.sha256(caller.encode() + b"\n" + request.get_data()).hexdigest()
+        cache_key = (scope, key)
+
+        stored = responses.get(cache_key)
+        if stored is not None:
+            return _replay(stored) if stored.request_hash == request_hash else _mismatch()
+
+        conn = db.get_db()
+        existing = _claim(conn, scope, key, request_hash)
+        if existing is not None:
+            stored_hash, status, response_status, body, mimetype = existing
+            if stored_hash != request_hash:
+                return _mismatch()
+            if status == PENDING:
+                _count("in_progress")
+                return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409
+            stored = _Stored(stored_hash, response_status, bytes(body), mimetype)
+            responses.set(cache_key, stored)
+            return _replay(stored)
+
+        _count("claimed")
+        response = None
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            return response
+        finally:
+            try:
+                _finish(conn, scope, key, response)
+            except mysql.connector.Error:
+                log.warning("could not record idempotent response for %s", scope, exc_info=True)
+            if response is not None and response.status_code < 500:
+                responses.set(cache_key, _Stored(request_hash, response.status_code, response.get_data(),
+                                                 response.mimetype))
+    return wrapper
+
+
+def purge_expired(conn):
+    """Scheduler job: deletes expired keys in batches. Returns (rows deleted, whether the batch was full)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM IdempotencyKeys WHERE ExpiresAt <= NOW() ORDER BY ExpiresAt LIMIT %s",
+                    (PURGE_BATCH,))
+        deleted = cur.rowcount
+        conn.commit()
+        return deleted, deleted == PURGE_BATCH
+    finally:
+        cur.close()
+
+
+def idempotency_stats():
+    with _lock:
+        data = dict(_stats)
+    data["cache"] = responses.stats()
+    return data
@@ -0,0 +1,126 @@
+"""
+JSON provider backed by orjson, with Flask's stdlib provider as the fallback.
+
+Responses keep the wire format of Flask's default provider: keys sorted,
+Decimal as a string, date/datetime as an HTTP date. Only the encoder changes.
+Set JSON_ENCODER=stdlib to force the fallback (e.g. to compare the two).
+
+fetch_rows() turns the tuples of a plain cursor into dicts whose keys are
+already in sorted order, so rows_response() can skip the per-row key sort
+during encoding. It still builds one dict per row, but with zip() and an
+itemgetter rather than in the cursor's Python code. Encoding the tuples
+without dicts needs one encoder call per value (orjson has no tuple-as-object
+mode), which measured about twice as slow at 10k rows; the dicts also give
+next_cursor() the page's last row by column name.
+"""
+import dataclasses
+import decimal
+import json
+import os
+import uuid
+from datetime import date
+from operator import itemgetter
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib provider is used instead
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Same output as DefaultJSONProvider (modulo non-ASCII being sent as UTF-8), encoded by orjson."""
+
+    def _options(self, sort_keys=None, indent=False):
+        # Datetimes are passed to _default so they come out as HTTP dates, not ISO 8601.
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop("sort_keys", None)
+        if kwargs:
+            # Anything orjson has no equivalent for (cls=, separators=, ...) goes to the stdlib.
+            return super().dumps(obj, sort_keys=self.sort_keys if sort_keys is None else sort_keys, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options(sort_keys)).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=_default, option=self._options(indent=indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def _use_orjson():
+    return orjson is not None and os.environ.get("JSON_ENCODER", "orjson").lower() != "stdlib"
+
+
+def init_json(app):
+    if _use_orjson():
+        app.json = OrjsonProvider(app)
+
+
+def encode(obj, sort_keys=True):
+    """
+    Response body bytes for `obj` outside a Flask app (the ASGI routes), in the
+    same compact format and with the same encoder init_json() picks.
+    """
+    if _use_orjson():
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option) + b"\n"
+    body = json.dumps(obj, default=_default, ensure_ascii=True, sort_keys=sort_keys, separators=(",", ":"))
+    return body.encode() + b"\n"
+
+
+def fetch_rows(cur):
+    """Fetches all rows of a plain (tuple) cursor as dicts with sorted keys."""
+    return sorted_rows(cur.description, cur.fetchall())
+
+
+def sorted_rows(description, rows):
+    """Tuple rows as dicts with sorted keys, given the cursor description they came with."""
+    names = [column[0] for column in description]
+    order = sorted(range(len(names)), key=names.__getitem__)
+    keys = [names[i] for i in order]
+    if len(order) == 1:
+        return [{keys[0]: row[0]} for row in rows]
+    pick = itemgetter(*order)
+    return [dict(zip(keys, pick(row))) for row in rows]
+
+
+def rows_response(rows):
+    """JSON response for rows from fetch_rows(); their keys are already sorted."""
+    app = current_app
+    provider = app.json
+    indent = provider.compact is False or (provider.compact is None and app.debug)
+    if isinstance(provider, OrjsonProvider):
+        body = orjson.dumps(rows, default=_default, option=provider._options(sort_keys=False, indent=indent))
+    else:
+        body = json.dumps(
+            rows,
+            default=provider.default,
+            ensure_ascii=provider.ensure_ascii,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+        ).encode()
+    return app.response_class(body + b"\n", mimetype=provider.mimetype)
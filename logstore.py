@@ -0,0 +1,236 @@
+"""
+Monthly partitions for the Logs table.
+
+Migration 8 partitions Logs by RANGE on ChangeTimestamp. There is one
+partition per calendar month, named pYYYYMM, from the oldest row's month to
+LOG_PARTITIONS_AHEAD months ahead, plus a catch-all pmax. Inserts land in the
+current month's partition, and a time-bounded read only opens the partitions
+its window covers.
+
+The maintain_log_partitions job keeps that shape:
+
+- It splits new months off pmax, so there are always LOG_PARTITIONS_AHEAD
+  months of empty partitions ready. pmax is empty when this happens, so the
+  split is a metadata change.
+- Months older than LOG_RETENTION_MONTHS are written to
+  LOG_ARCHIVE_DIR/Logs-pYYYYMM.ndjson.gz, checked against the partition's
+  row count, and then dropped. Dropping a partition does not touch the rest
+  of the table.
+
+get_logs pages newest first. It reads the last LOG_SCAN_MONTHS partitions
+first (scan_windows) and only widens to the whole requested range when that
+window cannot fill the page.
+"""
+import gzip
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+import db
+import export
+
+log = logging.getLogger(__name__)
+
+PARTITIONS_AHEAD = int(os.environ.get("LOG_PARTITIONS_AHEAD", 3))
+RETENTION_MONTHS = int(os.environ.get("LOG_RETENTION_MONTHS", 12))
+SCAN_MONTHS = int(os.environ.get("LOG_SCAN_MONTHS", 2))
+ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "archive", "logs"))
+ARCHIVE_BATCH = 5000
+
+TABLE = "Logs"
+CATCH_ALL = "pmax"
+MONTHLY = re.compile(r"^p(\d{4})(\d{2})$")
+
+_lock = threading.Lock()
+_stats = {"partitions_added": 0, "partitions_archived": 0, "rows_archived": 0, "archive_mismatches": 0,
+          "windows_widened": 0}
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def _month(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def _definition(month):
+    bound = _add_months(month, 1).strftime("%Y-%m-%d %H:%M:%S")
+    return f"PARTITION {_name(month)} VALUES LESS THAN (UNIX_TIMESTAMP('{bound}'))"
+
+
+def _catch_all():
+    return f"PARTITION {CATCH_ALL} VALUES LESS THAN MAXVALUE"
+
+
+def monthly_partitions(cur):
+    """The months of the existing pYYYYMM partitions, oldest first ([] while Logs is not partitioned)."""
+    cur.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (TABLE,))
+    months = []
+    for (name,) in cur.fetchall():
+        match = MONTHLY.match(name)
+        if match:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+    return months
+
+
+def partition_logs(cur):
+    """Migration step: partitions Logs from its oldest row's month to PARTITIONS_AHEAD months ahead."""
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (TABLE,))
+    if cur.fetchone()[0]:
+        return  # already partitioned
+    cur.execute(f"SELECT MIN(ChangeTimestamp), NOW() FROM {TABLE}")
+    oldest, now = cur.fetchone()
+    month, last = _month(oldest or now), _add_months(_month(now), PARTITIONS_AHEAD)
+    definitions = []
+    while month <= last:
+        definitions.append(_definition(month))
+        month = _add_months(month, 1)
+    definitions.append(_catch_all())
+    cur.execute(f"ALTER TABLE {TABLE} PARTITION BY RANGE (UNIX_TIMESTAMP(ChangeTimestamp)) "
+                f"({', '.join(definitions)})")
+
+
+def _db_now(cur):
+    cur.execute("SELECT NOW()")
+    return cur.fetchone()[0]
+
+
+def add_future_partitions(conn):
+    """Splits months off pmax until PARTITIONS_AHEAD months past the current one exist. Returns how many."""
+    cur = conn.cursor()
+    try:
+        months = monthly_partitions(cur)
+        if not months:
+            return 0
+        target = _add_months(_month(_db_now(cur)), PARTITIONS_AHEAD)
+        new = []
+        month = _add_months(months[-1], 1)
+        while month <= target:
+            new.append(month)
+            month = _add_months(month, 1)
+        if new:
+            definitions = ", ".join([_definition(m) for m in new] + [_catch_all()])
+            cur.execute(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {CATCH_ALL} INTO ({definitions})")
+            _count("partitions_added", len(new))
+            log.info("added Logs partitions %s", ", ".join(_name(m) for m in new))
+        return len(new)
+    finally:
+        cur.close()
+
+
+def _archive_path(name):
+    return os.path.join(ARCHIVE_DIR, f"{TABLE}-{name}.ndjson.gz")
+
+
+def archive_partition(name):
+    """
+    Writes every row of one partition to a gzipped NDJSON file on its own
+    connection and returns the number of rows written. The file only appears
+    under its final name once it is complete.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = _archive_path(name)
+    partial = path + ".partial"
+    columns = export.EXPORTS[TABLE]["columns"]
+    written = 0
+    with db.pool.connection() as conn:
+        cur = conn.cursor(buffered=False)
+        try:
+            cur.execute(f"SELECT {', '.join(columns)} FROM {TABLE} PARTITION ({name}) ORDER BY LogID")
+            with gzip.open(partial, "wt", encoding="utf-8", compresslevel=6) as out:
+                while True:
+                    batch = cur.fetchmany(ARCHIVE_BATCH)
+                    if not batch:
+                        break
+                    out.write(export.ndjson_lines(columns, batch))
+                    written += len(batch)
+        finally:
+            cur.close()
+        conn.commit()
+    os.replace(partial, path)
+    return written
+
+
+def archive_expired(conn):
+    """
+    Archives and drops the oldest partition past the retention period.
+    Returns (partitions dropped, whether another may be due).
+    """
+    cur = conn.cursor()
+    try:
+        months = monthly_partitions(cur)
+        cutoff = _add_months(_month(_db_now(cur)), -RETENTION_MONTHS)
+        conn.commit()
+        # Never the last monthly partition: pmax must keep a lower neighbour.
+        expired = [m for m in months[:-1] if m < cutoff]
+        if not expired:
+            return 0, False
+        name = _name(expired[0])
+        written = archive_partition(name)
+        cur.execute(f"SELECT COUNT(*) FROM {TABLE} PARTITION ({name})")
+        count = cur.fetchone()[0]
+        conn.commit()
+        if count != written:
+            # Something was written into the month while it was archived; try again next run.
+            _count("archive_mismatches")
+            log.warning("Logs partition %s changed while archiving (%s rows, %s archived)", name, count, written)
+            return 0, False
+        cur.execute(f"ALTER TABLE {TABLE} DROP PARTITION {name}")
+        _count("partitions_archived")
+        _count("rows_archived", written)
+        log.info("archived %s Logs rows to %s and dropped %s", written, _archive_path(name), name)
+        return 1, len(expired) > 1
+    finally:
+        cur.close()
+
+
+def maintain(conn):
+    """Scheduler batch: future partitions, then at most one expired month. Returns (changes, more due)."""
+    added = add_future_partitions(conn)
+    dropped, more = archive_expired(conn)
+    return added + dropped, more
+
+
+def scan_windows(since=None, until=None, cursor=None):
+    """
+    Lower bounds for a newest-first page of Logs, narrowest first: the start of
+    the last SCAN_MONTHS months before the page's upper end, then `since`.
+    Rows at or after a bound are newer than every row before it, so a window
+    that fills the page gives the same rows as the full range.
+    """
+    upper = cursor[0] if cursor else until or datetime.now()
+    lower = _add_months(_month(upper), 1 - SCAN_MONTHS)
+    try:
+        narrower = since is None or lower > since
+    except TypeError:  # one of them has a time zone
+        narrower = False
+    if narrower:
+        yield lower
+        _count("windows_widened")
+    yield since
+
+
+def logstore_stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,267 @@
+"""
+Request and SQL instrumentation exposed in Prometheus text format.
+
+init_metrics(app) installs before/after request hooks for per-route latency,
+wraps pooled cursors so every execute/executemany/callproc is timed and its
+rows counted, and times connection checkout. Statements slower than
+SLOW_QUERY_MS are written to the "slow_query" logger.
+
+Everything is plain in-process counters guarded by a lock, cheap enough to
+leave on in production; set METRICS_ENABLED=false to skip the hooks entirely.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, got_request_exception, request
+
+import db
+
+slow_log = logging.getLogger("slow_query")
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _by_labels(item):
+    # Label values are rendered as strings; sort them that way so mixed types cannot collide
+    return tuple(str(value) for value in item[0])
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in sorted(items, key=_by_labels):
+            base = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_join(base, _le(bound))} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_join(base, _le('+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{_wrap(base)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_wrap(base)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items(), key=_by_labels)
+        for label_values, value in items:
+            lines.append(f"{self.name}{_wrap(_labels(self.labels, label_values))} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _wrap(labels):
+    return "{" + labels + "}" if labels else ""
+
+
+def _le(bound):
+    return f'le="{bound}"'
+
+
+def _join(labels, extra):
+    return "{" + (labels + "," if labels else "") + extra + "}"
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"))
+SQL_LATENCY = Histogram(
+    "sql_statement_duration_seconds", "SQL execute/callproc latency by statement", ("statement",))
+SQL_ROWS = Counter(
+    "sql_rows_total", "Rows fetched or affected by statement", ("statement",))
+DB_ACQUIRE = Histogram(
+    "db_connection_acquire_seconds", "Time to check a connection out of the pool", ())
+ERRORS = Counter(
+    "errors_total", "Errors by kind and type", ("kind", "type"))
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Background job run time", ("job",))
+JOB_RUNS = Counter(
+    "job_runs_total", "Background job runs by outcome", ("job", "outcome"))
+JOB_ITEMS = Counter(
+    "job_items_total", "Rows processed by background jobs", ("job",))
+
+
+def fingerprint(sql):
+    """Collapses whitespace so the same parameterised statement always maps to one label."""
+    text = " ".join(sql.split())
+    return text if len(text) <= 160 else text[:157] + "..."
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times statements and counts the rows they return or touch."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, statement, call, *args, **kwargs):
+        self._statement = statement
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            ERRORS.inc(("sql", str(getattr(e, "errno", None) or type(e).__name__)))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_LATENCY.observe((statement,), elapsed)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                slow_log.warning("%.1f ms: %s", elapsed * 1000, statement)
+            rowcount = getattr(self._cursor, "rowcount", -1)
+            if rowcount and rowcount > 0 and not getattr(self._cursor, "with_rows", False):
+                SQL_ROWS.inc((statement,), rowcount)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(fingerprint(operation), self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(fingerprint(operation), self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def callproc(self, procname, args=()):
+        return self._timed(f"CALL {procname}", self._cursor.callproc, procname, args)
+
+    def _count_rows(self, rows):
+        if self._statement is not None and rows:
+            SQL_ROWS.inc((self._statement,), len(rows))
+        return rows
+
+    def fetchall(self):
+        return self._count_rows(self._cursor.fetchall())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return self._count_rows(rows)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None and self._statement is not None:
+            SQL_ROWS.inc((self._statement,))
+        return row
+
+
+def _instrument_pool(pool):
+    acquire = pool.acquire
+
+    def timed_acquire():
+        started = time.perf_counter()
+        try:
+            return acquire()
+        except Exception as e:
+            ERRORS.inc(("pool", type(e).__name__))
+            raise
+        finally:
+            DB_ACQUIRE.observe((), time.perf_counter() - started)
+
+    pool.acquire = timed_acquire
+    pool.cursor_wrapper = InstrumentedCursor
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_LATENCY.observe((request.method, route, str(response.status_code)), time.perf_counter() - started)
+        if response.status_code >= 400:
+            ERRORS.inc(("http", str(response.status_code)))
+    return response
+
+
+def _on_exception(sender, exception, **extra):
+    ERRORS.inc(("exception", type(exception).__name__))
+
+
+def _gauges(name, help_text, values):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f'{name}{{key="{_escape(key)}"}} {value}')
+    return lines
+
+
+_extra_gauges = []
+
+
+def register_gauges(name, help_text, source):
+    """Adds a callable returning a flat dict of numbers, rendered as one labelled gauge family."""
+    _extra_gauges.append((name, help_text, source))
+
+
+def render():
+    lines = []
+    for metric in (REQUEST_LATENCY, SQL_LATENCY, SQL_ROWS, DB_ACQUIRE, ERRORS, JOB_DURATION, JOB_RUNS, JOB_ITEMS):
+        lines.extend(metric.render())
+    for name, help_text, source in _extra_gauges:
+        lines.extend(_gauges(name, help_text, source()))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def enabled():
+    return os.environ.get("METRICS_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+
+def init_metrics(app):
+    if not enabled():
+        return
+    _instrument_pool(db.pool)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    got_request_exception.connect(_on_exception, app)
@@ -0,0 +1,601 @@
+"""
+Versioned schema migrations for ev_rental_db.
+
+    python migrations.py status        # list applied / pending migrations
+    python migrations.py upgrade       # apply pending migrations in order
+    python migrations.py check-plans   # EXPLAIN the hot queries, exit 1 on a full scan
+
+Connection settings come from the same DB_* environment variables as the API,
+so point them at a local seeded database before running check-plans.
+"""
+import sys
+
+import mysql.connector
+
+import logstore
+from db import db_config_from_env
+
+ER_DUP_FIELDNAME = 1060
+ER_DUP_KEYNAME = 1061
+ALREADY_APPLIED = (ER_DUP_FIELDNAME, ER_DUP_KEYNAME)
+
+# Each migration runs once, in version order. Statements should be safe to
+# re-run against a database where they were applied by hand (duplicate column
+# and index names are ignored). A statement may also be a function taking the
+# cursor, for DDL that depends on the data.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "hot_path_composite_indexes",
+        "statements": [
+            # v_UserTripHistory / report_vehicle_issue: WHERE UserID = ? [AND Status = ?] ORDER BY StartTime DESC
+            "CREATE INDEX idx_trips_user_start ON Trips (UserID, StartTime, TripID)",
+            "CREATE INDEX idx_trips_user_status_start ON Trips (UserID, Status, StartTime, TripID)",
+            # get_vehicles_at_station: WHERE CurrentStationID = ? AND Status = 'available'
+            "CREATE INDEX idx_vehicles_station_status ON Vehicles (CurrentStationID, Status, VehicleID)",
+            # get_logs: [WHERE TableName = ?] ORDER BY ChangeTimestamp DESC, LogID DESC
+            "CREATE INDEX idx_logs_table_ts ON Logs (TableName, ChangeTimestamp, LogID)",
+            "CREATE INDEX idx_logs_ts ON Logs (ChangeTimestamp, LogID)",
+        ],
+    },
+    {
+        "version": 2,
+        "name": "station_coordinates",
+        "statements": [
+            # Nullable so existing stations keep working; geo.py only indexes stations that have both.
+            "ALTER TABLE Stations ADD COLUMN Latitude DECIMAL(9, 6) NULL",
+            "ALTER TABLE Stations ADD COLUMN Longitude DECIMAL(9, 6) NULL",
+        ],
+    },
+    {
+        "version": 3,
+        "name": "trip_window_index",
+        "statements": [
+            # Reservation conflicts: WHERE VehicleID = ? AND Status IN ('Upcoming', 'Ongoing')
+            #   AND StartTime < ? AND EndTime > ?
+            "CREATE INDEX idx_trips_vehicle_status_window ON Trips (VehicleID, Status, StartTime, EndTime)",
+        ],
+    },
+    {
+        "version": 4,
+        "name": "scheduler_sweeps",
+        "statements": [
+            "ALTER TABLE Users ADD COLUMN PlanExpiresAt DATETIME NULL",
+            # Existing members get a full term from today; their purchase date was never stored.
+            """
+            UPDATE Users u
+            JOIN MembershipPlans mp ON mp.PlanID = u.PlanID
+            SET u.PlanExpiresAt = DATE_ADD(NOW(), INTERVAL mp.DurationMonths MONTH)
+            WHERE u.PlanExpiresAt IS NULL
+            """,
+            # expire_memberships: WHERE PlanExpiresAt <= NOW() ORDER BY PlanExpiresAt
+            "CREATE INDEX idx_users_plan_expiry ON Users (PlanExpiresAt)",
+            # settle_overdue_trips: WHERE Status = 'Ongoing' AND EndTime < ? ORDER BY EndTime, TripID
+            "CREATE INDEX idx_trips_status_end ON Trips (Status, EndTime)",
+            # activate_reservations: WHERE Status = 'Upcoming' AND StartTime <= NOW() ORDER BY StartTime
+            "CREATE INDEX idx_trips_status_start ON Trips (Status, StartTime)",
+        ],
+    },
+    {
+        "version": 5,
+        "name": "pricing_tables",
+        "statements": [
+            "ALTER TABLE MembershipPlans ADD COLUMN DiscountRate DECIMAL(4, 3) NOT NULL DEFAULT 0.000",
+            # The discounts that used to be hardcoded by plan name.
+            """
+            UPDATE MembershipPlans
+            SET DiscountRate = CASE PlanName
+                WHEN 'Basic Plan' THEN 0.050
+                WHEN 'Premium Plan' THEN 0.100
+                WHEN 'Annual Plan' THEN 0.150
+                ELSE 0.000
+            END
+            WHERE DiscountRate = 0
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS VehicleTypeRates (
+                Type VARCHAR(50) PRIMARY KEY,
+                RateMultiplier DECIMAL(5, 3) NOT NULL DEFAULT 1.000
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # [StartHour, EndHour) in server local time; wraps past midnight when EndHour <= StartHour.
+            """
+            CREATE TABLE IF NOT EXISTS PricingTimeBands (
+                BandID INT AUTO_INCREMENT PRIMARY KEY,
+                Label VARCHAR(50) NOT NULL,
+                StartHour TINYINT NOT NULL CHECK (StartHour BETWEEN 0 AND 23),
+                EndHour TINYINT NOT NULL CHECK (EndHour BETWEEN 0 AND 23),
+                Multiplier DECIMAL(5, 3) NOT NULL DEFAULT 1.000
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS PricingVersion (
+                ID TINYINT PRIMARY KEY,
+                Version INT NOT NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            "INSERT IGNORE INTO PricingVersion (ID, Version) VALUES (1, 1)",
+            # Any change to a pricing table bumps the version pricing.py polls.
+            *[
+                statement
+                for table, name in (
+                    ("MembershipPlans", "plans"),
+                    ("VehicleTypeRates", "type_rates"),
+                    ("PricingTimeBands", "time_bands"),
+                )
+                for event in ("INSERT", "UPDATE", "DELETE")
+                for statement in (
+                    f"DROP TRIGGER IF EXISTS trg_pricing_{name}_{event.lower()}",
+                    f"CREATE TRIGGER trg_pricing_{name}_{event.lower()} AFTER {event} ON {table} "
+                    f"FOR EACH ROW UPDATE PricingVersion SET Version = Version + 1 WHERE ID = 1",
+                )
+            ],
+        ],
+    },
+    {
+        "version": 6,
+        "name": "idempotency_keys",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+                Scope VARCHAR(200) NOT NULL,
+                IdemKey VARCHAR(255) NOT NULL,
+                RequestHash CHAR(64) NOT NULL,
+                Status ENUM('pending', 'done') NOT NULL,
+                ResponseStatus SMALLINT NULL,
+                ResponseBody MEDIUMBLOB NULL,
+                ResponseType VARCHAR(100) NULL,
+                CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                ExpiresAt DATETIME NOT NULL,
+                PRIMARY KEY (Scope, IdemKey)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # purge_idempotency_keys: WHERE ExpiresAt <= NOW() ORDER BY ExpiresAt
+            "CREATE INDEX idx_idempotency_expires ON IdempotencyKeys (ExpiresAt)",
+        ],
+    },
+    {
+        "version": 7,
+        "name": "wallet_ledger",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS WalletLedger (
+                EntryID BIGINT AUTO_INCREMENT PRIMARY KEY,
+                UserID INT NOT NULL,
+                Amount DECIMAL(12, 2) NOT NULL,
+                EntryType ENUM('opening', 'topup', 'ride', 'overdue', 'refund', 'membership') NOT NULL,
+                TripID INT NULL,
+                CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (UserID) REFERENCES Users(UserID),
+                FOREIGN KEY (TripID) REFERENCES Trips(TripID)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS WalletSnapshots (
+                UserID INT PRIMARY KEY,
+                Balance DECIMAL(12, 2) NOT NULL,
+                ThroughEntryID BIGINT NOT NULL,
+                TakenAt DATETIME NOT NULL,
+                FOREIGN KEY (UserID) REFERENCES Users(UserID)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # Available = ledger balance - held holds; the overdraft check is a conditional UPDATE on it.
+            """
+            CREATE TABLE IF NOT EXISTS WalletAccounts (
+                UserID INT PRIMARY KEY,
+                Available DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+                FOREIGN KEY (UserID) REFERENCES Users(UserID)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS WalletHolds (
+                HoldID BIGINT AUTO_INCREMENT PRIMARY KEY,
+                UserID INT NOT NULL,
+                Amount DECIMAL(12, 2) NOT NULL,
+                Status ENUM('held', 'captured', 'released') NOT NULL,
+                CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                ExpiresAt DATETIME NOT NULL,
+                FOREIGN KEY (UserID) REFERENCES Users(UserID)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # Kind is trip_charge / trip_refund (Ref = TripID) or account (Ref = UserID).
+            """
+            CREATE TABLE IF NOT EXISTS WalletDiscrepancies (
+                Kind VARCHAR(20) NOT NULL,
+                Ref INT NOT NULL,
+                UserID INT NOT NULL,
+                Expected DECIMAL(12, 2) NOT NULL,
+                Actual DECIMAL(12, 2) NOT NULL,
+                FoundAt DATETIME NOT NULL,
+                PRIMARY KEY (Kind, Ref)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # wallet.balance: WHERE UserID = ? AND EntryID > ?
+            "CREATE INDEX idx_wallet_ledger_user_entry ON WalletLedger (UserID, EntryID)",
+            # reconcile_wallets: WHERE CreatedAt > ? AND CreatedAt <= ?
+            "CREATE INDEX idx_wallet_ledger_created ON WalletLedger (CreatedAt)",
+            # snapshot_wallets: MAX(ThroughEntryID)
+            "CREATE INDEX idx_wallet_snapshots_through ON WalletSnapshots (ThroughEntryID)",
+            # wallet.available: WHERE UserID = ? AND Status = 'held'
+            "CREATE INDEX idx_wallet_holds_user_status ON WalletHolds (UserID, Status)",
+            # expire_wallet_holds: WHERE Status = 'held' AND ExpiresAt <= NOW() ORDER BY ExpiresAt
+            "CREATE INDEX idx_wallet_holds_status_expires ON WalletHolds (Status, ExpiresAt)",
+            # reconcile_wallets: WHERE Timestamp > ? AND Timestamp <= ?
+            "CREATE INDEX idx_payments_timestamp ON Payments (Timestamp)",
+            # Today's balances become each user's opening entry, snapshot and spendable amount.
+            """
+            INSERT INTO WalletLedger (UserID, Amount, EntryType)
+            SELECT u.UserID, u.WalletBalance, 'opening' FROM Users u
+            WHERE u.WalletBalance <> 0
+              AND NOT EXISTS (SELECT 1 FROM WalletLedger l WHERE l.UserID = u.UserID)
+            """,
+            """
+            INSERT IGNORE INTO WalletSnapshots (UserID, Balance, ThroughEntryID, TakenAt)
+            SELECT UserID, SUM(Amount), MAX(EntryID), NOW() FROM WalletLedger GROUP BY UserID
+            """,
+            """
+            INSERT IGNORE INTO WalletAccounts (UserID, Available)
+            SELECT UserID, Balance FROM WalletSnapshots
+            """,
+            *[
+                statement
+                for event in ("UPDATE", "DELETE")
+                for statement in (
+                    f"DROP TRIGGER IF EXISTS trg_wallet_ledger_no_{event.lower()}",
+                    f"CREATE TRIGGER trg_wallet_ledger_no_{event.lower()} BEFORE {event} ON WalletLedger "
+                    f"FOR EACH ROW SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'WalletLedger is append-only'",
+                )
+            ],
+        ],
+    },
+    {
+        "version": 8,
+        "name": "logs_partitioning",
+        "statements": [
+            # Every unique key of a partitioned table must contain the partitioning column.
+            "UPDATE Logs SET ChangeTimestamp = CURRENT_TIMESTAMP WHERE ChangeTimestamp IS NULL",
+            """
+            ALTER TABLE Logs
+                MODIFY ChangeTimestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (LogID, ChangeTimestamp)
+            """,
+            # Monthly RANGE partitions; the bounds depend on the data, see logstore.
+            logstore.partition_logs,
+        ],
+    },
+    {
+        "version": 9,
+        "name": "analytics_rollups",
+        "statements": [
+            # Source -> highest PaymentID / WalletLedger EntryID / TripID already read by refresh_analytics.
+            """
+            CREATE TABLE IF NOT EXISTS AnalyticsWatermarks (
+                Source VARCHAR(32) PRIMARY KEY,
+                LastID BIGINT NOT NULL DEFAULT 0,
+                UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS AnalyticsPendingTrips (
+                TripID INT PRIMARY KEY,
+                AddedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                CheckedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS StationHourlyUsage (
+                StationID INT NOT NULL,
+                HourStart DATETIME NOT NULL,
+                Trips INT NOT NULL DEFAULT 0,
+                BusySeconds BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (StationID, HourStart)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # PlanID 0 is "no plan"; VehicleType '' is a payment without a trip.
+            """
+            CREATE TABLE IF NOT EXISTS RevenueDaily (
+                Day DATE NOT NULL,
+                VehicleType VARCHAR(50) NOT NULL,
+                PlanID INT NOT NULL,
+                Payments INT NOT NULL DEFAULT 0,
+                Revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+                Refunds INT NOT NULL DEFAULT 0,
+                Refunded DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+                PRIMARY KEY (Day, VehicleType, PlanID)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS TripDurationDaily (
+                Day DATE NOT NULL,
+                VehicleType VARCHAR(50) NOT NULL,
+                Trips INT NOT NULL DEFAULT 0,
+                DurationSeconds BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (Day, VehicleType)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+            # fold_trips: ORDER BY CheckedAt, TripID LIMIT n
+            "CREATE INDEX idx_analytics_pending_checked ON AnalyticsPendingTrips (CheckedAt, TripID)",
+            # station_usage across all stations: WHERE HourStart >= ? AND HourStart < ?
+            "CREATE INDEX idx_station_usage_hour ON StationHourlyUsage (HourStart, StationID)",
+        ],
+    },
+    {
+        "version": 10,
+        "name": "wallet_ledger_audit",
+        "statements": [
+            # trg_after_user_update in LOGS.sql only fires on WalletBalance, which the ledger no longer
+            # writes. Same Logs row shape, same @app_audit switch.
+            "DROP TRIGGER IF EXISTS trg_after_wallet_ledger_insert",
+            """
+            CREATE TRIGGER trg_after_wallet_ledger_insert
+            AFTER INSERT ON WalletLedger
+            FOR EACH ROW
+            BEGIN
+                IF @app_audit IS NULL THEN
+                    INSERT INTO Logs (TableName, OperationType, RecordID, ChangeDescription)
+                    VALUES (
+                        'Users',
+                        'UPDATE',
+                        NEW.UserID,
+                        CONCAT('Wallet ', NEW.EntryType, ' of ', NEW.Amount,
+                               IF(NEW.TripID IS NULL, '', CONCAT(' for TripID=', NEW.TripID)))
+                    );
+                END IF;
+            END
+            """,
+        ],
+    },
+]
+
+# Hot queries and the table/index the plan must use. A query fails the check
+# when the named table is read with a full scan (type ALL) or without one of
+# the expected indexes.
+HOT_QUERIES = [
+    {
+        "name": "user_trip_history",
+        "sql": "SELECT * FROM v_UserTripHistory WHERE UserID = %s ORDER BY StartTime DESC",
+        "params": (1,),
+        "table": "t",
+        "keys": {"idx_trips_user_start", "idx_trips_user_status_start"},
+    },
+    {
+        "name": "user_trip_history_by_status",
+        "sql": "SELECT * FROM v_UserTripHistory WHERE UserID = %s AND Status = %s ORDER BY StartTime DESC",
+        "params": (1, "Completed"),
+        "table": "t",
+        "keys": {"idx_trips_user_status_start"},
+    },
+    {
+        "name": "ongoing_trip_for_vehicle",
+        "sql": "SELECT TripID FROM Trips WHERE UserID = %s AND VehicleID = %s AND Status = 'Ongoing'",
+        "params": (1, 1),
+        "table": "Trips",
+        # The VehicleID foreign-key index is just as selective here.
+        "keys": {"idx_trips_user_status_start", "VehicleID"},
+    },
+    {
+        "name": "available_vehicles_at_station",
+        "sql": (
+            "SELECT v.VehicleID, v.Type, v.Model, v.Manufacturer, v.RatePerHour, v.Status "
+            "FROM Vehicles v WHERE v.CurrentStationID = %s AND v.Status = 'available'"
+        ),
+        "params": (1,),
+        "table": "v",
+        "keys": {"idx_vehicles_station_status"},
+    },
+    {
+        "name": "vehicle_window_conflict",
+        "sql": (
+            "SELECT TripID FROM Trips WHERE VehicleID = %s AND Status IN ('Upcoming', 'Ongoing') "
+            "AND StartTime < %s AND EndTime > %s LIMIT 1"
+        ),
+        "params": (1, "2030-01-01 11:00:00", "2030-01-01 09:00:00"),
+        "table": "Trips",
+        "keys": {"idx_trips_vehicle_status_window"},
+    },
+    {
+        "name": "overdue_trips",
+        "sql": (
+            "SELECT TripID FROM Trips WHERE Status = 'Ongoing' AND EndTime < NOW() - INTERVAL 300 SECOND "
+            "AND (EndTime > %s OR (EndTime = %s AND TripID > %s)) ORDER BY EndTime, TripID LIMIT %s"
+        ),
+        "params": ("2020-01-01 00:00:00", "2020-01-01 00:00:00", 1, 200),
+        "table": "Trips",
+        "keys": {"idx_trips_status_end"},
+    },
+    {
+        "name": "expired_memberships",
+        "sql": "SELECT UserID, PlanID FROM Users WHERE PlanExpiresAt <= NOW() ORDER BY PlanExpiresAt LIMIT %s",
+        "params": (200,),
+        "table": "Users",
+        "keys": {"idx_users_plan_expiry"},
+    },
+    {
+        "name": "expired_idempotency_keys",
+        "sql": "SELECT Scope, IdemKey FROM IdempotencyKeys WHERE ExpiresAt <= NOW() ORDER BY ExpiresAt LIMIT %s",
+        "params": (1000,),
+        "table": "IdempotencyKeys",
+        "keys": {"idx_idempotency_expires"},
+    },
+    {
+        "name": "wallet_ledger_tail",
+        "sql": "SELECT COALESCE(SUM(Amount), 0) FROM WalletLedger WHERE UserID = %s AND EntryID > %s",
+        "params": (1, 0),
+        "table": "WalletLedger",
+        "keys": {"idx_wallet_ledger_user_entry"},
+    },
+    {
+        "name": "expired_wallet_holds",
+        "sql": (
+            "SELECT HoldID FROM WalletHolds WHERE Status = 'held' AND ExpiresAt <= NOW() "
+            "ORDER BY ExpiresAt LIMIT %s"
+        ),
+        "params": (200,),
+        "table": "WalletHolds",
+        "keys": {"idx_wallet_holds_status_expires"},
+    },
+    {
+        "name": "logs_by_table",
+        "sql": (
+            "SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp "
+            "FROM Logs WHERE TableName = %s ORDER BY ChangeTimestamp DESC, LogID DESC LIMIT %s"
+        ),
+        "params": ("Trips", 100),
+        "table": "Logs",
+        "keys": {"idx_logs_table_ts"},
+    },
+    {
+        "name": "logs_recent",
+        "sql": (
+            "SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp "
+            "FROM Logs ORDER BY ChangeTimestamp DESC, LogID DESC LIMIT %s"
+        ),
+        "params": (100,),
+        "table": "Logs",
+        "keys": {"idx_logs_ts"},
+    },
+    {
+        # get_logs' first window; prunes to the last LOG_SCAN_MONTHS partitions.
+        "name": "logs_recent_window",
+        "sql": (
+            "SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp "
+            "FROM Logs WHERE ChangeTimestamp >= %s ORDER BY ChangeTimestamp DESC, LogID DESC LIMIT %s"
+        ),
+        "params": ("2030-01-01 00:00:00", 100),
+        "table": "Logs",
+        "keys": {"idx_logs_ts"},
+    },
+    {
+        "name": "analytics_pending_trips",
+        "sql": "SELECT TripID FROM AnalyticsPendingTrips ORDER BY CheckedAt, TripID LIMIT %s",
+        "params": (5000,),
+        "table": "AnalyticsPendingTrips",
+        "keys": {"idx_analytics_pending_checked"},
+    },
+    {
+        "name": "station_hourly_usage",
+        "sql": (
+            "SELECT StationID, HourStart, Trips, BusySeconds FROM StationHourlyUsage "
+            "WHERE HourStart >= %s AND HourStart < %s ORDER BY HourStart, StationID LIMIT %s"
+        ),
+        "params": ("2030-01-01 00:00:00", "2030-01-02 00:00:00", 1000),
+        "table": "StationHourlyUsage",
+        "keys": {"idx_station_usage_hour"},
+    },
+]
+
+
+def connect():
+    return mysql.connector.connect(**db_config_from_env())
+
+
+def ensure_migrations_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS SchemaMigrations (
+            Version INT PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cur.close()
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT Version FROM SchemaMigrations")
+    versions = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return versions
+
+
+def upgrade(conn, target=None):
+    """Applies pending migrations up to `target` (all when None). Returns the versions applied."""
+    ensure_migrations_table(conn)
+    done = applied_versions(conn)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+        version = migration["version"]
+        if version in done or (target is not None and version > target):
+            continue
+        cur = conn.cursor()
+        for statement in migration["statements"]:
+            try:
+                if callable(statement):
+                    statement(cur)
+                else:
+                    cur.execute(statement)
+            except mysql.connector.Error as e:
+                if e.errno not in ALREADY_APPLIED:
+                    cur.close()
+                    raise
+        # DDL commits implicitly; only the bookkeeping row needs an explicit commit.
+        cur.execute(
+            "INSERT INTO SchemaMigrations (Version, Name) VALUES (%s, %s)",
+            (version, migration["name"]),
+        )
+        conn.commit()
+        cur.close()
+        applied.append(version)
+    return applied
+
+
+def explain(conn, query):
+    cur = conn.cursor(dictionary=True)
+    cur.execute("EXPLAIN " + query["sql"], query["params"])
+    plan = cur.fetchall()
+    cur.close()
+    return plan
+
+
+def check_plans(conn):
+    """Returns a list of (query name, problem) for hot queries whose plan regressed."""
+    failures = []
+    for query in HOT_QUERIES:
+        plan = explain(conn, query)
+        rows = [row for row in plan if row.get("table") == query["table"]]
+        if not rows:
+            failures.append((query["name"], f"table {query['table']} missing from plan"))
+            continue
+        for row in rows:
+            if row.get("type") == "ALL":
+                failures.append((query["name"], f"full scan on {query['table']}"))
+            elif row.get("key") not in query["keys"]:
+                failures.append((
+                    query["name"],
+                    f"uses index {row.get('key')!r}, expected one of {sorted(query['keys'])}",
+                ))
+    return failures
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "status"
+    conn = connect()
+    try:
+        if command == "upgrade":
+            applied = upgrade(conn)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date")
+        elif command == "status":
+            ensure_migrations_table(conn)
+            done = applied_versions(conn)
+            for migration in MIGRATIONS:
+                state = "applied" if migration["version"] in done else "pending"
+                print(f"{migration['version']:>4}  {migration['name']:<40} {state}")
+        elif command == "check-plans":
+            failures = check_plans(conn)
+            for name, problem in failures:
+                print(f"FAIL {name}: {problem}")
+            if failures:
+                return 1
+            print(f"OK: {len(HOT_QUERIES)} hot queries use their indexes")
+        else:
+            print(__doc__)
+            return 2
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,114 @@
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque keyset cursor for a (timestamp, id) sort position."""
+    payload = json.dumps([timestamp.isoformat(), int(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def parse_time(value, name):
+    """Parses an optional ISO-8601 query parameter (e.g. 2024-05-01 or 2024-05-01T10:30:00)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}': expected an ISO-8601 date or datetime")
+
+
+def parse_limit(value, default, maximum):
+    try:
+        limit = int(value or default)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def keyset_clause(time_column, id_column, cursor):
+    """
+    WHERE fragment selecting rows strictly after `cursor` in
+    ORDER BY time_column DESC, id_column DESC order. Written as an OR rather than
+    a row comparison so MySQL can use it as an index range.
+    """
+    timestamp, row_id = cursor
+    clause = f"({time_column} < %s OR ({time_column} = %s AND {id_column} < %s))"
+    return clause, [timestamp, timestamp, row_id]
+
+
+def next_cursor(rows, limit, time_key, id_key):
+    """Trims the look-ahead row and returns (page, cursor for the next page or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last[time_key], last[id_key])
+
+
+def history_query(user_id, status=None, since=None, until=None, cursor=None, limit=None):
+    """Ride history SELECT, newest first; limit=None returns everything, else limit + 1 rows."""
+    query = "SELECT * FROM v_UserTripHistory WHERE UserID = %s"
+    params = [user_id]
+    if status:
+        query += " AND Status = %s"
+        params.append(status)
+    if since:
+        query += " AND StartTime >= %s"
+        params.append(since)
+    if until:
+        query += " AND StartTime < %s"
+        params.append(until)
+    if cursor:
+        clause, cursor_params = keyset_clause("StartTime", "TripID", cursor)
+        query += " AND " + clause
+        params.extend(cursor_params)
+    query += " ORDER BY StartTime DESC, TripID DESC"
+    if limit is not None:
+        # One extra row says whether another page exists
+        query += " LIMIT %s"
+        params.append(limit + 1)
+    return query, tuple(params)
+
+
+def logs_query(table=None, since=None, until=None, cursor=None, limit=100):
+    """Audit log SELECT, newest first, fetching limit + 1 rows."""
+    conditions = []
+    params = []
+    if table:
+        conditions.append("TableName = %s")
+        params.append(table)
+    if since:
+        conditions.append("ChangeTimestamp >= %s")
+        params.append(since)
+    if until:
+        conditions.append("ChangeTimestamp < %s")
+        params.append(until)
+    if cursor:
+        clause, cursor_params = keyset_clause("ChangeTimestamp", "LogID", cursor)
+        conditions.append(clause)
+        params.extend(cursor_params)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    params.append(limit + 1)
+    query = f"""
+        SELECT LogID, TableName, OperationType, RecordID, ChangedBy, ChangeDescription, ChangeTimestamp
+        FROM Logs
+        {where}
+        ORDER BY ChangeTimestamp DESC, LogID DESC
+        LIMIT %s
+    """
+    return query, tuple(params)
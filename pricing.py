@@ -0,0 +1,213 @@
+"""
+Table-driven ride pricing.
+
+A ride costs
+
+    RatePerHour * hours * type multiplier * time-of-day multiplier * (1 - plan discount)
+
+rounded half-up to the cent. The vehicle's own RatePerHour is the base; the
+multipliers and discounts come from VehicleTypeRates, PricingTimeBands and
+MembershipPlans.DiscountRate and are held in memory as an immutable PriceBook.
+Triggers on those tables bump PricingVersion, and get_price_book() compares
+that one-row version at most every PRICEBOOK_CHECK seconds, reloading only
+when it moved. The time-of-day band is the one containing the ride's start.
+
+Prices are computed in exact integers: cents, seconds and thousandths.
+quote_many() prices a whole batch at once, with numpy int64 arrays when numpy
+is installed and the batch is large enough to be worth it, and a plain loop
+otherwise; both give the same cents.
+"""
+import os
+import threading
+import time
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:  # optional; quote_many falls back to a Python loop
+    numpy = None
+
+PRICEBOOK_CHECK = float(os.environ.get("PRICEBOOK_CHECK", 5))
+VECTOR_MIN_ITEMS = 32
+MAX_QUOTE_ITEMS = 500
+
+SCALE = 1000  # multipliers and discounts are stored with three decimals
+# Cents out = rate cents * seconds * type * band * keep / (3600 * SCALE ** 3)
+_DIVISOR = 3600 * SCALE ** 3
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _thousandths(value):
+    return int((Decimal(value) * SCALE).to_integral_value())
+
+
+class PriceBook:
+    """One immutable snapshot of the pricing tables."""
+
+    def __init__(self, version, discounts, type_multipliers, hourly):
+        self.version = version
+        self._discounts = discounts            # PlanID -> discount in thousandths
+        self._types = type_multipliers         # vehicle Type -> multiplier in thousandths
+        self._hourly = hourly                  # 24 multipliers in thousandths, by start hour
+
+    def discount(self, plan_id):
+        """The plan's discount as a Decimal fraction; 0 for no plan."""
+        return Decimal(self._discounts.get(plan_id, 0)).scaleb(-3)
+
+    def _factor(self, vehicle_type, hour, keep):
+        return self._types.get(vehicle_type, SCALE) * self._hourly[hour] * keep
+
+    def quote_many(self, items, start, plan_id=None):
+        """
+        Prices (rate, vehicle_type, seconds) triples for rides starting at
+        `start` under `plan_id`. Returns a list of Decimal costs, in order.
+        """
+        if not items:
+            return []
+        keep = SCALE - self._discounts.get(plan_id, 0)
+        hour = start.hour
+        rates = [int((Decimal(rate) * 100).to_integral_value()) for rate, _, _ in items]
+        seconds = [int(secs) for _, _, secs in items]
+        factors = [self._factor(vehicle_type, hour, keep) for _, vehicle_type, _ in items]
+
+        if (numpy is not None and len(items) >= VECTOR_MIN_ITEMS
+                and max(rates) * max(seconds) * max(factors) + _DIVISOR <= _INT64_MAX):
+            product = (numpy.array(rates, dtype=numpy.int64) * numpy.array(seconds, dtype=numpy.int64)
+                       * numpy.array(factors, dtype=numpy.int64))
+            cents = ((product + _DIVISOR // 2) // _DIVISOR).tolist()
+        else:
+            cents = [(r * s * f + _DIVISOR // 2) // _DIVISOR for r, s, f in zip(rates, seconds, factors)]
+        return [Decimal(c).scaleb(-2) for c in cents]
+
+    def price(self, rate, vehicle_type, seconds, start, plan_id=None):
+        """The cost of one ride; see quote_many."""
+        return self.quote_many([(rate, vehicle_type, seconds)], start, plan_id)[0]
+
+    def stats(self):
+        return {"version": self.version, "plans": len(self._discounts), "vehicle_types": len(self._types)}
+
+
+def _current_version(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT Version FROM PricingVersion WHERE ID = 1")
+        row = cur.fetchone()
+        conn.commit()  # don't leave a snapshot open on a pooled connection
+        return row[0] if row else 0
+    finally:
+        cur.close()
+
+
+def _load(conn):
+    cur = conn.cursor()
+    try:
+        # Read the version first: a change that lands mid-load bumps it again and is picked up next check.
+        cur.execute("SELECT Version FROM PricingVersion WHERE ID = 1")
+        row = cur.fetchone()
+        version = row[0] if row else 0
+        cur.execute("SELECT PlanID, DiscountRate FROM MembershipPlans")
+        discounts = {plan_id: _thousandths(rate) for plan_id, rate in cur.fetchall()}
+        cur.execute("SELECT Type, RateMultiplier FROM VehicleTypeRates")
+        types = {vehicle_type: _thousandths(m) for vehicle_type, m in cur.fetchall()}
+        cur.execute("SELECT StartHour, EndHour, Multiplier FROM PricingTimeBands ORDER BY BandID")
+        hourly = [SCALE] * 24
+        for start_hour, end_hour, multiplier in cur.fetchall():
+            # [StartHour, EndHour), wrapping past midnight when EndHour <= StartHour; later bands win.
+            span = (end_hour - start_hour) % 24 or 24
+            for offset in range(span):
+                hourly[(start_hour + offset) % 24] = _thousandths(multiplier)
+        conn.commit()
+    finally:
+        cur.close()
+    return PriceBook(version, discounts, types, hourly)
+
+
+class PriceBookCache:
+    def __init__(self):
+        self._book = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, conn):
+        book = self._book
+        if book is not None and time.monotonic() - self._checked_at < PRICEBOOK_CHECK:
+            return book
+        with self._lock:
+            if self._book is None:
+                self._book = _load(conn)
+            elif time.monotonic() - self._checked_at >= PRICEBOOK_CHECK:
+                if _current_version(conn) != self._book.version:
+                    self._book = _load(conn)
+            else:
+                return self._book  # another thread just checked
+            self._checked_at = time.monotonic()
+            return self._book
+
+    def invalidate(self):
+        """Reloads on the next use, e.g. right after this process changed a pricing table."""
+        with self._lock:
+            self._book = None
+
+    def stats(self):
+        book = self._book
+        return book.stats() if book is not None else {"loaded": False}
+
+
+price_book = PriceBookCache()
+
+
+def get_price_book(conn):
+    return price_book.get(conn)
+
+
+def quote_station(conn, station_id, seconds, start, plan_id=None):
+    """Prices every available vehicle at the station for a ride of `seconds` starting at `start`."""
+    book = get_price_book(conn)
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT VehicleID, Type, Model, Manufacturer, RatePerHour
+            FROM Vehicles
+            WHERE CurrentStationID = %s AND Status = 'available'
+            ORDER BY VehicleID
+        """, (station_id,))
+        vehicles = cur.fetchall()
+    finally:
+        cur.close()
+    costs = book.quote_many([(v["RatePerHour"], v["Type"], seconds) for v in vehicles], start, plan_id)
+    for vehicle, cost in zip(vehicles, costs):
+        vehicle["Cost"] = cost
+    return vehicles
+
+
+def quote_vehicles(conn, items, start, plan_id=None):
+    """
+    Prices (vehicle_id, seconds) pairs with one vehicle lookup. Unknown
+    vehicles come back with Cost None.
+    """
+    book = get_price_book(conn)
+    ids = sorted({vehicle_id for vehicle_id, _ in items})
+    vehicles = {}
+    if ids:
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT VehicleID, Type, Model, Manufacturer, RatePerHour, Status
+                FROM Vehicles
+                WHERE VehicleID IN ({', '.join(['%s'] * len(ids))})
+            """, tuple(ids))
+            vehicles = {row["VehicleID"]: row for row in cur.fetchall()}
+        finally:
+            cur.close()
+    known = [(vehicle_id, seconds) for vehicle_id, seconds in items if vehicle_id in vehicles]
+    costs = iter(book.quote_many(
+        [(vehicles[vid]["RatePerHour"], vehicles[vid]["Type"], seconds) for vid, seconds in known],
+        start, plan_id))
+    quotes = []
+    for vehicle_id, seconds in items:
+        vehicle = vehicles.get(vehicle_id)
+        quote = dict(vehicle) if vehicle else {"VehicleID": vehicle_id}
+        quote["DurationSeconds"] = seconds
+        quote["Cost"] = next(costs) if vehicle else None
+        quotes.append(quote)
+    return quotes
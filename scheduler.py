@@ -0,0 +1,459 @@
+"""
+In-process background jobs.
+
+Every server worker runs a Scheduler, started by start_scheduler() from the
+server's hooks rather than on import, but only the one holding the MySQL named
+lock SCHEDULER_LOCK (GET_LOCK on a dedicated connection) runs jobs, so a
+gunicorn deployment gets one of each sweep at a time. If the leader dies its
+session ends, the lock is released, and another worker takes over within
+LEADER_CHECK seconds.
+
+Due jobs are handed to a small thread pool; a job never overlaps itself. Each
+run checks out one pooled connection, works through bounded batches found by
+indexed queries, and reports its duration, outcome and row count to metrics.
+Jobs only change rows with conditional updates, so a run that overlaps a
+leadership hand-over does no harm.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import mysql.connector
+
+import analytics
+import audit
+import db
+import events
+import idempotency
+import logstore
+import metrics
+import pricing
+import sessions
+import wallet
+from cache import catalog_cache, STATIONS, VEHICLES, FLEET_COUNTS
+
+log = logging.getLogger(__name__)
+
+SCHEDULER_LOCK = os.environ.get("SCHEDULER_LOCK", "ev_rental_scheduler")
+WORKERS = int(os.environ.get("SCHEDULER_WORKERS", 2))
+BATCH_SIZE = int(os.environ.get("SCHEDULER_BATCH_SIZE", 200))
+MAX_BATCHES = int(os.environ.get("SCHEDULER_MAX_BATCHES", 5))
+TICK = 1.0
+LEADER_CHECK = 5.0
+
+OVERDUE_GRACE = int(os.environ.get("OVERDUE_GRACE_SECONDS", 300))
+OVERDUE_BLOCK = int(os.environ.get("OVERDUE_BLOCK_MINUTES", 30)) * 60
+
+# (EndTime, TripID) the overdue sweep has reached; None to start from the oldest
+_overdue_after = None
+
+
+class Job:
+    def __init__(self, name, interval, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = time.monotonic()
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_items = None
+        self.last_duration = None
+        self.last_error = None
+
+
+class Scheduler:
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self.jobs = {}
+        self.is_leader = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._lock_conn = None
+        self._leader_checked = 0.0
+
+    def register(self, name, interval, fn):
+        """Adds a job: fn(conn) runs every `interval` seconds and returns the number of rows it handled."""
+        with self._lock:
+            self.jobs[name] = Job(name, interval, fn)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduler-job")
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=TICK * 2)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._release_leadership()
+
+    # -- leadership --------------------------------------------------------
+
+    def _check_leadership(self):
+        now = time.monotonic()
+        if now - self._leader_checked < LEADER_CHECK:
+            return self.is_leader
+        self._leader_checked = now
+        try:
+            if self._lock_conn is None or not self._lock_conn.is_connected():
+                # A connection of its own: the lock lives as long as this session.
+                self._lock_conn = mysql.connector.connect(**db.pool.config)
+                self.is_leader = False
+            cur = self._lock_conn.cursor()
+            if self.is_leader:
+                cur.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (SCHEDULER_LOCK,))
+            else:
+                cur.execute("SELECT GET_LOCK(%s, 0)", (SCHEDULER_LOCK,))
+            self.is_leader = bool(cur.fetchone()[0])
+            cur.close()
+        except mysql.connector.Error:
+            log.warning("scheduler lock connection failed", exc_info=True)
+            self.is_leader = False
+            self._close_lock_conn()
+        return self.is_leader
+
+    def _release_leadership(self):
+        if self._lock_conn is not None and self.is_leader:
+            try:
+                cur = self._lock_conn.cursor()
+                cur.execute("SELECT RELEASE_LOCK(%s)", (SCHEDULER_LOCK,))
+                cur.fetchall()
+                cur.close()
+            except mysql.connector.Error:
+                pass
+        self.is_leader = False
+        self._close_lock_conn()
+
+    def _close_lock_conn(self):
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()
+            except Exception:
+                pass
+            self._lock_conn = None
+
+    # -- running -----------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.wait(TICK):
+            if not self._check_leadership():
+                continue
+            now = time.monotonic()
+            with self._lock:
+                due = [job for job in self.jobs.values() if not job.running and job.next_run <= now]
+                for job in due:
+                    job.running = True
+            for job in due:
+                self._executor.submit(self._execute, job)
+
+    def _execute(self, job):
+        started = time.perf_counter()
+        items = 0
+        error = None
+        try:
+            with db.pool.connection() as conn:
+                items = job.fn(conn) or 0
+        except Exception as e:
+            error = e
+            log.exception("job %s failed", job.name)
+        elapsed = time.perf_counter() - started
+        metrics.JOB_DURATION.observe((job.name,), elapsed)
+        metrics.JOB_RUNS.inc((job.name, "error" if error else "ok"))
+        if items:
+            metrics.JOB_ITEMS.inc((job.name,), items)
+        with self._lock:
+            job.running = False
+            job.next_run = time.monotonic() + job.interval
+            job.runs += 1
+            job.failures += error is not None
+            job.last_items = items
+            job.last_duration = round(elapsed, 4)
+            job.last_error = str(error) if error else None
+
+    def run_now(self, name):
+        """Runs one job synchronously in the calling thread (e.g. from a shell); bypasses leadership."""
+        job = self.jobs[name]
+        with self._lock:
+            if job.running:
+                raise RuntimeError(f"job {name} is already running")
+            job.running = True
+        self._execute(job)
+        return job.last_items
+
+    def stats(self):
+        with self._lock:
+            return {
+                "leader": self.is_leader,
+                "jobs": {
+                    job.name: {
+                        "interval": job.interval,
+                        "runs": job.runs,
+                        "failures": job.failures,
+                        "running": job.running,
+                        "last_items": job.last_items,
+                        "last_duration": job.last_duration,
+                        "last_error": job.last_error,
+                    }
+                    for job in self.jobs.values()
+                },
+            }
+
+
+scheduler = Scheduler()
+
+
+def _batches(fn):
+    """Repeats a batch function while it keeps returning full batches, up to MAX_BATCHES."""
+    def run(conn):
+        total = 0
+        for _ in range(MAX_BATCHES):
+            done, full = fn(conn)
+            total += done
+            if not full:
+                break
+        return total
+    return run
+
+
+# -- jobs -------------------------------------------------------------------
+
+def settle_overdue_trips(conn):
+    """
+    Bills Ongoing trips that ran past EndTime (plus a grace period). The
+    overrun is rounded up to whole OVERDUE_BLOCK blocks, EndTime moves forward
+    by that much and the wallet is charged for the extension at the current
+    price book (priced from the old EndTime), so a ride that keeps going is
+    billed again on a later sweep. The charge goes through a wallet hold like
+    a booking, so the wallet never goes negative. A trip the wallet cannot
+    cover is left as it is and billed, for the whole overrun, on a later sweep
+    once there is money; trips of users with nothing available are skipped.
+
+    Batches page on (EndTime, TripID) from where the previous batch, or run,
+    stopped and wrap around after the newest, so trips left unbilled cannot
+    keep the ones behind them from ever being reached.
+    """
+    global _overdue_after
+    query = """
+        SELECT t.TripID, t.UserID, t.EndTime, v.RatePerHour, v.Type, u.PlanID, NOW()
+        FROM Trips t
+        JOIN Vehicles v ON v.VehicleID = t.VehicleID
+        JOIN Users u ON u.UserID = t.UserID
+        JOIN WalletAccounts wa ON wa.UserID = t.UserID
+        WHERE t.Status = 'Ongoing' AND t.EndTime < NOW() - INTERVAL %s SECOND AND wa.Available > 0
+    """
+    params = [OVERDUE_GRACE]
+    if _overdue_after is not None:
+        query += " AND (t.EndTime > %s OR (t.EndTime = %s AND t.TripID > %s))"
+        params += [_overdue_after[0], _overdue_after[0], _overdue_after[1]]
+    query += " ORDER BY t.EndTime, t.TripID LIMIT %s"
+    params.append(BATCH_SIZE)
+    cur = conn.cursor()
+    try:
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+        full = len(rows) == BATCH_SIZE
+        _overdue_after = (rows[-1][2], rows[-1][0]) if full else None
+        conn.commit()
+        book = pricing.get_price_book(conn)
+        settled = 0
+        for trip_id, user_id, end_time, rate, vehicle_type, plan_id, now in rows:
+            overrun = (now - end_time).total_seconds()
+            blocks = int(-(-overrun // OVERDUE_BLOCK))
+            extra = timedelta(seconds=blocks * OVERDUE_BLOCK)
+            charge = book.price(rate, vehicle_type, blocks * OVERDUE_BLOCK, end_time, plan_id)
+            try:
+                hold = wallet.reserve(conn, user_id, charge)
+            except wallet.InsufficientFunds:
+                log.info("overdue TripID=%s: wallet cannot cover %s yet", trip_id, charge)
+                continue
+            try:
+                cur.execute("""
+                    UPDATE Trips SET EndTime = %s, Cost = Cost + %s
+                    WHERE TripID = %s AND Status = 'Ongoing' AND EndTime = %s
+                """, (end_time + extra, charge, trip_id, end_time))
+                if cur.rowcount != 1:
+                    # Ended, cancelled or billed by someone else meanwhile
+                    conn.rollback()
+                    wallet.release(conn, hold)
+                    continue
+                wallet.capture(cur, hold, charge, wallet.OVERDUE, trip_id)
+                cur.execute(
+                    "INSERT INTO Payments (TripID, UserID, Amount, Status) VALUES (%s, %s, %s, 'Success')",
+                    (trip_id, user_id, charge),
+                )
+                payment_id = cur.lastrowid
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                wallet.release(conn, hold)
+                raise
+            sessions.invalidate(user_id)
+            settled += 1
+            audit.emit('Trips', 'UPDATE', trip_id, f"Overdue trip extended to {end_time + extra}, charged {charge}")
+            audit.emit('Users', 'UPDATE', user_id, f"Wallet charged {charge} for overdue TripID={trip_id}")
+            audit.emit('Payments', 'INSERT', payment_id,
+                       f"Payment created: Amount={charge}, Status=Success, UserID={user_id}")
+        return settled, full
+    finally:
+        cur.close()
+
+
+def expire_memberships(conn):
+    """Drops the plan (and so the discount) of users whose PlanExpiresAt has passed."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT UserID, PlanID FROM Users
+            WHERE PlanExpiresAt <= NOW()
+            ORDER BY PlanExpiresAt
+            LIMIT %s
+        """, (BATCH_SIZE,))
+        rows = cur.fetchall()
+        if not rows:
+            conn.commit()
+            return 0, False
+        cur.execute(f"""
+            UPDATE Users SET PlanID = NULL, PlanExpiresAt = NULL
+            WHERE UserID IN ({', '.join(['%s'] * len(rows))}) AND PlanExpiresAt <= NOW()
+        """, tuple(user_id for user_id, _ in rows))
+        expired = cur.rowcount
+        conn.commit()
+        sessions.invalidate(*(user_id for user_id, _ in rows))
+        for user_id, plan_id in rows:
+            audit.emit('Users', 'UPDATE', user_id, f"Membership PlanID={plan_id} expired")
+        return expired, len(rows) == BATCH_SIZE
+    finally:
+        cur.close()
+
+
+def activate_reservations(conn):
+    """
+    Starts Upcoming trips whose StartTime has come: the vehicle is claimed and
+    the trip becomes Ongoing from wherever the vehicle now is. A vehicle that
+    is still out is retried on the next run. Reservations whose whole window
+    passed without the vehicle becoming free are cancelled and refunded.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT TripID, VehicleID, UserID, EndTime <= NOW()
+            FROM Trips
+            WHERE Status = 'Upcoming' AND StartTime <= NOW()
+            ORDER BY StartTime
+            LIMIT %s
+        """, (BATCH_SIZE,))
+        rows = cur.fetchall()
+        conn.commit()
+        handled = 0
+        for trip_id, vehicle_id, user_id, missed in rows:
+            if missed:
+                cur.execute("SELECT PaymentID FROM Payments WHERE TripID = %s", (trip_id,))
+                payment_ids = [payment_id for (payment_id,) in cur.fetchall()]
+                cur.callproc("sp_CancelTrip", (trip_id,))
+                for result in cur.stored_results():
+                    result.fetchall()
+                conn.commit()
+                sessions.invalidate(user_id)
+                audit.emit('Trips', 'UPDATE', trip_id, "Reservation expired; trip updated to Status=Cancelled")
+                audit.emit('Users', 'UPDATE', user_id, f"Wallet refunded for TripID={trip_id}")
+                for payment_id in payment_ids:
+                    audit.emit('Payments', 'UPDATE', payment_id, f"Payment for TripID={trip_id} changed to Refunded")
+                handled += 1
+                continue
+            # Same lock order as bookings: the vehicle first, then the trip.
+            cur.execute(
+                "UPDATE Vehicles SET Status = 'in-use' WHERE VehicleID = %s AND Status = 'available'",
+                (vehicle_id,),
+            )
+            if cur.rowcount != 1:
+                conn.rollback()
+                continue
+            cur.execute("""
+                UPDATE Trips t
+                JOIN Vehicles v ON v.VehicleID = t.VehicleID
+                SET t.Status = 'Ongoing', t.StartStationID = v.CurrentStationID
+                WHERE t.TripID = %s AND t.Status = 'Upcoming'
+            """, (trip_id,))
+            if cur.rowcount != 1:
+                conn.rollback()
+                continue
+            conn.commit()
+            events.publish_vehicles(conn, [vehicle_id])
+            audit.emit('Trips', 'UPDATE', trip_id, "Trip updated from Status=Upcoming to Ongoing")
+            audit.emit('Vehicles', 'UPDATE', vehicle_id, "Vehicle status changed from available to in-use")
+            handled += 1
+        if handled:
+            catalog_cache.invalidate(STATIONS, VEHICLES, FLEET_COUNTS)
+        return handled, len(rows) == BATCH_SIZE
+    finally:
+        cur.close()
+
+
+def reconcile_station_availability(conn):
+    """
+    Recounts StationAvailability from Vehicles (sp_ReconcileStationAvailability
+    with fix on) and logs every station whose counter had drifted. Returns the
+    number of stations corrected, which the job metrics count.
+    """
+    cur = conn.cursor()
+    try:
+        cur.callproc("sp_ReconcileStationAvailability", (True,))
+        drift = [row for result in cur.stored_results() for row in result.fetchall()]
+        conn.commit()
+    finally:
+        cur.close()
+    for station_id, recorded, actual in drift:
+        log.warning("StationAvailability drift at StationID=%s: recorded %s, actual %s; corrected",
+                    station_id, recorded, actual)
+    if drift:
+        catalog_cache.invalidate(STATIONS, FLEET_COUNTS)
+    return len(drift)
+
+
+def init_scheduler(app):
+    scheduler.register("settle_overdue_trips", float(os.environ.get("OVERDUE_SWEEP_INTERVAL", 60)),
+                       _batches(settle_overdue_trips))
+    scheduler.register("expire_memberships", float(os.environ.get("MEMBERSHIP_SWEEP_INTERVAL", 300)),
+                       _batches(expire_memberships))
+    scheduler.register("activate_reservations", float(os.environ.get("RESERVATION_SWEEP_INTERVAL", 30)),
+                       _batches(activate_reservations))
+    scheduler.register("purge_idempotency_keys", float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", 600)),
+                       _batches(idempotency.purge_expired))
+    scheduler.register("reconcile_station_availability",
+                       float(os.environ.get("AVAILABILITY_RECONCILE_INTERVAL", 900)),
+                       reconcile_station_availability)
+    scheduler.register("expire_wallet_holds", float(os.environ.get("WALLET_HOLD_SWEEP_INTERVAL", 30)),
+                       _batches(wallet.expire_holds))
+    scheduler.register("snapshot_wallets", float(os.environ.get("WALLET_SNAPSHOT_INTERVAL", 60)),
+                       _batches(wallet.snapshot))
+    scheduler.register("reconcile_wallets", float(os.environ.get("WALLET_RECONCILE_INTERVAL", 300)),
+                       wallet.reconcile)
+    scheduler.register("maintain_log_partitions", float(os.environ.get("LOG_PARTITION_INTERVAL", 3600)),
+                       _batches(logstore.maintain))
+    scheduler.register("refresh_analytics", float(os.environ.get("ANALYTICS_INTERVAL", 300)),
+                       _batches(analytics.refresh))
+
+
+def start_scheduler():
+    """
+    Starts this process's scheduler unless SCHEDULER_ENABLED is false. Called
+    by the servers (gunicorn.conf.py, asgi's lifespan, `python app.py`), never
+    on import, so scripts that import app do not run jobs.
+    """
+    if os.environ.get("SCHEDULER_ENABLED", "true").lower() in ("0", "false", "no", "off"):
+        return
+    scheduler.start()
+
+
+def scheduler_stats():
+    return scheduler.stats()
@@ -0,0 +1,180 @@
+"""
+Session tokens and the cached user context.
+
+Login issues a signed token (itsdangerous, which ships with Flask) carrying the
+UserID and a tag of the password hash. Clients send it back as
+`Authorization: Bearer <token>`. Each request's token is checked against the
+user's context: the profile row, plan name, PlanDiscount and WalletBalance,
+held in an in-process TTLCache. So an authenticated request, the profile
+endpoint and login itself do not join Users and MembershipPlans again until
+the entry expires or is invalidated.
+
+- Routes that change what the context holds (profile edits, top-ups,
+  membership purchases, bookings, cancellations, and the wallet and
+  membership jobs) call invalidate(). Invalidation is per process, so
+  another worker may serve a context up to SESSION_CACHE_TTL seconds old
+  (default 60).
+- A password change changes the tag, so tokens issued before it stop working
+  once the context is reloaded.
+- Tokens are signed with SESSION_SECRET. Set the same value on every worker.
+  Without one, a random per-process secret is used and logged as a warning.
+- Requests without a token still work. user_id() and user_role() fall back
+  to the values the request names, as before.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+import db
+import pricing
+import wallet
+from cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+TOKEN_TTL = int(os.environ.get("SESSION_TTL", 12 * 3600))
+SALT = "ev-rental-session"
+
+contexts = TTLCache(
+    maxsize=int(os.environ.get("SESSION_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("SESSION_CACHE_TTL", 60)),
+)
+
+_serializer = None
+
+_lock = threading.Lock()
+_stats = {"issued": 0, "authenticated": 0, "expired": 0, "invalid": 0}
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+class _Context:
+    __slots__ = ("tag", "user")
+
+    def __init__(self, tag, user):
+        self.tag = tag
+        self.user = user
+
+
+def _tag(password_hash):
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+def _load(user_id):
+    conn = db.get_db()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT
+                u.UserID, u.Name, u.Email, u.JoinDate, u.Password, u.Role,
+                u.PlanID, u.PlanExpiresAt,
+                mp.PlanName
+            FROM Users u
+            LEFT JOIN MembershipPlans mp ON u.PlanID = mp.PlanID
+            WHERE u.UserID = %s
+        """, (user_id,))
+        user = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+    if user is None:
+        return None
+    tag = _tag(user.pop('Password'))
+    user['PlanDiscount'] = pricing.get_price_book(conn).discount(user['PlanID'])
+    user['WalletBalance'] = wallet.available(conn, user_id)
+    return _Context(tag, user)
+
+
+def _cached(user_id):
+    return contexts.get_or_load(int(user_id), lambda: _load(int(user_id)))
+
+
+def context(user_id):
+    """The user's profile context (a fresh dict), or None for an unknown user."""
+    cached = _cached(user_id)
+    return dict(cached.user) if cached is not None else None
+
+
+def invalidate(*user_ids):
+    contexts.invalidate(*(int(user_id) for user_id in user_ids if user_id is not None))
+
+
+def issue(user_id, password_hash):
+    _count("issued")
+    return _serializer.dumps({"uid": int(user_id), "tag": _tag(password_hash)})
+
+
+def _unauthorized(message):
+    return jsonify({"error": message}), 401
+
+
+def resolve(header):
+    """
+    Resolves an Authorization header into (user context, error message).
+    Both are None when the header carries no bearer token.
+    """
+    if not header.startswith("Bearer "):
+        return None, None
+    try:
+        payload = _serializer.loads(header[len("Bearer "):].strip(), max_age=TOKEN_TTL)
+    except SignatureExpired:
+        _count("expired")
+        return None, "Session expired, please log in again"
+    except BadSignature:
+        _count("invalid")
+        return None, "Invalid session token"
+    cached = _cached(payload["uid"])
+    if cached is None or cached.tag != payload.get("tag"):
+        _count("invalid")
+        return None, "Invalid session token"
+    _count("authenticated")
+    return cached.user, None
+
+
+def _authenticate():
+    """before_request: resolves a bearer token into g.session_user."""
+    g.session_user, error = resolve(request.headers.get("Authorization", ""))
+    if error:
+        return _unauthorized(error)
+    return None
+
+
+def current_user():
+    """The authenticated user's context (do not modify it), or None."""
+    return g.get("session_user")
+
+
+def user_id(fallback=None):
+    """The session's UserID, else `fallback` (the user_id the request names)."""
+    user = current_user()
+    return user['UserID'] if user is not None else fallback
+
+
+def user_role(fallback='user'):
+    """The session's Role, else `fallback` (the user_role the request names)."""
+    user = current_user()
+    return user['Role'] if user is not None else fallback
+
+
+def init_sessions(app):
+    global _serializer
+    secret = os.environ.get("SESSION_SECRET") or app.secret_key
+    if not secret:
+        log.warning("SESSION_SECRET is not set; session tokens are only valid in this process")
+        secret = os.urandom(32).hex()
+    _serializer = URLSafeTimedSerializer(secret, salt=SALT)
+    app.before_request(_authenticate)
+
+
+def session_stats():
+    with _lock:
+        data = dict(_stats)
+    data["cache"] = contexts.stats()
+    return data
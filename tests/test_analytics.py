@@ -0,0 +1,46 @@
+"""analytics' columnar helpers, and parity of their numpy and Python paths."""
+import random
+
+import pytest
+
+import analytics
+from analytics import HOUR, group_sums, split_hours
+
+
+@pytest.fixture
+def python_only(monkeypatch):
+    monkeypatch.setattr(analytics, "numpy", None)
+
+
+def test_group_sums(python_only):
+    keys = [["a", "b", "a", "a"], [1, 1, 1, 2]]
+    values = [[10, 20, 30, 40], [1, 1, 1, 1]]
+    assert group_sums(keys, values) == {("a", 1): [40, 2], ("b", 1): [20, 1], ("a", 2): [40, 1]}
+    assert group_sums([[]], [[]]) == {}
+
+
+def test_split_hours(python_only):
+    rows, hours, seconds = split_hours([HOUR - 600, 5 * HOUR, 7 * HOUR + 10], [HOUR + 300, 5 * HOUR, 7 * HOUR])
+    assert rows == [0, 0, 1, 2]
+    assert hours == [0, 1, 5, 7]
+    assert seconds == [600, 300, 0, 0]  # empty and inverted ranges still count their start hour
+
+
+def random_columns(count, seed=3):
+    rng = random.Random(seed)
+    starts = [rng.randint(0, 400 * HOUR) for _ in range(count)]
+    ends = [start + rng.choice([0, 59, 3600, rng.randint(1, 6 * HOUR), -5]) for start in starts]
+    stations = [rng.randint(1, 9) for _ in range(count)]
+    days = [start // 86400 for start in starts]
+    cents = [rng.randint(0, 10 ** 7) for _ in range(count)]
+    return starts, ends, stations, days, cents
+
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    starts, ends, stations, days, cents = random_columns(analytics.VECTOR_MIN_ROWS * 20)
+    vector_split = split_hours(starts, ends)
+    vector_sums = group_sums([stations, days], [cents, [1] * len(cents)])
+    monkeypatch.setattr(analytics, "numpy", None)
+    assert split_hours(starts, ends) == vector_split
+    assert group_sums([stations, days], [cents, [1] * len(cents)]) == vector_sums
@@ -0,0 +1,64 @@
+"""Bulk onboarding row validation and id lookup."""
+from decimal import Decimal
+
+import bulk
+
+
+def test_valid_rows_become_insert_parameters():
+    params, errors = bulk.validate("vehicles", [
+        {"registration_number": " KA-01-1 ", "type": "Scooter", "model": "iQube", "manufacturer": "TVS",
+         "rate_per_hour": "50.456", "station_id": "3"},
+        {"registration_number": "KA-01-2", "type": "Car", "model": "Nexon", "manufacturer": "Tata",
+         "rate_per_hour": 120, "station_id": ""},
+    ])
+    assert errors == []
+    assert params == [
+        ("KA-01-1", "Scooter", "iQube", "TVS", Decimal("50.46"), 3),
+        ("KA-01-2", "Car", "Nexon", "Tata", Decimal("120.00"), None),
+    ]
+
+
+def test_every_bad_row_is_reported():
+    params, errors = bulk.validate("stations", [
+        {"name": "A", "location": "X", "capacity": "0"},
+        "not an object",
+        {"name": "", "location": "X", "capacity": 5, "latitude": 95},
+        {"name": "B", "location": "Y", "capacity": 5, "latitude": "12.9", "longitude": "77.6"},
+    ])
+    assert params == [("B", "Y", 5, 12.9, 77.6)]
+    assert [e["row"] for e in errors] == [0, 1, 2]
+    assert "capacity must be positive" in errors[0]["error"]
+    assert "name is required" in errors[2]["error"]
+    assert "latitude must be between -90 and 90" in errors[2]["error"]
+
+
+def test_duplicate_unique_field_is_rejected_case_insensitively():
+    _, errors = bulk.validate("stations", [
+        {"name": "Central", "location": "X", "capacity": 5},
+        {"name": "central ", "location": "Y", "capacity": 5},
+    ])
+    assert errors == [{"row": 1, "error": "name duplicates row 0"}]
+
+
+def test_technicians_have_no_unique_field():
+    params, errors = bulk.validate("technicians", [{"name": "Ravi", "specialization": "EV"}] * 2)
+    assert errors == [] and len(params) == 2
+
+
+class LookupCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params):
+        self.query, self.params = query, params
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_chunk_ids_are_matched_by_key_not_position():
+    # Ids with a gap, and two rows sharing a key
+    cur = LookupCursor([(10, "Ravi", "EV"), (13, "Asha", "Body"), (17, "Ravi", "EV")])
+    chunk = [("Ravi", "EV"), ("Asha", "Body"), ("Ravi", "EV")]
+    assert bulk._chunk_ids(cur, "technicians", chunk, 10) == [10, 13, 17]
+    assert cur.params[0] == 10
@@ -0,0 +1,103 @@
+"""TTLCache expiry, LRU eviction and invalidation of in-flight loads."""
+import threading
+
+import cache
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock.monotonic)
+    c = TTLCache(maxsize=4, ttl=10)
+    c.set("a", 1)
+    clock.now += 9
+    assert c.get("a") == 1
+    clock.now += 2
+    assert c.get("a") is None
+    assert c.stats()["size"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == (1, 3)
+    assert c.stats()["evictions"] == 1
+
+
+def test_get_or_load_caches_the_loaded_value():
+    c = TTLCache()
+    calls = []
+    assert c.get_or_load("k", lambda: calls.append(1) or "v") == "v"
+    assert c.get_or_load("k", lambda: calls.append(1) or "w") == "v"
+    assert len(calls) == 1
+
+
+def test_invalidate_drops_the_entry():
+    c = TTLCache()
+    c.set("k", 1)
+    c.invalidate("k", "missing")
+    assert c.get("k") is None
+    assert c.stats()["invalidations"] == 1
+
+
+def test_load_racing_an_invalidate_is_not_cached():
+    c = TTLCache()
+
+    def loader():
+        c.invalidate("k")  # a write lands while the old value is being read
+        return "old"
+
+    assert c.get_or_load("k", loader) == "old"
+    assert c.get("k") is None
+    assert c.stats()["stale_loads"] == 1
+    assert c.get_or_load("k", lambda: "new") == "new"
+    assert c.get("k") == "new"
+
+
+def test_load_racing_a_clear_is_not_cached():
+    c = TTLCache()
+
+    def loader():
+        c.clear()
+        return "old"
+
+    c.get_or_load("k", loader)
+    assert c.get("k") is None
+
+
+def test_concurrent_misses_share_one_load():
+    c = TTLCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "v"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(c.get_or_load("k", loader)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(c.get_or_load("k", loader)))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert results == ["v", "v"]
+    assert len(calls) == 1
+    assert not c._loads  # load bookkeeping is dropped once nobody waits on it
@@ -0,0 +1,62 @@
+"""GridIndex nearest-neighbour search against a brute-force ranking."""
+import random
+
+import pytest
+
+from geo import GridIndex, haversine_km, parse_coordinates
+
+
+def brute_force(points, lat, lon, k, max_km=None):
+    ranked = sorted((haversine_km(lat, lon, plat, plon), key) for key, (plat, plon) in points.items())
+    if max_km is not None:
+        ranked = [item for item in ranked if item[0] <= max_km]
+    return [key for _, key in ranked[:k]]
+
+
+@pytest.fixture
+def city():
+    rng = random.Random(7)
+    points = {i: (12.85 + rng.random() * 0.25, 77.45 + rng.random() * 0.30) for i in range(500)}
+    index = GridIndex()
+    for key, (lat, lon) in points.items():
+        index.add(key, lat, lon)
+    return index, points
+
+
+@pytest.mark.parametrize("lat, lon", [(12.97, 77.59), (12.85, 77.45), (13.2, 77.9), (12.0, 76.0)])
+@pytest.mark.parametrize("k", [1, 5, 25])
+def test_nearest_matches_brute_force(city, lat, lon, k):
+    index, points = city
+    found = index.nearest(lat, lon, k)
+    assert [key for _, key in found] == brute_force(points, lat, lon, k)
+    assert [d for d, _ in found] == sorted(d for d, _ in found)
+
+
+def test_max_km_limits_results(city):
+    index, points = city
+    found = index.nearest(12.97, 77.59, 50, max_km=2.0)
+    assert [key for _, key in found] == brute_force(points, 12.97, 77.59, 50, max_km=2.0)
+    assert all(d <= 2.0 for d, _ in found)
+
+
+def test_remove_and_move():
+    index = GridIndex()
+    index.add("a", 12.97, 77.59)
+    index.add("b", 12.98, 77.60)
+    index.remove("a")
+    assert [key for _, key in index.nearest(12.97, 77.59, 5)] == ["b"]
+    index.add("b", 10.0, 70.0)  # re-adding moves the point
+    assert len(index) == 1
+    assert index.nearest(10.0, 70.0, 1)[0][0] < 0.01
+    assert GridIndex().nearest(0, 0, 3) == []
+
+
+def test_haversine_known_distance():
+    # Bengaluru to Chennai, about 290 km
+    assert 285 < haversine_km(12.9716, 77.5946, 13.0827, 80.2707) < 295
+
+
+@pytest.mark.parametrize("lat, lon", [("x", 1), (91, 0), (0, -181), (None, 0)])
+def test_parse_coordinates_rejects_bad_input(lat, lon):
+    with pytest.raises(ValueError):
+        parse_coordinates(lat, lon)
@@ -0,0 +1,37 @@
+"""Prometheus text rendering of the in-process counters and histograms."""
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("mysql.connector")
+
+from metrics import Counter, Histogram  # noqa: E402
+
+
+def test_counter_renders_mixed_label_types():
+    counter = Counter("errors_total", "Errors", ("kind", "code"))
+    counter.inc(("sql", 1062))
+    counter.inc(("sql", "OperationalError"))
+    counter.inc(("sql", 1062))
+    lines = counter.render()
+    assert lines[:2] == ["# HELP errors_total Errors", "# TYPE errors_total counter"]
+    assert 'errors_total{kind="sql",code="1062"} 2' in lines
+    assert 'errors_total{kind="sql",code="OperationalError"} 1' in lines
+
+
+def test_label_values_are_escaped():
+    counter = Counter("c", "C", ("path",))
+    counter.inc(('a"b\\c',))
+    assert counter.render()[-1] == 'c{path="a\\"b\\\\c"} 1'
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("/a",), value)
+    histogram.observe((404,), 0.05)
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert 'latency_seconds_count{route="404"} 1' in lines
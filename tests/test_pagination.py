@@ -0,0 +1,46 @@
+"""Keyset cursors: round trip, rejection of tampered tokens, page trimming."""
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_clause, next_cursor, parse_limit
+
+WHEN = datetime(2024, 5, 1, 10, 30, 15, 250000)
+
+
+def test_cursor_round_trips():
+    token = encode_cursor(WHEN, 42)
+    assert "=" not in token
+    assert decode_cursor(token) == (WHEN, 42)
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not a cursor",
+    "e30",                                  # {}
+    "WyJub3QgYSBkYXRlIiwxXQ",               # ["not a date",1]
+    "WyIyMDI0LTA1LTAxVDEwOjMwOjE1IiwieCJd",  # ["2024-05-01T10:30:15","x"]
+    "WzFd",                                 # [1]
+])
+def test_tampered_cursors_are_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_keyset_clause_is_strictly_after_the_cursor():
+    clause, params = keyset_clause("StartTime", "TripID", (WHEN, 7))
+    assert clause == "(StartTime < %s OR (StartTime = %s AND TripID < %s))"
+    assert params == [WHEN, WHEN, 7]
+
+
+def test_next_cursor_trims_the_look_ahead_row():
+    rows = [{"t": WHEN, "id": i} for i in (5, 4, 3)]
+    page, token = next_cursor(rows, 2, "t", "id")
+    assert [row["id"] for row in page] == [5, 4]
+    assert decode_cursor(token) == (WHEN, 4)
+    assert next_cursor(rows, 3, "t", "id") == (rows, None)
+
+
+@pytest.mark.parametrize("value, expected", [(None, 100), ("50", 50), ("0", 1), ("9999", 500), ("x", 100)])
+def test_parse_limit(value, expected):
+    assert parse_limit(value, 100, 500) == expected
@@ -0,0 +1,52 @@
+"""PriceBook arithmetic: multipliers, discounts, rounding and the numpy path."""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import pricing
+from pricing import PriceBook
+
+MORNING = datetime(2030, 1, 1, 8, 15)
+NIGHT = datetime(2030, 1, 1, 23, 0)
+
+
+@pytest.fixture
+def book():
+    hourly = [1000] * 24
+    for hour in range(7, 10):
+        hourly[hour] = 1500  # morning peak
+    return PriceBook(3, {1: 100, 2: 250}, {"Scooter": 1200, "Car": 2000}, hourly)
+
+
+def test_price_applies_every_factor(book):
+    # 100.00/h * 2h * 1.2 (Scooter) * 1.5 (peak) * 0.9 (plan 1)
+    assert book.price(Decimal("100.00"), "Scooter", 7200, MORNING, plan_id=1) == Decimal("324.00")
+    # Off-peak, unknown type (1.0), no plan
+    assert book.price(Decimal("100.00"), "Bike", 1800, NIGHT) == Decimal("50.00")
+
+
+def test_price_rounds_half_up_to_the_cent(book):
+    # 0.01/h for half an hour is half a cent
+    assert book.price(Decimal("0.01"), "Bike", 1800, NIGHT) == Decimal("0.01")
+    assert book.price(Decimal("0.01"), "Bike", 1799, NIGHT) == Decimal("0.00")
+
+
+def test_discount(book):
+    assert book.discount(2) == Decimal("0.250")
+    assert book.discount(None) == 0
+
+
+def test_quote_many_keeps_order(book):
+    items = [(Decimal("100.00"), "Car", 3600), (Decimal("50.00"), "Scooter", 1800)]
+    assert book.quote_many(items, NIGHT) == [Decimal("200.00"), Decimal("30.00")]
+    assert book.quote_many([], NIGHT) == []
+
+
+def test_numpy_and_loop_give_the_same_cents(book, monkeypatch):
+    pytest.importorskip("numpy")
+    items = [(Decimal(f"{37 + i}.{i % 100:02d}"), ("Scooter", "Car", "Bike")[i % 3], 600 + 97 * i)
+             for i in range(pricing.VECTOR_MIN_ITEMS * 4)]
+    vectorized = book.quote_many(items, MORNING, plan_id=2)
+    monkeypatch.setattr(pricing, "numpy", None)
+    assert book.quote_many(items, MORNING, plan_id=2) == vectorized
@@ -0,0 +1,39 @@
+"""
+Fails when a hot query's plan regresses (see migrations.HOT_QUERIES).
+
+Runs against the database named by the DB_* environment variables, which must
+be migrated and seeded (benchmarks/seed.py); skipped when it is unreachable or
+empty, since EXPLAIN on near-empty tables prefers full scans.
+"""
+import pytest
+
+pytest.importorskip("flask")
+mysql_connector = pytest.importorskip("mysql.connector")
+
+import migrations  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def failures():
+    try:
+        conn = migrations.connect()
+    except mysql_connector.Error as e:
+        pytest.skip(f"no database configured: {e}")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM (SELECT 1 FROM Trips LIMIT 1) t")
+        seeded = cur.fetchone()[0]
+        cur.close()
+        if not seeded:
+            pytest.skip("database is not seeded; run benchmarks/seed.py first")
+        problems = {}
+        for name, problem in migrations.check_plans(conn):
+            problems.setdefault(name, []).append(problem)
+        return problems
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("name", [query["name"] for query in migrations.HOT_QUERIES])
+def test_hot_query_uses_its_index(failures, name):
+    assert name not in failures, failures.get(name)
@@ -0,0 +1,111 @@
+"""
+settle_overdue_trips paging, against an in-memory stand-in for the three
+statements it runs. No database needed.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("mysql.connector")
+
+import scheduler  # noqa: E402
+import wallet  # noqa: E402
+
+NOW = datetime(2030, 1, 1, 12, 0, 0)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, query, params=()):
+        query = " ".join(query.split())
+        if query.startswith("SELECT t.TripID"):
+            trips = sorted((t for t in self.conn.trips.values() if t["status"] == "Ongoing"
+                            and t["end"] < NOW - timedelta(seconds=params[0])),
+                           key=lambda t: (t["end"], t["id"]))
+            if len(params) == 5:
+                after = (params[1], params[3])
+                trips = [t for t in trips if (t["end"], t["id"]) > after]
+            self._rows = [(t["id"], t["user"], t["end"], Decimal("100.00"), "Scooter", None, NOW)
+                          for t in trips[:params[-1]]]
+        elif query.startswith("UPDATE Trips"):
+            new_end, _, trip_id, old_end = params
+            trip = self.conn.trips[trip_id]
+            self.rowcount = int(trip["end"] == old_end)
+            if self.rowcount:
+                trip["end"] = new_end
+        elif query.startswith("INSERT INTO Payments"):
+            self.conn.payments.append(params[0])
+            self.lastrowid = len(self.conn.payments)
+        else:
+            raise AssertionError(f"unexpected statement: {query}")
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, trips):
+        self.trips = {t["id"]: t for t in trips}
+        self.payments = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FlatBook:
+    def price(self, rate, vehicle_type, seconds, start, plan_id):
+        return Decimal("10.00")
+
+
+@pytest.fixture
+def broke_first(monkeypatch):
+    """Three trips of a user who cannot pay, overdue before one of a user who can."""
+    monkeypatch.setattr(scheduler, "BATCH_SIZE", 2)
+    monkeypatch.setattr(scheduler, "_overdue_after", None)
+    monkeypatch.setattr(scheduler.pricing, "get_price_book", lambda conn: FlatBook())
+    monkeypatch.setattr(scheduler.sessions, "invalidate", lambda user_id: None)
+    monkeypatch.setattr(scheduler.audit, "emit", lambda *args: None)
+
+    def reserve(conn, user_id, amount):
+        if user_id == 1:
+            raise wallet.InsufficientFunds("Insufficient balance")
+        return ("hold", user_id, amount)
+
+    monkeypatch.setattr(scheduler.wallet, "reserve", reserve)
+    monkeypatch.setattr(scheduler.wallet, "capture", lambda cur, hold, amount, entry_type, trip_id: None)
+    monkeypatch.setattr(scheduler.wallet, "release", lambda conn, hold: None)
+    start = NOW - timedelta(hours=5)
+    trips = [{"id": i, "user": 1, "end": start + timedelta(minutes=i), "status": "Ongoing"} for i in (1, 2, 3)]
+    trips.append({"id": 4, "user": 2, "end": start + timedelta(minutes=10), "status": "Ongoing"})
+    return FakeConn(trips)
+
+
+def test_unpayable_trips_do_not_hide_later_ones(broke_first, monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_BATCHES", 5)
+    assert scheduler._batches(scheduler.settle_overdue_trips)(broke_first) == 1
+    assert broke_first.payments == [4]
+    assert scheduler._overdue_after is None  # reached the end, next run starts over
+
+
+def test_paging_carries_over_between_runs(broke_first, monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_BATCHES", 1)
+    run = scheduler._batches(scheduler.settle_overdue_trips)
+    assert run(broke_first) == 0
+    assert run(broke_first) == 1
+    assert broke_first.payments == [4]
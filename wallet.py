@@ -0,0 +1,413 @@
+"""
+Append-only wallet ledger.
+
+Every credit and debit is an immutable WalletLedger row (triggers refuse
+UPDATE and DELETE). A user's balance is their WalletSnapshots row plus the
+ledger entries after its ThroughEntryID; the snapshot_wallets job folds new
+entries into the snapshots so that tail stays short. Users.WalletBalance is no
+longer written (migration 7 carried it over as each user's opening entry).
+
+Overdraft checks do not lock anything for the length of a booking. A debit
+first reserves the amount: one conditional UPDATE on the user's
+WalletAccounts.Available counter plus a WalletHolds row, committed on their
+own. The business transaction then captures the hold (marks it captured and
+appends the ledger entry) next to its Trips/Payments rows, or the hold is
+released if it fails. Holds that were never captured or released (a worker
+died in between) are released by the expire_wallet_holds job after
+WALLET_HOLD_TTL seconds. Credits append their entry and raise Available in
+the caller's transaction.
+
+So at any consistent read, Available = balance - held holds. The
+reconcile_wallets job checks that for recently active accounts, and checks
+each recent trip's Payments rows against its ledger entries. What does not
+match is kept in WalletDiscrepancies.
+"""
+import logging
+import os
+import threading
+from decimal import Decimal
+
+import mysql.connector
+
+log = logging.getLogger(__name__)
+
+HOLD_TTL = int(os.environ.get("WALLET_HOLD_TTL", 120))
+# Entries this recent are left out of snapshots, so an entry whose transaction
+# commits after one with a higher EntryID is never skipped.
+SNAPSHOT_LAG = int(os.environ.get("WALLET_SNAPSHOT_LAG", 60))
+SNAPSHOT_BATCH = int(os.environ.get("WALLET_SNAPSHOT_BATCH", 5000))
+RECONCILE_WINDOW = int(os.environ.get("WALLET_RECONCILE_WINDOW", 900))
+HOLD_BATCH = 200
+# The migration that opened the ledger; trips paid before it have no ledger entries.
+LEDGER_MIGRATION = 7
+
+CENT = Decimal("0.01")
+
+TOPUP = "topup"
+RIDE = "ride"
+OVERDUE = "overdue"
+REFUND = "refund"
+MEMBERSHIP = "membership"
+
+
+class WalletError(Exception):
+    pass
+
+
+class InsufficientFunds(WalletError):
+    pass
+
+
+class HoldExpired(WalletError):
+    pass
+
+
+class Hold:
+    __slots__ = ("hold_id", "user_id", "amount")
+
+    def __init__(self, hold_id, user_id, amount):
+        self.hold_id = hold_id  # None for a zero amount, which needs no hold
+        self.user_id = user_id
+        self.amount = amount
+
+
+_lock = threading.Lock()
+_stats = {
+    "reserved": 0,
+    "insufficient": 0,
+    "captured": 0,
+    "released": 0,
+    "expired": 0,
+    "credits": 0,
+    "snapshotted": 0,
+    "discrepancies": 0,
+}
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def wallet_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def money(amount):
+    return Decimal(str(amount)).quantize(CENT)
+
+
+def _append(cur, user_id, amount, entry_type, trip_id):
+    cur.execute(
+        "INSERT INTO WalletLedger (UserID, Amount, EntryType, TripID) VALUES (%s, %s, %s, %s)",
+        (user_id, amount, entry_type, trip_id),
+    )
+    return cur.lastrowid
+
+
+def _adjust_available(cur, user_id, delta):
+    # Accounts are created by their first credit.
+    cur.execute("""
+        INSERT INTO WalletAccounts (UserID, Available) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE Available = Available + VALUES(Available)
+    """, (user_id, delta))
+
+
+def credit(cur, user_id, amount, entry_type, trip_id=None):
+    """Appends a credit in the caller's transaction. Returns the EntryID."""
+    amount = money(amount)
+    entry_id = _append(cur, user_id, amount, entry_type, trip_id)
+    _adjust_available(cur, user_id, amount)
+    _count("credits")
+    return entry_id
+
+
+def reserve(conn, user_id, amount):
+    """
+    Sets `amount` aside and commits. Call with no transaction open; the account
+    row is locked only for these two statements. Raises InsufficientFunds.
+    """
+    amount = money(amount)
+    if amount <= 0:
+        return Hold(None, user_id, amount)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE WalletAccounts SET Available = Available - %s WHERE UserID = %s AND Available >= %s",
+            (amount, user_id, amount),
+        )
+        if cur.rowcount != 1:
+            conn.rollback()
+            _count("insufficient")
+            raise InsufficientFunds("Insufficient balance")
+        cur.execute("""
+            INSERT INTO WalletHolds (UserID, Amount, Status, ExpiresAt)
+            VALUES (%s, %s, 'held', NOW() + INTERVAL %s SECOND)
+        """, (user_id, amount, HOLD_TTL))
+        hold = Hold(cur.lastrowid, user_id, amount)
+        conn.commit()
+        _count("reserved")
+        return hold
+    finally:
+        cur.close()
+
+
+def capture(cur, hold, amount, entry_type, trip_id=None):
+    """
+    Turns a hold into a debit of `amount` (at most the held amount) in the
+    caller's transaction; any difference goes back to Available. Raises
+    HoldExpired when the hold was released meanwhile.
+    """
+    amount = money(amount)
+    if amount > hold.amount:
+        raise WalletError("Charge exceeds the reserved amount")
+    if hold.hold_id is not None:
+        cur.execute("UPDATE WalletHolds SET Status = 'captured' WHERE HoldID = %s AND Status = 'held'",
+                    (hold.hold_id,))
+        if cur.rowcount != 1:
+            raise HoldExpired("The wallet reservation expired, please try again")
+    entry_id = _append(cur, hold.user_id, -amount, entry_type, trip_id) if amount else None
+    if hold.amount > amount:
+        cur.execute("UPDATE WalletAccounts SET Available = Available + %s WHERE UserID = %s",
+                    (hold.amount - amount, hold.user_id))
+    _count("captured")
+    return entry_id
+
+
+def _release(cur, hold_id):
+    """Releases one held hold in the caller's transaction. True if it was still held."""
+    cur.execute("SELECT UserID, Amount FROM WalletHolds WHERE HoldID = %s AND Status = 'held' FOR UPDATE",
+                (hold_id,))
+    row = cur.fetchone()
+    if row is None:
+        return False
+    user_id, amount = row
+    cur.execute("UPDATE WalletHolds SET Status = 'released' WHERE HoldID = %s", (hold_id,))
+    cur.execute("UPDATE WalletAccounts SET Available = Available + %s WHERE UserID = %s", (amount, user_id))
+    return True
+
+
+def release(conn, hold):
+    """
+    Gives a hold back after the business transaction was rolled back. Best
+    effort: a failure is logged and left to expire_wallet_holds.
+    """
+    if hold is None or hold.hold_id is None:
+        return
+    cur = conn.cursor()
+    try:
+        released = _release(cur, hold.hold_id)
+        conn.commit()
+        if released:
+            _count("released")
+    except mysql.connector.Error:
+        log.warning("could not release wallet hold %s", hold.hold_id, exc_info=True)
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+    finally:
+        cur.close()
+
+
+def balance(conn, user_id):
+    """Ledger balance: the snapshot plus the entries after it."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT COALESCE(s.Balance, 0) + COALESCE((
+                SELECT SUM(l.Amount) FROM WalletLedger l
+                WHERE l.UserID = u.UserID AND l.EntryID > COALESCE(s.ThroughEntryID, 0)
+            ), 0)
+            FROM (SELECT %s AS UserID) u
+            LEFT JOIN WalletSnapshots s ON s.UserID = u.UserID
+        """, (user_id,))
+        return money(cur.fetchone()[0])
+    finally:
+        cur.close()
+
+
+def available(conn, user_id):
+    """What the user can spend now: the ledger balance less their held holds."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT COALESCE(SUM(Amount), 0) FROM WalletHolds WHERE UserID = %s AND Status = 'held'",
+            (user_id,),
+        )
+        held = cur.fetchone()[0]
+    finally:
+        cur.close()
+    return balance(conn, user_id) - money(held)
+
+
+# -- scheduler jobs -----------------------------------------------------------
+
+def expire_holds(conn):
+    """Releases holds past ExpiresAt. Returns (holds released, whether the batch was full)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT HoldID FROM WalletHolds
+            WHERE Status = 'held' AND ExpiresAt <= NOW()
+            ORDER BY ExpiresAt
+            LIMIT %s
+        """, (HOLD_BATCH,))
+        hold_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        released = 0
+        for hold_id in hold_ids:
+            if _release(cur, hold_id):
+                released += 1
+            conn.commit()
+        _count("expired", released)
+        return released, len(hold_ids) == HOLD_BATCH
+    finally:
+        cur.close()
+
+
+def snapshot(conn):
+    """
+    Folds the next SNAPSHOT_BATCH ledger entries into WalletSnapshots.
+
+    Entries are taken in EntryID order from the highest ThroughEntryID so far.
+    Every user with entries in the range gets ThroughEntryID = the end of the
+    range. A user without entries in the range keeps an older ThroughEntryID,
+    which is still correct because nothing of theirs lies in between. Returns
+    (entries folded, whether there may be more).
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(MAX(ThroughEntryID), 0) FROM WalletSnapshots")
+        low = cur.fetchone()[0]
+        cur.execute("""
+            SELECT EntryID, CreatedAt <= NOW() - INTERVAL %s SECOND FROM WalletLedger
+            WHERE EntryID > %s
+            ORDER BY EntryID
+            LIMIT %s
+        """, (SNAPSHOT_LAG, low, SNAPSHOT_BATCH))
+        rows = cur.fetchall()
+        # Only the run of old-enough entries at the front; the range must not skip one.
+        entries, high = 0, low
+        for entry_id, settled in rows:
+            if not settled:
+                break
+            entries, high = entries + 1, entry_id
+        if not entries:
+            conn.commit()
+            return 0, False
+        cur.execute("""
+            INSERT INTO WalletSnapshots (UserID, Balance, ThroughEntryID, TakenAt)
+            SELECT UserID, SUM(Amount), %s, NOW()
+            FROM WalletLedger
+            WHERE EntryID > %s AND EntryID <= %s
+            GROUP BY UserID
+            ON DUPLICATE KEY UPDATE
+                Balance = Balance + VALUES(Balance),
+                ThroughEntryID = VALUES(ThroughEntryID),
+                TakenAt = VALUES(TakenAt)
+        """, (high, low, high))
+        conn.commit()
+        _count("snapshotted", entries)
+        return entries, entries == SNAPSHOT_BATCH
+    finally:
+        cur.close()
+
+
+def _record(cur, kind, ref, user_id, expected, actual):
+    if expected == actual:
+        cur.execute("DELETE FROM WalletDiscrepancies WHERE Kind = %s AND Ref = %s", (kind, ref))
+        return 0
+    log.warning("wallet %s %s does not reconcile: expected %s, ledger has %s", kind, ref, expected, actual)
+    cur.execute("""
+        INSERT INTO WalletDiscrepancies (Kind, Ref, UserID, Expected, Actual, FoundAt)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE Expected = VALUES(Expected), Actual = VALUES(Actual), FoundAt = VALUES(FoundAt)
+    """, (kind, ref, user_id, expected, actual))
+    return 1
+
+
+def reconcile(conn):
+    """
+    Checks what changed in the last RECONCILE_WINDOW seconds (less the
+    snapshot lag, so in-flight transactions are not flagged):
+
+    - trip_charge: a trip's Payments total against its ledger debits
+    - trip_refund: its Refunded payments against its ledger credits
+    - account: Available against the ledger balance less held holds
+
+    Trips with a payment from before the ledger was opened are not checked:
+    that payment is part of the opening balance, not a debit of their own.
+
+    Mismatches are upserted into WalletDiscrepancies and rows that now match
+    are deleted. Returns the number of discrepancies found.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT t.TripID, tr.UserID,
+                   (SELECT COALESCE(SUM(p.Amount), 0) FROM Payments p WHERE p.TripID = t.TripID),
+                   (SELECT COALESCE(-SUM(l.Amount), 0) FROM WalletLedger l
+                    WHERE l.TripID = t.TripID AND l.Amount < 0),
+                   (SELECT COALESCE(SUM(p.Amount), 0) FROM Payments p
+                    WHERE p.TripID = t.TripID AND p.Status = 'Refunded'),
+                   (SELECT COALESCE(SUM(l.Amount), 0) FROM WalletLedger l
+                    WHERE l.TripID = t.TripID AND l.Amount > 0)
+            FROM (
+                SELECT TripID FROM WalletLedger
+                WHERE CreatedAt > NOW() - INTERVAL %s SECOND AND CreatedAt <= NOW() - INTERVAL %s SECOND
+                  AND TripID IS NOT NULL
+                UNION
+                SELECT TripID FROM Payments
+                WHERE Timestamp > NOW() - INTERVAL %s SECOND AND Timestamp <= NOW() - INTERVAL %s SECOND
+                  AND TripID IS NOT NULL
+            ) t
+            JOIN Trips tr ON tr.TripID = t.TripID
+            WHERE NOT EXISTS (
+                SELECT 1 FROM Payments p JOIN SchemaMigrations m ON m.Version = %s
+                WHERE p.TripID = t.TripID AND p.Timestamp < m.AppliedAt
+            )
+        """, (RECONCILE_WINDOW, SNAPSHOT_LAG, RECONCILE_WINDOW, SNAPSHOT_LAG, LEDGER_MIGRATION))
+        trips = cur.fetchall()
+        cur.execute("""
+            SELECT a.UserID, a.Available,
+                   COALESCE(s.Balance, 0)
+                   + COALESCE((SELECT SUM(l.Amount) FROM WalletLedger l
+                               WHERE l.UserID = a.UserID AND l.EntryID > COALESCE(s.ThroughEntryID, 0)), 0)
+                   - COALESCE((SELECT SUM(h.Amount) FROM WalletHolds h
+                               WHERE h.UserID = a.UserID AND h.Status = 'held'), 0)
+            FROM WalletAccounts a
+            LEFT JOIN WalletSnapshots s ON s.UserID = a.UserID
+            WHERE a.UserID IN (
+                SELECT UserID FROM WalletLedger
+                WHERE CreatedAt > NOW() - INTERVAL %s SECOND AND CreatedAt <= NOW() - INTERVAL %s SECOND
+            )
+        """, (RECONCILE_WINDOW, SNAPSHOT_LAG))
+        accounts = cur.fetchall()
+        conn.commit()
+
+        found = 0
+        for trip_id, user_id, charged, debited, refunded, credited in trips:
+            found += _record(cur, "trip_charge", trip_id, user_id, money(charged), money(debited))
+            found += _record(cur, "trip_refund", trip_id, user_id, money(refunded), money(credited))
+        for user_id, available_now, computed in accounts:
+            found += _record(cur, "account", user_id, user_id, money(computed), money(available_now))
+        conn.commit()
+        _count("discrepancies", found)
+        return found
+    finally:
+        cur.close()
+
+
+def discrepancies(conn, limit=100):
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT Kind, Ref, UserID, Expected, Actual, FoundAt FROM WalletDiscrepancies
+            ORDER BY FoundAt DESC
+            LIMIT %s
+        """, (limit,))
+        return cur.fetchall()
+    finally:
+        cur.close()